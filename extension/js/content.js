@@ -4,13 +4,15 @@
     if (window.__luminaInjected) return;
     window.__luminaInjected = true;
 
-    const CONFIG = { serverUrl: 'http://localhost:8080', minSelectionLength: 10 };
+    const CONFIG = { serverUrl: 'http://localhost:8080', minSelectionLength: 10, audioFormat: 'opus' }; // Opus is ~10x smaller than WAV (server falls back to WAV if unsupported)
     let state = {
         selectionCoords: null, selectedText: '', isLoading: false,
         audioElement: null, blobUrl: null,
         currentConversation: [], // Track conversation history
         activeModel: 'gemini', // 🎯 v4.8.4: Track the model used for the current thread
         pendingPrompts: new Set(), // 🎯 v3.5.3: Prevent duplicate generations
+        imageHashes: [], // Screenshots uploaded for the current thread (reused by follow-ups)
+        sessionId: null, // Server-side conversation: follow-ups send only the new prompt
         mediaRecorder: null, audioChunks: [] // 🎯 v4.10.0: Voice state
     };
     let elements = {};
@@ -229,6 +231,11 @@
             if (settings.apiKeyClaude) modelOptions += '<option value="claude">Claude (Vision ✓)</option>';
             if (settings.apiKeyOpenai) modelOptions += '<option value="openai">GPT-4 (Vision ✓)</option>';
 
+            // Two or more keys: let the server pick the fastest healthy one (and fall back between them)
+            if ((modelOptions.match(/<option/g) || []).length > 1) {
+                modelOptions = '<option value="auto">Auto (Fastest)</option>' + modelOptions;
+            }
+
             // Fallback if user hasn't set keys yet
             if (!modelOptions) modelOptions = '<option value="gemini">Lumina (Default)</option>';
             console.log('🎓 [SHOW_WIDGET] Model options generated:', modelOptions);
@@ -420,6 +427,7 @@
 
             // 🎯 v4.8.5: Screenshot logic moved to conditional block
             let screenshot = null;
+            let imageHash = null;
             if (visionEnabled) {
                 console.log('📸 [SUBMIT] Vision enabled, hiding UI for clean capture...');
                 document.body.classList.add('lumina-capturing');
@@ -435,7 +443,9 @@
                     document.body.classList.remove('lumina-capturing');
                     triggerShutterEffect();
                     if (captureRes && captureRes.success) {
-                        screenshot = captureRes.screenshot.split(',')[1];
+                        // Binary upload; the request then carries only the hash
+                        imageHash = await uploadScreenshot(settings.serverUrl || CONFIG.serverUrl, captureRes.screenshot);
+                        if (!imageHash) screenshot = captureRes.screenshot.split(',')[1];
                         console.log('📸 [SUBMIT] Screenshot captured successfully');
 
                         // 🎯 v4.8.4 Dynamic Vision Routing (ONLY if model can't see)
@@ -465,18 +475,24 @@
             }
 
             state.activeModel = selectedModel; // 🎯 Save for follow-ups
+            state.imageHashes = imageHash ? [imageHash] : [];
+            state.sessionId = crypto.randomUUID(); // New thread
 
             const requestBody = {
                 text: state.selectedText || "", // 🎯 Removed "Context" placeholder
                 prompt: q,
                 screenshot: screenshot,
+                imageHashes: state.imageHashes,
+                sessionId: state.sessionId,
+                history: [], // Starts the server-side session
                 voice: widget.querySelector('#lumina-v-sel').value,
                 apiKey: settings.apiKeyGemini,
                 apiKeyGroq: settings.apiKeyGroq,
                 apiKeyOpenai: settings.apiKeyOpenai,
                 apiKeyClaude: settings.apiKeyClaude,
                 llmProvider: selectedModel,
-                shouldAudio: true
+                shouldAudio: true,
+                audioFormat: CONFIG.audioFormat
             };
             console.log('🚀 [SUBMIT] Request body:', requestBody);
 
@@ -505,6 +521,8 @@
                 answer: data.text,
                 audioUrl: data.audioUrl,
                 timestamp: Date.now(),
+                sessionId: state.sessionId,
+                imageHashes: state.imageHashes,
                 conversation: [...state.currentConversation] // 🎯 Store the whole thread
             });
             showAudioPlayer(); // Render conversation
@@ -574,20 +592,38 @@
                 textEl.scrollTop = textEl.scrollHeight;
 
                 const settings = await chrome.storage.sync.get(['serverUrl', 'apiKeyGemini', 'apiKeyGroq', 'apiKeyOpenai', 'apiKeyClaude']);
-                const res = await fetch(`${settings.serverUrl || CONFIG.serverUrl}/api/generate`, {
+                const followUpBody = {
+                    text: state.selectedText || "", // 🎯 Removed "Context" placeholder
+                    prompt: q,
+                    // The server keeps the thread's history, text and screenshot for the session
+                    sessionId: state.sessionId,
+                    history: state.sessionId ? undefined : state.currentConversation.slice(0, -1),
+                    imageHashes: state.imageHashes, // The thread's screenshot, by reference
+                    apiKey: settings.apiKeyGemini,
+                    apiKeyGroq: settings.apiKeyGroq,
+                    apiKeyOpenai: settings.apiKeyOpenai,
+                    apiKeyClaude: settings.apiKeyClaude,
+                    llmProvider: state.activeModel || 'gemini', // 🎯 v4.8.4: Persist the thread's model
+                    shouldAudio: false // 🎯 v3.0: Always false for follow-ups (on-demand)
+                };
+                const postFollowUp = () => fetch(`${settings.serverUrl || CONFIG.serverUrl}/api/generate`, {
                     method: 'POST', headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({
-                        text: state.selectedText || "", // 🎯 Removed "Context" placeholder
-                        prompt: q,
-                        history: state.currentConversation.slice(0, -1), // Pass conversation except last user msg
-                        apiKey: settings.apiKeyGemini,
-                        apiKeyGroq: settings.apiKeyGroq,
-                        apiKeyOpenai: settings.apiKeyOpenai,
-                        apiKeyClaude: settings.apiKeyClaude,
-                        llmProvider: state.activeModel || 'gemini', // 🎯 v4.8.4: Persist the thread's model
-                        shouldAudio: false // 🎯 v3.0: Always false for follow-ups (on-demand)
-                    })
+                    body: JSON.stringify(followUpBody)
                 });
+                let res = await postFollowUp();
+                for (let retry = 0; res.status === 409 && retry < 2; retry++) {
+                    const detail = (await res.json()).detail || {};
+                    if (detail.unknownSession) {
+                        // Session expired or the server restarted: re-seed it with the full history
+                        followUpBody.history = state.currentConversation.slice(0, -1);
+                    }
+                    if (detail.missingImages) {
+                        // Server restarted or evicted the screenshot: continue without it
+                        state.imageHashes = [];
+                        followUpBody.imageHashes = [];
+                    }
+                    res = await postFollowUp();
+                }
                 const data = await res.json();
 
                 // 3. Update conversation with AI response and append to UI
@@ -697,7 +733,7 @@
             const checkRes = await fetch(`${serverUrl.replace(/\/$/, '')}/api/tts?check_only=true`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ text, voice })
+                body: JSON.stringify({ text, voice, format: CONFIG.audioFormat })
             });
             const checkData = await checkRes.json();
             const fullUrl = checkData.audioUrl.startsWith('http') ? checkData.audioUrl : `${serverUrl.replace(/\/$/, '')}/${checkData.audioUrl.replace(/^\//, '')}`;
@@ -713,21 +749,21 @@
                 // 🎯 NOT CACHED: Play cues while generating
 
                 // 1. Loading Cue (Immediate)
-                const cueUrl = `${serverUrl.replace(/\/$/, '')}/api/audio/cue.wav`;
+                const cueUrl = `${serverUrl.replace(/\/$/, '')}/api/audio/cue.wav?voice=${encodeURIComponent(voice)}`;
                 await playAudioWithMixedContentFix(cueUrl, 'cue.wav');
 
                 // 2. Start real generation in parallel
                 const genPromise = fetch(`${serverUrl.replace(/\/$/, '')}/api/tts`, {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ text, voice })
+                    body: JSON.stringify({ text, voice, format: CONFIG.audioFormat })
                 }).then(r => r.json());
 
                 // Wait for generation to finish
                 const data = await genPromise;
 
                 // 3. Ready Cue (Sequential)
-                const readyUrl = `${serverUrl.replace(/\/$/, '')}/api/audio/ready.wav`;
+                const readyUrl = `${serverUrl.replace(/\/$/, '')}/api/audio/ready.wav?voice=${encodeURIComponent(voice)}`;
                 await playAudioWithMixedContentFix(readyUrl, 'ready.wav');
 
                 // 4. Final Audio (Small delay to let "ready" start)
@@ -805,6 +841,7 @@
                 chrome.storage.local.remove(window.location.href, () => {
                     console.log('💡 [FAB] History cleared');
                     state.currentConversation = []; // 🎯 v4.8.7: Reset in-memory state
+                    state.sessionId = null;
                     loadHistoryItems();
                 });
             }
@@ -821,6 +858,9 @@
                 div.innerHTML = `<span class="lumina-history-q">${item.question}</span><span class="lumina-history-a">${item.answer}</span>`;
                 div.onclick = () => {
                     chrome.storage.sync.get(['serverUrl'], (s) => {
+                        // Resume the thread's server-side session (re-seeded from the conversation if expired)
+                        state.sessionId = item.sessionId || null;
+                        state.imageHashes = item.imageHashes || [];
                         // 🎯 Restore the whole conversation if it exists
                         if (item.conversation && item.conversation.length > 0) {
                             state.currentConversation = [...item.conversation];
@@ -865,6 +905,21 @@
         });
     }
 
+    async function uploadScreenshot(serverUrl, dataUrl) {
+        // Returns the server's content hash for the image, or null to fall back to base64
+        try {
+            const blob = await (await fetch(dataUrl)).blob();
+            const form = new FormData();
+            form.append('files', blob, 'screenshot.png');
+            const res = await fetch(`${serverUrl.replace(/\/$/, '')}/api/images`, { method: 'POST', body: form });
+            if (!res.ok) return null;
+            return (await res.json()).images[0].hash;
+        } catch (e) {
+            console.warn('📸 [UPLOAD] Screenshot upload failed:', e);
+            return null;
+        }
+    }
+
     async function validateHistoryItems() {
         const url = window.location.href;
         const settings = await chrome.storage.sync.get(['serverUrl']);
@@ -877,18 +932,27 @@
             console.log(`💡 [HISTORY] Validating ${items.length} items...`);
             let changed = false;
 
+            // One batch status call instead of a HEAD request per item
+            const ids = items.filter(item => item.audioUrl).map(item => item.audioUrl);
+            if (ids.length === 0) return;
+            let statuses = null;
+            try {
+                const resp = await fetch(`${serverUrl.replace(/\/$/, '')}/api/jobs/status`, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ ids })
+                });
+                if (resp.ok) statuses = (await resp.json()).jobs;
+            } catch (e) { }
+            if (!statuses) return;
+
             for (let i = items.length - 1; i >= 0; i--) {
                 const item = items[i];
-                if (item.audioUrl) {
-                    const fullUrl = item.audioUrl.startsWith('http') ? item.audioUrl : `${serverUrl.replace(/\/$/, '')}/${item.audioUrl.replace(/^\//, '')}`;
-                    try {
-                        const check = await fetch(fullUrl, { method: 'HEAD' });
-                        if (check.status === 404) {
-                            console.log(`💡 [HISTORY] Auto-removing expired item: ${item.question}`);
-                            items.splice(i, 1);
-                            changed = true;
-                        }
-                    } catch (e) { }
+                const status = item.audioUrl && statuses[item.audioUrl];
+                if (status && status.state === 'unknown') {
+                    console.log(`💡 [HISTORY] Auto-removing expired item: ${item.question}`);
+                    items.splice(i, 1);
+                    changed = true;
                 }
             }
 
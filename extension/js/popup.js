@@ -101,8 +101,8 @@ document.addEventListener('DOMContentLoaded', async () => {
     });
 
     function updateApiKeyVisibility(provider) {
-        // Hide all
-        Object.values(keyGroups).forEach(g => g.classList.add('hidden'));
+        // Hide all (auto routes between every provider with a key, so it shows them all)
+        Object.values(keyGroups).forEach(g => g.classList.toggle('hidden', provider !== 'auto'));
         // Show selected
         if (keyGroups[provider]) {
             keyGroups[provider].classList.remove('hidden');
@@ -0,0 +1,176 @@
+# server/answer_budget.py
+
+"""
+Token and time budgets for generated answers.
+Answer length sets TTS time, and a stalled provider holds a worker, so every
+answer gets a token budget scaled to its tone and can get an overall time
+limit (LUMINA_ANSWER_TIME_LIMIT, or per request: "finished within 20s").
+When either runs out, the stream finishes the sentence it is in and stops;
+the decision is kept on the budget for the job's metadata. The provider's own max_tokens
+sits a little above the budget so that sentence has room to end.
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import Iterator, Optional
+
+from metrics import metrics
+from prompt_budget import estimate_tokens
+from stream_pump import END as _END, pump
+from text_chunker import take_sentences
+
+# Answer tokens for the default tone (Groq's small model gets more, it pads less)
+MAX_ANSWER_TOKENS = int(os.getenv("LUMINA_MAX_ANSWER_TOKENS", "600"))
+PROVIDER_MAX_TOKENS = {"groq": 800}
+TONE_TOKEN_SCALE = {"concise": 0.4, "casual": 0.8}
+# Seconds an answer may take to generate unless the request sets its own (0 = no limit).
+# Off by default: a time limit pumps the stream on a thread of its own
+ANSWER_TIME_LIMIT = float(os.getenv("LUMINA_ANSWER_TIME_LIMIT", "0"))
+# Room past the budget to finish the current sentence
+CLOSING_TOKENS = 60
+CLOSING_SECONDS = 2.0
+# Time from the first token to audible audio (first TTS chunk), taken off the audible budget
+FIRST_AUDIO_TTS_SECONDS = float(os.getenv("LUMINA_FIRST_AUDIO_TTS_MS", "700")) / 1000
+
+_TIMEOUT = object()
+
+
+def max_answer_tokens(tone: Optional[str], provider: str, custom_persona: Optional[str] = None) -> int:
+    base = PROVIDER_MAX_TOKENS.get(provider, MAX_ANSWER_TOKENS)
+    if custom_persona and custom_persona.strip():
+        return base
+    return max(64, int(base * TONE_TOKEN_SCALE.get(tone or "", 1.0)))
+
+
+class AnswerBudget:
+    def __init__(self, max_tokens: Optional[int] = None, audible_within: Optional[float] = None,
+                 finished_within: Optional[float] = None):
+        self.max_tokens = max_tokens # None: set from tone and provider when generation starts
+        self.audible_within = audible_within
+        self.finished_within = finished_within or ANSWER_TIME_LIMIT or None
+        self.started = time.monotonic()
+        self.tokens = 0
+        self.first_token: Optional[float] = None # Seconds after start
+        self.truncated: Optional[str] = None # "tokens" or "time"
+
+    @property
+    def deadline(self) -> Optional[float]:
+        return self.started + self.finished_within if self.finished_within else None
+
+    @property
+    def first_token_deadline(self) -> Optional[float]:
+        """Seconds the provider has for a first token if the answer is to be audible in time."""
+        if not self.audible_within:
+            return None
+        return max(0.1, self.audible_within - FIRST_AUDIO_TTS_SECONDS)
+
+    @property
+    def provider_max_tokens(self) -> int:
+        return (self.max_tokens or MAX_ANSWER_TOKENS) + CLOSING_TOKENS
+
+    def to_dict(self) -> dict:
+        first = self.first_token
+        return {
+            "tokens": self.tokens,
+            "maxTokens": self.max_tokens,
+            "truncated": self.truncated,
+            "firstTokenSeconds": round(first, 3) if first is not None else None,
+            "audibleOnTime": None if first is None or not self.audible_within
+                             else first + FIRST_AUDIO_TTS_SECONDS <= self.audible_within,
+        }
+
+
+def _chunk_source(chunks: Iterator[str], timed: bool):
+    """
+    next_chunk(timeout) -> chunk, _END or _TIMEOUT, plus a stop function.
+    With timeouts the producer is pumped on a pool worker, so a stalled
+    provider can be abandoned (it stops at its next chunk).
+    """
+    if not timed:
+        iterator = iter(chunks)
+        return (lambda timeout: next(iterator, _END)), lambda: getattr(chunks, "close", lambda: None)()
+
+    items: queue.Queue = queue.Queue()
+    stop = threading.Event()
+    pump(lambda: chunks, items.put, stop)
+
+    def next_chunk(timeout: Optional[float]):
+        try:
+            item = items.get(timeout=timeout)
+        except queue.Empty:
+            return _TIMEOUT
+        if isinstance(item, Exception):
+            raise item
+        return item
+    return next_chunk, stop.set
+
+
+def _finished_part(pending: str) -> str:
+    """
+    pending up to its last complete sentence, "" if it has none; the stream
+    ends here, so a sentence end at the very end counts. The leading
+    whitespace is kept: this continues text already sent.
+    """
+    closed = pending + "\n\n"
+    ready, rest = take_sentences(closed, 1)
+    return closed[:len(closed) - len(rest)].rstrip() if ready else ""
+
+
+def bounded_stream(chunks: Iterator[str], budget: AnswerBudget, provider: str = "gemini") -> Iterator[str]:
+    """
+    chunks until the budget runs out, then up to the end of the current
+    sentence; if it doesn't end within the grace, the unfinished part is dropped.
+    """
+    next_chunk, stop = _chunk_source(chunks, budget.deadline is not None)
+    reason = None
+    pending = ""
+    closing_since = 0.0
+    try:
+        while True:
+            now = time.monotonic()
+            if reason is None:
+                timeout = budget.deadline - now if budget.deadline is not None else None
+            else:
+                timeout = closing_since + CLOSING_SECONDS - now
+            chunk = next_chunk(max(0.0, timeout) if timeout is not None else None)
+            if chunk is _END:
+                break
+            if chunk is _TIMEOUT:
+                if reason is None:
+                    reason, closing_since = "time", time.monotonic()
+                    continue
+                # Nothing more arrived to finish the sentence with
+                budget.truncated = reason
+                finished = _finished_part(pending)
+                if finished:
+                    yield finished
+                return
+            if not chunk:
+                continue
+            if reason is None:
+                if budget.first_token is None:
+                    budget.first_token = time.monotonic() - budget.started
+                budget.tokens += estimate_tokens(chunk, provider)
+                over_time = budget.deadline is not None and time.monotonic() > budget.deadline
+                if budget.tokens <= (budget.max_tokens or MAX_ANSWER_TOKENS) and not over_time:
+                    yield chunk
+                    continue
+                reason, closing_since = ("time" if over_time else "tokens"), time.monotonic()
+            pending += chunk
+            ready, _ = take_sentences(pending, 1)
+            if ready or estimate_tokens(pending, provider) > CLOSING_TOKENS:
+                budget.truncated = reason
+                finished = _finished_part(pending)
+                if finished:
+                    yield finished
+                return
+        if pending:
+            # The answer ended on its own within the grace
+            yield pending
+    finally:
+        stop()
+        if budget.truncated:
+            metrics.increment(f"answer.truncated.{budget.truncated}")
+        metrics.observe("answer.tokens", budget.tokens)
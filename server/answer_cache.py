@@ -0,0 +1,218 @@
+# server/answer_cache.py
+
+"""
+Near-duplicate answer cache.
+Students select almost the same passage (a few words more or less) and ask the
+same question in slightly different words; exact-match keys miss all of that.
+Each cached answer keeps a MinHash signature of its selected text (word
+3-shingles), its prompt's content words and a SimHash of the prompt. Lookups
+find candidates through a banded LSH index over the MinHash (the SimHash for
+questions without a selection), then score them as the lower of the text
+similarity and the Jaccard similarity of the prompts' content words, and
+accept the best one at or above the threshold for the tone (stricter with a
+custom persona). The SimHash never decides a hit: one changed word ("causes"
+vs "consequences") barely moves it, while it halves the word overlap. Candidates only ever come from the same
+scope (provider, tone, persona, screenshots), so those never mix.
+"""
+
+import hashlib
+import random
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+NUM_PERM = 64
+BANDS = 16 # 4 rows per band: pairs from about 0.5 Jaccard up become candidates
+_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(0x1ab)
+_PERM_A = _rng.integers(1, 1 << 32, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64)
+
+_WORD = re.compile(r"[a-z0-9]+")
+# Words that don't change what a question asks (question words like "why" and "how" do)
+_STOPWORDS = frozenset(
+    "a an the is are was were be been being do does did of in on at to for from by with and or "
+    "this that these those it its please can could would you me i my".split()
+)
+
+
+def parse_thresholds(spec: str) -> dict[str, float]:
+    """"concise=0.8,casual=0.9" -> {"concise": 0.8, "casual": 0.9}"""
+    thresholds = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            thresholds[name.strip()] = float(value)
+    return thresholds
+
+
+def shingles(text: str, k: int = 3) -> set[int]:
+    words = _WORD.findall(text.lower())
+    if len(words) < k:
+        return {zlib.crc32(" ".join(words).encode())} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + k]).encode()) for i in range(len(words) - k + 1)}
+
+
+def minhash(features: set[int]) -> Optional[np.ndarray]:
+    if not features:
+        return None
+    x = np.fromiter(features, dtype=np.uint64, count=len(features))
+    # (a * x + b) mod p per permutation; a, x < 2^32 so the product fits in 64 bits
+    return ((np.outer(_PERM_A, x) + _PERM_B[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def minhash_similarity(a: Optional[np.ndarray], b: Optional[np.ndarray]) -> float:
+    """Estimated Jaccard similarity (two empty texts are identical)."""
+    if a is None or b is None:
+        return 1.0 if a is b else 0.0
+    return float(np.mean(a == b))
+
+
+def prompt_terms(prompt: str) -> frozenset[str]:
+    return frozenset(word for word in _WORD.findall(prompt.lower()) if word not in _STOPWORDS)
+
+
+def terms_similarity(a: frozenset[str], b: frozenset[str]) -> float:
+    """Jaccard similarity of two prompts' content words (identical sets, empty included, are 1.0)."""
+    if a == b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over words and word pairs, for finding candidate prompts."""
+    words = _WORD.findall(text.lower())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    weights = [0] * 64
+    for feature in features:
+        h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+class CachedAnswer:
+    def __init__(self, entry_id: int, scope: str, text_sig: Optional[np.ndarray], prompt_sig: int,
+                 prompt: str, answer: str, job_id: Optional[str] = None, voice: Optional[str] = None):
+        self.id = entry_id
+        self.scope = scope
+        self.text_sig = text_sig
+        self.prompt_sig = prompt_sig
+        self.prompt_terms = prompt_terms(prompt)
+        self.prompt = prompt
+        self.answer = answer
+        self.job_id = job_id # Audio already rendered (or rendering) for this answer, if any
+        self.voice = voice
+        self.created = time.time()
+        self.hits = 0
+
+
+class AnswerCache:
+    def __init__(self, threshold: float = 0.85, tone_thresholds: Optional[dict[str, float]] = None,
+                 persona_threshold: float = 0.95, max_entries: int = 5000, ttl: float = 86400,
+                 audit_rate: float = 0.0):
+        self.threshold = threshold
+        self.tone_thresholds = tone_thresholds or {}
+        self.persona_threshold = persona_threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.audit_rate = audit_rate
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._buckets: dict[tuple, set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def threshold_for(self, tone: Optional[str], persona: Optional[str]) -> float:
+        threshold = self.tone_thresholds.get(tone or "", self.threshold)
+        # A custom persona is free-form: near-identical questions may still want different answers
+        return max(threshold, self.persona_threshold) if persona else threshold
+
+    def lookup(self, scope: str, text: str, prompt: str, tone: Optional[str] = None,
+               persona: Optional[str] = None) -> tuple[Optional[CachedAnswer], float]:
+        """Best cached answer at or above the threshold, with its similarity (else None and the best seen)."""
+        text_sig, prompt_sig = self._signatures(text, prompt)
+        terms = prompt_terms(prompt)
+        threshold = self.threshold_for(tone, persona)
+        best, best_similarity = None, 0.0
+        now = time.time()
+        with self._lock:
+            candidates = set()
+            for band in self._bands(scope, text_sig, prompt_sig):
+                candidates |= self._buckets.get(band, set())
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if now - entry.created > self.ttl:
+                    continue
+                similarity = min(
+                    minhash_similarity(text_sig, entry.text_sig),
+                    terms_similarity(terms, entry.prompt_terms)
+                )
+                if similarity > best_similarity:
+                    best, best_similarity = entry, similarity
+            if best is None or best_similarity < threshold:
+                return None, best_similarity
+            best.hits += 1
+            self._entries.move_to_end(best.id)
+            return best, best_similarity
+
+    def store(self, scope: str, text: str, prompt: str, answer: str,
+              job_id: Optional[str] = None, voice: Optional[str] = None) -> CachedAnswer:
+        text_sig, prompt_sig = self._signatures(text, prompt)
+        with self._lock:
+            entry = CachedAnswer(self._next_id, scope, text_sig, prompt_sig, prompt, answer, job_id, voice)
+            self._next_id += 1
+            self._entries[entry.id] = entry
+            for band in self._bands(scope, text_sig, prompt_sig):
+                self._buckets.setdefault(band, set()).add(entry.id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            return entry
+
+    def discard(self, entry: CachedAnswer):
+        with self._lock:
+            self._remove(entry.id)
+
+    def expire(self, now: float) -> int:
+        with self._lock:
+            expired = [entry_id for entry_id, entry in self._entries.items() if now - entry.created > self.ttl]
+            for entry_id in expired:
+                self._remove(entry_id)
+            return len(expired)
+
+    def should_audit(self) -> bool:
+        """Samples hits to re-ask the provider and check the cached answer still fits."""
+        return random.random() < self.audit_rate
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _signatures(self, text: str, prompt: str) -> tuple[Optional[np.ndarray], int]:
+        return minhash(shingles(text)), simhash(prompt)
+
+    def _bands(self, scope: str, text_sig: Optional[np.ndarray], prompt_sig: int) -> list[tuple]:
+        if text_sig is None:
+            # No selected text (a general question): bucket on the prompt alone
+            return [(scope, "prompt", prompt_sig >> shift & 0xFFFF) for shift in range(0, 64, 16)]
+        rows = NUM_PERM // BANDS
+        return [(scope, band, text_sig[band * rows:(band + 1) * rows].tobytes()) for band in range(BANDS)]
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for band in self._bands(entry.scope, entry.text_sig, entry.prompt_sig):
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[band]
+
+
+def answer_similarity(a: str, b: str) -> float:
+    """Vocabulary overlap of two answers, for audits (two good answers to one question share a lot of it)."""
+    return minhash_similarity(minhash(shingles(a, k=1)), minhash(shingles(b, k=1)))
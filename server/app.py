@@ -2,27 +2,44 @@
 
 import asyncio
 import base64
+import json
 import logging
 import os
 import re
-import wave
+import threading
 import time
 import torch
 import hashlib
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+from pydantic import BaseModel, ValidationError
 import psutil
 from dotenv import load_dotenv
 from fastapi import UploadFile, File
 import openai
 
+from tts_scheduler import TTSPriorityGate
+from phrase_bank import PhraseBank, OPENERS, CUES, split_opener
+from text_chunker import balanced_target, chunk_text, take_sentences
+from audio_pipeline import ChunkCache, LiveRender, assemble_wav, pcm_view, streaming_wav_header, synthesize_ordered, to_int16
+from audio_store import AudioStore, variant_key
+from audio_codecs import FORMATS, make_encoder, negotiate_format, streamable_format
+from audio_http import CACHE_IMMUTABLE, CACHE_NONE, CACHE_REVALIDATE, cached_file_response, parse_range
+import jobs
+from jobs import JobStore
+from metrics import metrics
+from image_store import ImageCache, ImageData, sniff_media_type
+from sessions import Session, SessionStore, normalize_history
+from answer_budget import AnswerBudget
+from answer_cache import AnswerCache, CachedAnswer, answer_similarity, parse_thresholds
+from playlist import M3U_MEDIA_TYPE, Segment, estimate_duration, render_m3u8, segment_id
+from stream_pump import END, executor, pump
+
 load_dotenv()
 
 # Logging Configuration
@@ -32,10 +49,58 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Execution resources
-executor = ThreadPoolExecutor(max_workers=10) # General pool
-AUDIO_DIR = Path(__file__).parent / "audio"
-AUDIO_DIR.mkdir(exist_ok=True)
+# Execution resources (the general pool, executor, comes from stream_pump)
+# Rendered audio, phrase banks and the shipped cue files (relative to server/)
+AUDIO_DIR = Path(__file__).parent / os.getenv("LUMINA_AUDIO_DIR", "audio")
+AUDIO_DIR.mkdir(parents=True, exist_ok=True)
+
+# Speculative TTS: pre-render answers at the lowest priority while the user reads
+SPECULATIVE_TTS = os.getenv("LUMINA_SPECULATIVE_TTS", "0").lower() in ("1", "true", "yes")
+SPECULATIVE_TTL = 1800 # Unclaimed speculative audio is evicted with the job cache
+# TTS work-item sizing (characters): balanced chunks, small first chunk for fast first audio
+TTS_CHUNK_CHARS = int(os.getenv("LUMINA_TTS_CHUNK_CHARS", "180"))
+TTS_FIRST_CHUNK_CHARS = int(os.getenv("LUMINA_TTS_FIRST_CHUNK_CHARS", "60"))
+# Texts of one /api/tts/batch request rendered at the same time (default: TTS worker count)
+TTS_BATCH_CONCURRENCY = int(os.getenv("LUMINA_TTS_BATCH_CONCURRENCY", "0"))
+# Chunk-level audio reuse across /api/tts, /api/stream and speculative renders
+chunk_cache = ChunkCache(int(os.getenv("LUMINA_CHUNK_CACHE_MB", "64")) * 1024 * 1024)
+tts_gate = TTSPriorityGate(idle_cpu_percent=float(os.getenv("LUMINA_SPECULATIVE_CPU_IDLE", "50")))
+
+# Uploaded screenshots by content hash, so follow-up turns reference instead of re-sending them
+image_cache = ImageCache(int(os.getenv("LUMINA_IMAGE_CACHE_MB", "128")) * 1024 * 1024)
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+
+# Conversation state per sessionId, so follow-ups don't resend history (optionally persisted)
+SESSION_DB = os.getenv("LUMINA_SESSION_DB", "")
+session_store = SessionStore(
+    ttl=float(os.getenv("LUMINA_SESSION_TTL", "86400")),
+    max_bytes=int(os.getenv("LUMINA_SESSION_MB", "32")) * 1024 * 1024,
+    db_path=Path(__file__).parent / SESSION_DB if SESSION_DB else None
+)
+
+# Near-duplicate questions (the same passage give or take a few words, a rephrased
+# prompt) reuse the stored answer and its audio; a sample of hits is re-asked to audit
+ANSWER_CACHE = os.getenv("LUMINA_ANSWER_CACHE", "1").lower() in ("1", "true", "yes")
+answer_cache = AnswerCache(
+    threshold=float(os.getenv("LUMINA_ANSWER_CACHE_THRESHOLD", "0.85")),
+    tone_thresholds=parse_thresholds(os.getenv("LUMINA_ANSWER_CACHE_TONE_THRESHOLDS", "")),
+    persona_threshold=float(os.getenv("LUMINA_ANSWER_CACHE_PERSONA_THRESHOLD", "0.95")),
+    max_entries=int(os.getenv("LUMINA_ANSWER_CACHE_ENTRIES", "5000")),
+    ttl=float(os.getenv("LUMINA_ANSWER_CACHE_TTL", "86400")),
+    audit_rate=float(os.getenv("LUMINA_ANSWER_CACHE_AUDIT_RATE", "0.02"))
+)
+# Audited answers sharing less vocabulary than this with a fresh one count as false positives
+ANSWER_AUDIT_MIN_SIMILARITY = float(os.getenv("LUMINA_ANSWER_CACHE_AUDIT_MIN", "0.3"))
+
+# Rendered answers (tts_* and job_*) live in append-only segments, not one file each
+audio_store = AudioStore(
+    AUDIO_DIR / "store",
+    segment_bytes=int(os.getenv("LUMINA_AUDIO_SEGMENT_MB", "64")) * 1024 * 1024
+)
+
+# Pre-rendered phrases per voice and model version, persisted across sessions
+opener_bank = PhraseBank(AUDIO_DIR / "openers", OPENERS) # "Oh...", "Well..."
+cue_bank = PhraseBank(AUDIO_DIR / "cues", CUES) # Latency-masking cues for on-demand play
 
 # Session Cleanup Logic
 def cleanup_audio_files():
@@ -43,8 +108,13 @@ def cleanup_audio_files():
     try:
         count = 0
         for wav_file in AUDIO_DIR.glob("*.wav"):
+            # Shipped single-voice cues are the fallback until the cue bank is rendered
+            if wav_file.stem in CUES:
+                continue
             wav_file.unlink()
             count += 1
+        count += len(audio_store)
+        audio_store.clear()
         logger.info(f"Session Cleanup: Deleted {count} residual audio files.")
     except Exception as e:
         logger.error(f"Cleanup Error: {e}")
@@ -57,19 +127,25 @@ async def periodic_cache_cleanup():
             await asyncio.sleep(300) # Run every 5 minutes
             
             now = time.time()
-            expired_ids = []
             
-            # Identify expired items (TTL: 30 minutes = 1800s)
-            for jid, data in _request_cache.items():
-                if now - data['timestamp'] > 1800:
-                    expired_ids.append(jid)
+            # Drop expired jobs (TTL: 30 minutes = 1800s)
+            expired = job_store.expire(now)
+            if expired:
+                logger.info(f"Cache Cleanup: Removed {expired} expired jobs.")
+            expired = session_store.expire(now)
+            if expired:
+                logger.info(f"Cache Cleanup: Removed {expired} expired sessions.")
+            expired = answer_cache.expire(now)
+            if expired:
+                logger.info(f"Cache Cleanup: Removed {expired} expired cached answers.")
             
-            # Delete them
-            for jid in expired_ids:
-                del _request_cache[jid]
-                
-            if expired_ids:
-                logger.info(f"Cache Cleanup: Removed {len(expired_ids)} expired jobs.")
+            # Speculative audio nobody played is the first thing to go
+            evicted = evict_speculative_audio(now)
+            if evicted:
+                logger.info(f"Cache Cleanup: Evicted {evicted} unclaimed speculative audio files.")
+            
+            # Reclaim segments left mostly empty by evictions
+            await asyncio.get_event_loop().run_in_executor(executor, audio_store.compact)
                 
     except asyncio.CancelledError:
         pass
@@ -127,15 +203,28 @@ async def lifespan_context(app: FastAPI):
     try:
         get_handler("llm")
         get_handler("tts")
-        # Generate friendly cue
-        await ensure_audio_cue()
     except Exception as e:
         logger.warning(f"Handler pre-init warning: {e}")
+    
+    # Render cues and openers for every cached voice without blocking startup
+    schedule_phrase_render(cue_bank, None)
+    schedule_phrase_render(opener_bank, None)
         
     yield
     
     # Shutdown
     cache_task.cancel()
+    for task in list(_phrase_render_tasks):
+        task.cancel()
+    for render in list(_speculative_tasks.values()):
+        render.task.cancel()
+    for task in list(_segment_tasks):
+        task.cancel()
+    for task in list(_batch_tasks.values()):
+        task.cancel()
+    for task in list(_audit_tasks):
+        task.cancel()
+    session_store.close()
     logger.info("Lumina server shutting down...")
 
 app = FastAPI(
@@ -152,16 +241,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-import io
 from fastapi.responses import StreamingResponse
 
 # ... (Previous imports kept in context of file, assuming we add StreamingResponse)
 
+class LatencyBudget(BaseModel):
+    audibleWithin: float | None = None # Seconds until the answer should start playing (hedges a silent provider)
+    finishedWithin: float | None = None # Seconds the answer may take to generate (default: LUMINA_ANSWER_TIME_LIMIT, off)
+    maxTokens: int | None = None # Default: by tone (concise answers are shorter)
+
 class GenerateRequest(BaseModel):
     text: str
     prompt: str
     screenshot: str | None = None
     screenshots: list[str] | None = None
+    imageHashes: list[str] | None = None # Screenshots uploaded to /api/images
+    sessionId: str | None = None # Server-side conversation: follow-ups omit history, text and images
     autoRead: bool = True
     apiKey: str | None = None
     voice: str = "alba"
@@ -176,18 +271,34 @@ class GenerateRequest(BaseModel):
     customPersona: str | None = None
     history: list[dict[str, str]] | None = None
     shouldAudio: bool = False # 🎯 v3.0: Default to False for on-demand
+    speculativeAudio: bool | None = None # None = server default (LUMINA_SPECULATIVE_TTS)
     
     # Performance
     useCuda: bool = False
     stream: bool = False
+    audioFormat: str | None = None # wav | wav16k | opus | flac (default: Accept header, else wav)
+    latencyBudget: LatencyBudget | None = None # Answers stop at a sentence end once it is used up
+    twoStage: bool | None = None # Fast-model opener while a slower model writes (None = LUMINA_TWO_STAGE); /ws/session only
     
     # Internal
     preGeneratedText: str | None = None
-    jobId: str | None = None
+    jobId: str | None = None # Also client-chosen (an unused job_* id), to poll /api/jobs during generation
 
 class TTSRequest(BaseModel):
     text: str
     voice: str = "alba"
+    stream: bool = False # Progressive WAV response instead of JSON with audioUrl
+    format: str | None = None # wav | wav16k | opus | flac (default: Accept header, else wav)
+
+class BatchTTSItem(BaseModel):
+    text: str
+    voice: str = "alba"
+    tier: str = "foreground" # foreground | background (waits out foreground synthesis)
+
+class BatchTTSRequest(BaseModel):
+    items: list[BatchTTSItem]
+    format: str | None = None
+    concurrency: int | None = None # Capped at the TTS worker count
 
 _handlers = {
     "llm": None,
@@ -216,6 +327,19 @@ async def health_check():
         "device": "cuda" if torch.cuda.is_available() else "cpu"
     }
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """Counters and timings (image payload savings, LLM latency per provider) plus cache sizes."""
+    return {
+        **metrics.snapshot(),
+        "audioStore": audio_store.stats(),
+        "imageCache": {"entries": len(image_cache), "bytes": image_cache.size},
+        "sessions": {"entries": len(session_store), "bytes": session_store.size},
+        "answerCache": {"entries": len(answer_cache)},
+        # Provider health, once the LLM handler is loaded
+        "llmRouter": _handlers["llm"].router.snapshot() if hasattr(_handlers["llm"], "router") else {},
+    }
+
 @app.post("/api/shutdown")
 async def shutdown():
     logger.info("Shutdown requested via API...")
@@ -229,91 +353,591 @@ async def shutdown():
     threading.Thread(target=kill_process, daemon=True).start()
     return {"status": "SHUTTING_DOWN"}
 
-async def ensure_audio_cue():
-    """Generates friendly startup cues if they don't exist."""
-    # 1. Loading Cue
-    cue_path = AUDIO_DIR / "cue.wav"
-    if not cue_path.exists():
-        logger.info("Generating friendly audio cue...")
-        await _generate_static_audio(cue_path, "Sure thing! Let me get my voice ready for you...")
-    
-    # 2. Ready Cue
-    ready_path = AUDIO_DIR / "ready.wav"
-    if not ready_path.exists():
-        logger.info("Generating ready audio cue...")
-        await _generate_static_audio(ready_path, "Alright... let me explain to you...")
-
-async def _generate_static_audio(path, text):
-    """Helper to generate a static WAV file."""
-    def _gen():
+# --- Phrase Banks (cues & openers) ---
+_phrase_render_tasks: set[asyncio.Task] = set()
+_phrase_render_pending: set[tuple[str, str]] = set() # (bank directory, voice)
+
+async def warm_phrase_bank(bank: PhraseBank, voices: list[str] | None):
+    """
+    Renders missing bank phrases at background priority.
+    voices=None means every voice currently in the TTS voice cache.
+    """
+    try:
         tts = get_handler("tts")
-        if not tts: return None
-        return tts.generate_speech(text=text, voice="alba", use_cuda=torch.cuda.is_available())
-        
-    audio_data = await asyncio.get_event_loop().run_in_executor(executor, _gen)
-    
-    if audio_data is not None:
-        import numpy as np
-        if audio_data.dtype != np.int16:
-            audio_data = (audio_data * 32767).astype(np.int16)
-        with wave.open(str(path), 'wb') as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(24000)
-            wf.writeframes(audio_data.tobytes())
-        logger.info(f"Generated static audio: {path}")
+        if not tts or not tts.is_available:
+            return
+        if voices is None:
+            voices = list(getattr(tts, 'voice_cache', {}))
+        missing = bank.missing(tts, voices)
+        if not missing:
+            return
+        logger.info(f"Phrase bank ({bank.directory.name}): rendering {len(missing)} phrases in the background...")
+        loop = asyncio.get_event_loop()
+        for voice, key in missing:
+            async with tts_gate.background():
+                await loop.run_in_executor(executor, bank.get, tts, voice, key)
+        logger.info(f"Phrase bank ({bank.directory.name}): ready for {len(voices)} voices.")
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        logger.error(f"Phrase bank ({bank.directory.name}) warm-up error: {e}")
+    finally:
+        for voice in voices or []:
+            _phrase_render_pending.discard((str(bank.directory), voice))
+
+def schedule_phrase_render(bank: PhraseBank, voices: list[str] | None):
+    """Queues a background render; a voice already queued for this bank is skipped."""
+    if voices is not None:
+        voices = [v for v in voices if (str(bank.directory), v) not in _phrase_render_pending]
+        if not voices:
+            return
+        _phrase_render_pending.update((str(bank.directory), v) for v in voices)
+    task = asyncio.create_task(warm_phrase_bank(bank, voices))
+    _phrase_render_tasks.add(task)
+    task.add_done_callback(_phrase_render_tasks.discard)
+
+def serve_cue(key: str, voice: str):
+    """
+    Serves a latency-masking cue in the requested voice.
+    Never synthesizes at request time: a missing variant is queued for background
+    rendering and the default voice (or the shipped cue file) is served meanwhile.
+    """
+    tts = _handlers["tts"]
+    if tts is not None:
+        cue_path = cue_bank.path_for(tts, voice, key)
+        if cue_path.exists():
+            return FileResponse(cue_path, media_type="audio/wav")
+        if tts.is_available and voice in getattr(tts, 'voice_cache', {}):
+            schedule_phrase_render(cue_bank, [voice])
+        default_path = cue_bank.path_for(tts, "alba", key)
+        if default_path.exists():
+            return FileResponse(default_path, media_type="audio/wav")
+    
+    legacy_path = AUDIO_DIR / f"{key}.wav"
+    if legacy_path.exists():
+        return FileResponse(legacy_path, media_type="audio/wav")
+    raise HTTPException(status_code=404, detail="Audio cue not ready")
+
+def plan_text_audio(text: str, workers: int = MAX_TTS_WORKERS) -> tuple[str | None, list[str]]:
+    """Splits text into (opener key, TTS chunks) the way every render path does."""
+    opener_key, body = split_opener(text)
+    chunks = chunk_text(
+        body,
+        target=balanced_target(body, workers, TTS_CHUNK_CHARS),
+        first_chunk=TTS_FIRST_CHUNK_CHARS
+    )
+    return opener_key, chunks
+
+async def render_text_audio(tts, text: str, voice: str, use_cuda: bool, gate=None, workers: int = MAX_TTS_WORKERS, progress=None):
+    """
+    Audio for a piece of text, in order: the opener from the bank (if any), then
+    the rest as balanced chunks rendered in parallel. Chunk work starts before
+    the opener is yielded so the two overlap.
+    progress(done, total) is called as pieces are yielded.
+    """
+    loop = asyncio.get_event_loop()
+    opener_key, chunks = plan_text_audio(text, workers)
+    logger.info(f"Starting parallel generation for {len(chunks)} chunks (opener: {opener_key})...")
+    chunk_audio = synthesize_ordered(
+        tts, chunks, voice, use_cuda, executor, workers,
+        gate or tts_gate.foreground, chunk_cache
+    )
+    total = len(chunks) + (1 if opener_key else 0)
+    done = 0
+    if progress:
+        progress(done, total)
+    if opener_key:
+        yield await loop.run_in_executor(executor, opener_bank.get, tts, voice, opener_key)
+        done += 1
+        if progress:
+            progress(done, total)
+    async for audio in chunk_audio:
+        yield audio
+        done += 1
+        if progress:
+            progress(done, total)
+
+def tts_model_version() -> str:
+    """
+    The TTS model version, without loading the model on the event loop: the
+    initialized handler's, else what the handler reports once it has loaded.
+    """
+    tts = _handlers["tts"]
+    if tts is not None:
+        return getattr(tts, 'model_version', 'unknown')
+    from tts_handler import detect_model_version
+    return detect_model_version()
+
+def tts_cache_key(text: str, voice: str) -> str:
+    """
+    Content-addressed audio store key shared by /api/tts and the speculative path.
+    Includes the model version, so the URL really identifies the audio (it is
+    served as immutable).
+    """
+    model_version = tts_model_version()
+    text_hash = hashlib.md5(f"{model_version}_{voice}_{text}".encode()).hexdigest()
+    return f"tts_{text_hash}"
+
+def resolve_audio_format(http_request: Request, requested: str | None) -> str:
+    """Output format from the request field or the Accept header (400 if unknown)."""
+    try:
+        return negotiate_format(http_request.headers.get("accept"), requested)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def with_format(url: str, audio_format: str) -> str:
+    return url if audio_format == "wav" else f"{url}?format={audio_format}"
+
+def audio_file_url(prefix: str, key: str, audio_format: str) -> str:
+    """/api/audio/tts_ab.opus: named for what it serves (?format= only where the extension can't say, wav16k)."""
+    extension = FORMATS[audio_format].extension
+    url = f"{prefix}/{key}.{extension}"
+    return url if audio_format == extension else f"{url}?format={audio_format}"
+
+def split_audio_filename(filename: str) -> tuple[str, str]:
+    """tts_ab.opus -> (tts_ab, opus); a name without a known extension is all key."""
+    key, _, extension = filename.rpartition(".")
+    if not key or extension not in {f.extension for f in FORMATS.values()}:
+        return filename, "wav"
+    return key, extension
+
+def stored_file_format(http_request: Request, prefix: str, key: str, extension: str, requested: str | None) -> str:
+    """
+    Output format for a stored render requested as <key>.<extension>.
+    .opus/.flac imply their format; a format that doesn't match the name's
+    extension (tts_ab.wav?format=opus) redirects to the matching name.
+    """
+    if requested is None and extension != "wav":
+        requested = extension
+    audio_format = resolve_audio_format(http_request, requested)
+    if FORMATS[audio_format].extension != extension:
+        location = audio_file_url(prefix, key, audio_format)
+        raise HTTPException(status_code=307, detail=f"{audio_format} is served as {location}",
+                            headers={"Location": location, "Vary": "Accept"})
+    return audio_format
+
+def delete_stored_audio(key: str):
+    """Removes a render and every encoded variant of it."""
+    for name in FORMATS:
+        audio_store.delete(variant_key(key, name))
+
+async def stored_audio_response(http_request: Request, key: str, audio_format: str = "wav") -> Response:
+    """
+    Serves a stored render, sliced straight out of its mapped segment, with
+    ETag/304 and Range/206 support.
+    Encoded variants are produced on first request and cached in the store.
+    """
+    loop = asyncio.get_event_loop()
+    served_key = variant_key(key, audio_format)
+    if served_key not in audio_store:
+        encoder = make_encoder(audio_format, audio_store.get(key).sample_rate)
+        try:
+            await loop.run_in_executor(executor, audio_store.encode_variant, key, encoder)
+        finally:
+            encoder.close()
+    etag = await loop.run_in_executor(executor, audio_store.etag, served_key)
+    return cached_file_response(
+        http_request,
+        audio_store.size(served_key),
+        lambda start, end: audio_store.iter_audio(served_key, start, end),
+        FORMATS[audio_format].media_type,
+        etag,
+        # tts_* and seg_* keys are content-addressed
+        CACHE_IMMUTABLE if key.startswith(("tts_", "seg_")) else CACHE_REVALIDATE,
+        headers={"Vary": "Accept"}
+    )
+
+# Largest slice served per range request on a render that is still in progress
+LIVE_RANGE_BYTES = 1024 * 1024
+
+async def live_audio_response(http_request: Request, job_id: str, live: LiveRender) -> Response:
+    """
+    Serves a job's WAV while it is still being synthesized. Range requests get
+    what exists so far (Content-Range total "*", waiting for the first byte if
+    needed); plain requests follow the render to the end instead of starting a
+    second synthesis.
+    """
+    byte_range = parse_range(http_request.headers.get("range"), None)
+    start = byte_range[0] if byte_range else 0
+    await live.wait_for(start)
+    if live.done:
+        # Finished (or failed) meanwhile: the stored file has the exact header
+        if job_id in audio_store:
+            return await stored_audio_response(http_request, job_id)
+        raise HTTPException(status_code=404, detail="Job expired or not found")
+    
+    headers = {"Cache-Control": CACHE_NONE, "Accept-Ranges": "bytes"}
+    if byte_range is None:
+        return StreamingResponse(live.follow(), media_type="audio/wav", headers=headers)
+    end = min(live.available, start + LIVE_RANGE_BYTES) - 1
+    if byte_range[1] is not None:
+        end = min(end, byte_range[1])
+    return Response(
+        await live.read(start, end + 1), status_code=206, media_type="audio/wav",
+        headers={**headers, "Content-Range": f"bytes {start}-{end}/*"}
+    )
 
 @app.post("/api/tts")
-async def generate_tts_standalone(request: TTSRequest, check_only: bool = False):
+async def generate_tts_standalone(request: TTSRequest, http_request: Request, check_only: bool = False):
     """Generates or checks for audio for a specific piece of text on-demand."""
-    text_hash = hashlib.md5(f"{request.voice}_{request.text}".encode()).hexdigest()
-    filename = f"tts_{text_hash}.wav"
-    save_path = AUDIO_DIR / filename
+    key = tts_cache_key(request.text, request.voice)
+    audio_format = resolve_audio_format(http_request, request.format)
+    audio_url = audio_file_url("/api/audio", key, audio_format)
     
-    is_cached = save_path.exists()
+    # A speculative render of this exact answer is in flight: promote it
+    # to foreground priority and wait for it instead of starting over.
+    speculative = _speculative_tasks.get(key)
+    if speculative is not None and not check_only:
+        logger.info(f"🔮 [SPECULATIVE] Promoting in-flight render for {key}")
+        speculative.promoted.set()
+        try:
+            await asyncio.shield(speculative.task)
+        except Exception as e:
+            logger.warning(f"🔮 [SPECULATIVE] Promoted render failed: {e}")
+    
+    batch_render = _batch_tasks.get(key)
+    if batch_render is not None and not check_only:
+        try:
+            await asyncio.shield(batch_render)
+        except Exception as e:
+            logger.warning(f"📦 [BATCH] Joined render failed: {e}")
+    
+    is_cached = key in audio_store
+    if is_cached and not check_only:
+        # Claimed by a real play request, so it is no longer speculative
+        _speculative_audio.pop(key, None)
     
     if check_only or is_cached:
         return {
             "is_cached": is_cached,
-            "audioUrl": f"/api/audio/{filename}"
+            "audioUrl": audio_url
         }
     
-    # Generate it (Full generation mode)
-    def _run_tts():
-        tts = get_handler("tts")
-        audio_data = tts.generate_speech(text=request.text, voice=request.voice, use_cuda=torch.cuda.is_available())
-        if audio_data is not None:
-             import numpy as np
-             if audio_data.dtype != np.int16:
-                 audio_data = (audio_data * 32767).astype(np.int16)
-             with wave.open(str(save_path), 'wb') as wf:
-                wf.setnchannels(1)
-                wf.setsampwidth(2)
-                wf.setframerate(24000)
-                wf.writeframes(audio_data.tobytes())
-             return True
-        return False
-
-    success = await asyncio.get_event_loop().run_in_executor(executor, _run_tts)
-    if success:
-        return {"audioUrl": f"/api/audio/{filename}"}
-    else:
+    # Generate it: parallel chunked synthesis, no length limit
+    tts = get_handler("tts")
+    sample_rate = getattr(tts, 'sample_rate', 24000)
+    audio_iter = render_text_audio(tts, request.text, request.voice, torch.cuda.is_available())
+    if request.stream:
+        audio_format = streamable_format(audio_format)
+    # Encode alongside synthesis so the compressed variant is cached on completion
+    encoder = make_encoder(audio_format, sample_rate)
+    
+    if request.stream:
+        # Progressive: playback starts with the first chunk; the file is saved when done
+        return StreamingResponse(
+            assemble_wav(audio_iter, sample_rate, audio_store.writer(key, sample_rate), progressive=True, encoder=encoder),
+            media_type=FORMATS[audio_format].media_type
+        )
+    
+    try:
+        async for _ in assemble_wav(audio_iter, sample_rate, audio_store.writer(key, sample_rate), emit=False, encoder=encoder):
+            pass
+    except Exception as e:
+        logger.error(f"🎵 [TTS] Generation failed: {e}")
         raise HTTPException(status_code=500, detail="TTS Generation failed")
+    return {"audioUrl": audio_url}
+
+# --- Batch pre-rendering ---
+_batch_tasks: dict[str, asyncio.Task] = {} # store key -> in-flight batch render
+
+async def render_batch_item(tts, key: str, item: BatchTTSItem, audio_format: str, slots: asyncio.Semaphore):
+    """Renders one batch text into the store; the slot bounds a batch's concurrent texts."""
+    async with slots:
+        if key in audio_store:
+            return
+        # One chunk at a time per text: the batch's parallelism comes from its texts
+        # (background ones too: they only defer to foreground work)
+        gate = tts_gate.after_foreground if item.tier == "background" else None
+        sample_rate = getattr(tts, 'sample_rate', 24000)
+        audio_iter = render_text_audio(tts, item.text, item.voice, torch.cuda.is_available(), gate=gate, workers=1)
+        encoder = make_encoder(audio_format, sample_rate)
+        async for _ in assemble_wav(audio_iter, sample_rate, audio_store.writer(key, sample_rate), emit=False, encoder=encoder):
+            pass
+
+def schedule_batch_item(tts, key: str, item: BatchTTSItem, audio_format: str, slots: asyncio.Semaphore) -> asyncio.Task:
+    """
+    Starts (or joins) the render of one key. Renders are tasks of their own,
+    so a client that disconnects mid-batch still leaves the audio cached.
+    """
+    task = _batch_tasks.get(key)
+    if task is None:
+        task = asyncio.create_task(render_batch_item(tts, key, item, audio_format, slots))
+        _batch_tasks[key] = task
+        task.add_done_callback(lambda _: _batch_tasks.pop(key, None))
+    return task
+
+async def batch_events(items: list[BatchTTSItem], audio_format: str, concurrency: int):
+    """NDJSON events: 'accepted', then one 'item' per input in completion order, then 'complete'."""
+    tts = get_handler("tts")
+    slots = asyncio.Semaphore(concurrency)
+    keys = [tts_cache_key(item.text, item.voice) for item in items]
+    indexes: dict[str, list[int]] = {}
+    for index, key in enumerate(keys):
+        indexes.setdefault(key, []).append(index)
+
+    def event(key: str, status: str, error: str | None = None) -> bytes:
+        body = {
+            "type": "item", "indexes": indexes[key], "id": key, "status": status,
+            "audioUrl": audio_file_url("/api/audio", key, audio_format) if status != "failed" else None,
+        }
+        if error:
+            body["error"] = error
+        return (json.dumps(body) + "\n").encode()
+
+    cached = [key for key in indexes if key in audio_store]
+    pending = {}
+    for key in indexes:
+        if key in audio_store:
+            continue
+        speculative = _speculative_tasks.get(key)
+        if speculative is not None:
+            # Already rendering for /api/generate: wait for that one instead (at
+            # foreground priority only if a foreground item asked for it)
+            if any(items[index].tier == "foreground" for index in indexes[key]):
+                speculative.promoted.set()
+            task = speculative.task
+        else:
+            task = schedule_batch_item(tts, key, items[indexes[key][0]], audio_format, slots)
+        pending[asyncio.ensure_future(asyncio.shield(task))] = key
+
+    yield (json.dumps({
+        "type": "accepted", "items": len(items), "unique": len(indexes),
+        "cached": len(cached), "rendering": len(pending), "concurrency": concurrency,
+    }) + "\n").encode()
+    for key in cached:
+        yield event(key, "cached")
+
+    failed = 0
+    waiting = set(pending)
+    try:
+        while waiting:
+            finished, waiting = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            for future in finished:
+                key = pending[future]
+                error = None if future.cancelled() else future.exception()
+                if future.cancelled() or error is not None or key not in audio_store:
+                    failed += 1
+                    yield event(key, "failed", str(error) if error else "render did not complete")
+                else:
+                    yield event(key, "done")
+    finally:
+        # The client went away: stop listening, the renders themselves carry on
+        for future in waiting:
+            future.cancel()
+    yield (json.dumps({"type": "complete", "done": len(cached) + len(pending) - failed, "failed": failed}) + "\n").encode()
+
+@app.post("/api/tts/batch")
+async def generate_tts_batch(request: BatchTTSRequest, http_request: Request):
+    """
+    Pre-renders many texts in one request. Items are deduplicated against the
+    store, in-flight renders and each other, synthesized in parallel up to the
+    batch's concurrency cap, and reported as newline-delimited JSON events as
+    each one finishes.
+    """
+    audio_format = resolve_audio_format(http_request, request.format)
+    for item in request.items:
+        if item.tier not in ("foreground", "background"):
+            raise HTTPException(status_code=400, detail="tier must be 'foreground' or 'background'")
+    concurrency = request.concurrency or TTS_BATCH_CONCURRENCY or MAX_TTS_WORKERS
+    concurrency = max(1, min(concurrency, MAX_TTS_WORKERS))
+    logger.info(f"📦 [BATCH] {len(request.items)} items, concurrency {concurrency}, format {audio_format}")
+    return StreamingResponse(
+        batch_events(request.items, audio_format, concurrency),
+        media_type="application/x-ndjson"
+    )
 
 @app.get("/api/audio/{filename}")
-async def get_audio_file(filename: str):
-    """Serves generated audio files from the audio directory."""
+async def get_audio_file(filename: str, http_request: Request, voice: str = "alba", format: str | None = None):
+    """Serves generated audio, in the requested format, from the audio store or directory."""
+    # cue.wav / ready.wav come from the per-voice cue bank
+    if filename.endswith(".wav") and filename[:-4] in CUES:
+        return serve_cue(filename[:-4], voice)
+    
+    key, extension = split_audio_filename(filename)
+    if key in audio_store:
+        audio_format = stored_file_format(http_request, "/api/audio", key, extension, format)
+        return await stored_audio_response(http_request, key, audio_format)
+    
     file_path = AUDIO_DIR / filename
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="Audio file not found")
     return FileResponse(file_path)
 
+# Request field and environment variable holding each provider's key
+LLM_KEY_SOURCES = {
+    "gemini": ("apiKey", "GEMINI_API_KEY"),
+    "openai": ("apiKeyOpenai", "OPENAI_API_KEY"),
+    "claude": ("apiKeyClaude", "ANTHROPIC_API_KEY"),
+    "groq": ("apiKeyGroq", "GROQ_API_KEY"),
+}
+
+def llm_api_keys(request: GenerateRequest) -> dict[str, str]:
+    """Every provider key the request can use ("auto" routing and fallback). Priority: Request Payload > Environment Variable"""
+    keys = {}
+    for provider, (field, env) in LLM_KEY_SOURCES.items():
+        key = getattr(request, field) or os.getenv(env)
+        if key and key.strip():
+            keys[provider] = key.strip()
+    return keys
+
+def llm_api_key(request: GenerateRequest) -> str | None:
+    """API key for the request's provider (Gemini's for unknown providers; none for "auto")."""
+    if request.llmProvider == "auto":
+        return None
+    return llm_api_keys(request).get(request.llmProvider if request.llmProvider in LLM_KEY_SOURCES else "gemini")
+
+def answer_budget(request: GenerateRequest) -> AnswerBudget:
+    """Token and time budget for the request's answer (its clock starts now)."""
+    limits = request.latencyBudget or LatencyBudget()
+    max_tokens = max(32, min(limits.maxTokens, 4096)) if limits.maxTokens else None
+    return AnswerBudget(max_tokens, limits.audibleWithin, limits.finishedWithin)
+
+# --- Conversation sessions ---
+class UnknownSession(Exception):
+    """A follow-up named a session the server doesn't have (expired, or lost in a restart)."""
+
+def apply_session(request: GenerateRequest) -> Session | None:
+    """
+    Completes a request from its server-side session. A request that carries
+    history (re)starts the session with it and its text and images; one
+    without is a follow-up that inherits them and must name a known session.
+    """
+    if not request.sessionId:
+        return None
+    session = session_store.get(request.sessionId)
+    if request.history is not None:
+        session = session or Session(request.sessionId)
+        session.history = normalize_history(request.history)
+        session.text = request.text
+        session.image_hashes = list(request.imageHashes or [])
+    elif session is None:
+        raise UnknownSession(request.sessionId)
+    else:
+        request.history = list(session.history)
+        if request.text.strip():
+            session.text = request.text
+        else:
+            request.text = session.text
+        if request.imageHashes:
+            session.image_hashes = list(request.imageHashes)
+        elif not request.screenshot and not request.screenshots:
+            request.imageHashes = list(session.image_hashes) or None
+    session_store.save(session)
+    return session
+
+# --- Near-duplicate answers ---
+_PROVIDER_ERROR = re.compile(r"^Error: |\b(?:Gemini|OpenAI|Groq|Claude) Error: ")
+_audit_tasks: set[asyncio.Task] = set()
+
+def answer_cache_scope(request: GenerateRequest) -> str | None:
+    """
+    Answers are only shared within a scope (provider, tone, persona, screenshots).
+    None when the answer depends on more than text and prompt: follow-ups with
+    history, and legacy base64 screenshots (which have no hash to compare).
+    """
+    if not ANSWER_CACHE or request.history or request.screenshot or request.screenshots:
+        return None
+    return "|".join([
+        request.llmProvider or "gemini", request.responseTone or "", request.customPersona or "",
+        ",".join(sorted(request.imageHashes or []))
+    ])
+
+def cacheable_answer(answer: str) -> bool:
+    """Providers report failures in-band; those are not answers to reuse."""
+    return bool(answer.strip()) and not _PROVIDER_ERROR.search(answer)
+
+def reusable_audio(entry: CachedAnswer, request: GenerateRequest) -> str | None:
+    """Job id of the cached answer's audio in this voice, if it is stored, rendering or still streamable."""
+    if not entry.job_id or entry.voice != request.voice:
+        return None
+    if entry.job_id in audio_store or entry.job_id in _live_renders or job_store.get(entry.job_id) is not None:
+        return entry.job_id
+    return None
+
+async def audit_cached_answer(entry: CachedAnswer, request: GenerateRequest, images: list[ImageData]):
+    """Re-asks the provider and drops the cached answer if the fresh one has little in common with it."""
+    llm = get_handler("llm")
+    try:
+        fresh = await asyncio.get_event_loop().run_in_executor(executor, lambda: "".join(llm.generate_answer_stream(
+            text=request.text, prompt=request.prompt, api_key=llm_api_key(request),
+            provider=request.llmProvider, tone=request.responseTone,
+            custom_persona=request.customPersona, images=images, api_keys=llm_api_keys(request)
+        )))
+    except Exception as e:
+        logger.warning(f"Answer cache audit failed: {e}")
+        return
+    if not cacheable_answer(fresh):
+        return
+    similarity = answer_similarity(entry.answer, fresh)
+    metrics.increment("answer_cache.audits")
+    metrics.observe("answer_cache.audit_similarity", similarity)
+    if similarity < ANSWER_AUDIT_MIN_SIMILARITY:
+        metrics.increment("answer_cache.false_positives")
+        logger.warning(f"Answer cache false positive ({similarity:.2f}): {entry.prompt[:60]!r} served for {request.prompt[:60]!r}")
+        answer_cache.discard(entry)
+
+def schedule_answer_audit(entry: CachedAnswer, request: GenerateRequest, images: list[ImageData]):
+    task = asyncio.create_task(audit_cached_answer(entry, request.model_copy(), images))
+    _audit_tasks.add(task)
+    task.add_done_callback(_audit_tasks.discard)
+
+def unknown_session_error(e: UnknownSession) -> HTTPException:
+    return HTTPException(status_code=409, detail={"error": f"Unknown session: {e}", "unknownSession": True})
+
+# --- Screenshots ---
+class MissingImages(Exception):
+    """Image hashes the cache doesn't have (never uploaded, or evicted): the client re-uploads."""
+    def __init__(self, hashes: list[str]):
+        super().__init__(f"Unknown image hashes: {', '.join(hashes)}")
+        self.hashes = hashes
+
+def resolve_images(request: GenerateRequest) -> list[ImageData]:
+    """Decoded images for request.imageHashes; raises MissingImages for unknown hashes."""
+    images, missing = [], []
+    for digest in request.imageHashes or []:
+        image = image_cache.get(digest)
+        if image is None:
+            missing.append(digest)
+        else:
+            images.append(image)
+    if missing:
+        raise MissingImages(missing)
+    return images
+
+def missing_images_error(e: MissingImages) -> HTTPException:
+    return HTTPException(status_code=409, detail={"error": str(e), "missingImages": e.hashes})
+
+@app.post("/api/images")
+async def upload_images(files: list[UploadFile] = File(...)):
+    """
+    Binary screenshot upload (multipart). Returns each image's content hash
+    for GenerateRequest.imageHashes; uploading the same image again is a no-op.
+    """
+    uploaded = []
+    for file in files:
+        data = await file.read(MAX_IMAGE_BYTES + 1)
+        if len(data) > MAX_IMAGE_BYTES:
+            raise HTTPException(status_code=413, detail=f"{file.filename}: image larger than {MAX_IMAGE_BYTES} bytes")
+        media_type = sniff_media_type(data)
+        if media_type is None:
+            raise HTTPException(status_code=415, detail=f"{file.filename}: not a PNG, JPEG, GIF or WebP image")
+        digest = image_cache.put(ImageData(data, media_type))
+        uploaded.append({"hash": digest, "bytes": len(data), "mediaType": media_type})
+    return {"images": uploaded}
+
+@app.head("/api/images/{digest}")
+async def check_image(digest: str):
+    """200 if the server still has this image (skip the upload), else 404."""
+    if digest not in image_cache:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return {}
+
 # --- Streaming Logic ---
-# --- Streaming Logic ---
-async def stream_generator(request: GenerateRequest):
+async def stream_generator(request: GenerateRequest, audio_format: str = "wav"):
     """
     Generator that pipelines LLM text -> TTS -> Audio Bytes
     """
+    sink = None
     try:
         # Debug Logging
         logger.info(f"Stream Job Request: Provider={request.llmProvider}")
@@ -325,179 +949,265 @@ async def stream_generator(request: GenerateRequest):
         llm = get_handler("llm")
         tts = get_handler("tts")
         
+        full_text_response = ""
         if request.preGeneratedText:
             logger.info("Using pre-generated text from cache...")
             full_text_response = request.preGeneratedText
         else:
             # Fallback for direct streaming calls (legacy)
             logger.info("No pre-generated text found. Calling LLM...")
+            job_store.update(request.jobId, state=jobs.LLM)
             
-            # Select correct API key based on provider
-            # Priority: Request Payload > Environment Variable
-            key_to_use = None
-            
-            if request.llmProvider == "groq":
-                key_to_use = request.apiKeyGroq or os.getenv("GROQ_API_KEY")
-            elif request.llmProvider == "openai":
-                key_to_use = request.apiKeyOpenai or os.getenv("OPENAI_API_KEY")
-            elif request.llmProvider == "claude":
-                key_to_use = request.apiKeyClaude or os.getenv("ANTHROPIC_API_KEY")
-            else:
-                # Default to Gemini
-                key_to_use = request.apiKey or os.getenv("GEMINI_API_KEY")
-                
-            if key_to_use:
-                key_to_use = key_to_use.strip()
+            key_to_use = llm_api_key(request)
                 
             # We still use the stream generator to get the text, but we consume it all
-            text_stream = llm.generate_answer_stream(
+            # (on the executor: image preprocessing and the provider call block)
+            apply_session(request)
+            images = resolve_images(request)
+            budget = answer_budget(request)
+            text_stream = lambda: llm.generate_answer_stream(
                 text=request.text, prompt=request.prompt, screenshot_b64=request.screenshot,
                 screenshots=request.screenshots, api_key=key_to_use,
-                provider=request.llmProvider, tone=request.responseTone
+                provider=request.llmProvider, tone=request.responseTone,
+                images=images, api_keys=llm_api_keys(request),
+                budget=budget, two_stage=False # The whole answer is voiced at once: an opener gains nothing
             )
             
-            for chunk in text_stream:
+            async for chunk in iterate_in_executor(text_stream, threading.Event()):
                 full_text_response += chunk
+            job_store.update(request.jobId, answer=budget.to_dict())
+            if request.sessionId:
+                session_store.append_turn(request.sessionId, request.prompt, full_text_response)
             
         logger.info(f"Full LLM Response ({len(full_text_response)} chars): {full_text_response[:50]}...")
         
         # 2. TTS Generation & Audio Accumulation
         # We must send a VALID WAV file (with header). Raw PCM will not play in <audio> tag.
-        # Since we are buffering the LLM text anyway, we can buffer the audio too
-        # to ensure the WAV header has the correct length.
-        
-        sentences = [s for s in re.split(r'(?<=[.!?])\s+', full_text_response) if s.strip()]
-        tts = get_handler("tts")
-        
-        # 3. Parallel TTS Execution (Throttled)
-        semaphore = asyncio.Semaphore(MAX_TTS_WORKERS)
-        
-        async def process_sentence_task(index, sentence_text):
-            async with semaphore:
-                logger.info(f"Parallel Worker: Processing Sentence {index} ({len(sentence_text)} chars)")
-                loop = asyncio.get_event_loop()
-                audio = await loop.run_in_executor(
-                    executor,
-                    lambda: tts.generate_speech(
-                        sentence_text,
-                        voice=request.voice,
-                        use_cuda=request.useCuda
-                    )
-                )
-                return index, audio
-
-        # Create Tasks
-        tasks = []
-        for i, sentence in enumerate(sentences):
-            tasks.append(process_sentence_task(i, sentence))
-
-        # Run in Parallel (Await all)
-        logger.info(f"Starting parallel generation for {len(tasks)} sentences...")
-        results = await asyncio.gather(*tasks)
-        
-        # Sort results to maintain original text order
-        results.sort(key=lambda x: x[0])
-        
-        # 4. Assembly into WAV
-        wav_buffer = io.BytesIO()
+        # Buffered mode waits for every chunk so the header has the correct length;
+        # progressive mode (request.stream) sends an open-ended header and PCM as it lands.
         sample_rate = getattr(tts, 'sample_rate', 24000)
-        
-        with wave.open(wav_buffer, 'wb') as wf:
-            wf.setnchannels(1) 
-            wf.setsampwidth(2) # 16-bit PCM
-            wf.setframerate(sample_rate)
-            
-            for _, audio_chunk in results:
-                wf.writeframes(audio_chunk.tobytes())
-                
-        logger.info("Parallel generation completed.")
-                    
-        # Loop finished. wave.open context exit closes file and WRITES HEADER SIZE.
-        
-        # Reset pointer to start of file to read the whole valid WAV
-        wav_buffer.seek(0)
-        full_wav_data = wav_buffer.getvalue()
-        
-        # PERSISTENCE: Save to disk so we can serve it later (even after restart)
+        # The ETA runs from here, even if /api/generate already moved the job to tts
+        job_store.update(request.jobId, state=jobs.TTS, tts_started=time.time(), chunks_done=0)
+        audio_iter = render_text_audio(
+            tts, full_text_response, request.voice, request.useCuda,
+            progress=lambda done, total: job_store.progress(request.jobId, done, total)
+        )
         if request.jobId:
-             save_path = AUDIO_DIR / f"{request.jobId}.wav"
-             with open(save_path, "wb") as f:
-                 f.write(full_wav_data)
-             logger.info(f"Saved persistent audio to {save_path}")
+            # Readable while rendering: seeks and other listeners don't restart synthesis
+            sink = LiveRender(audio_store.writer(request.jobId, sample_rate), sample_rate)
+            _live_renders[request.jobId] = sink
         
-        logger.info(f"Generated complete WAV file size: {len(full_wav_data)} bytes")
-        yield full_wav_data
+        encoder = make_encoder(audio_format, sample_rate)
+        async for wav_bytes in assemble_wav(audio_iter, sample_rate, sink, progressive=request.stream, encoder=encoder):
+            yield wav_bytes
+        job_store.update(request.jobId, state=jobs.DONE)
+        logger.info("Parallel generation completed.")
 
     except Exception as e:
         logger.error(f"Stream Generator Critical Error: {e}")
+        job_store.update(request.jobId, state=jobs.FAILED, error=str(e))
         yield b""
+    finally:
+        if request.jobId and _live_renders.get(request.jobId) is sink:
+            del _live_renders[request.jobId]
+        job = job_store.get(request.jobId) if request.jobId else None
+        if job is not None and not job.terminal:
+            # Listener went away mid-render: the job can be streamed again
+            job_store.update(request.jobId, state=jobs.QUEUED)
+
+# --- Segmented Playlists ---
+_segment_pending: dict[str, asyncio.Event] = {} # segment id -> set once stored (or failed)
+_segment_tasks: set[asyncio.Task] = set()
 
-# Helper for Threaded Execution
-def handle_tts_generation(request, job_id):
+def plan_segments(tts, text: str, voice: str) -> list[Segment]:
+    """One content-addressed segment per opener/chunk of the answer."""
+    model_version = getattr(tts, 'model_version', 'unknown')
+    opener_key, chunks = plan_text_audio(text)
+    segments = []
+    if opener_key:
+        segments.append(Segment(segment_id(model_version, voice, "opener", opener_key), "opener", OPENERS[opener_key], opener_key))
+    for chunk in chunks:
+        segments.append(Segment(segment_id(model_version, voice, "chunk", chunk), "chunk", chunk))
+    return segments
+
+async def render_segments(tts, segments: list[Segment], voice: str, use_cuda: bool):
+    """Synthesizes segments missing from the store, in order, storing each as it lands."""
+    loop = asyncio.get_event_loop()
+    sample_rate = getattr(tts, 'sample_rate', 24000)
+    try:
+        chunks = [s for s in segments if s.kind == "chunk"]
+        chunk_audio = synthesize_ordered(
+            tts, [s.text for s in chunks], voice, use_cuda, executor, MAX_TTS_WORKERS,
+            tts_gate.foreground, chunk_cache
+        )
+        for segment in segments:
+            if segment.kind == "opener":
+                audio = await loop.run_in_executor(executor, opener_bank.get, tts, voice, segment.opener_key)
+                audio_store.put(segment.id, audio, sample_rate)
+                _segment_pending.pop(segment.id).set()
+        async for segment, audio in _zip_async(chunks, chunk_audio):
+            audio_store.put(segment.id, audio, sample_rate)
+            _segment_pending.pop(segment.id).set()
+    except Exception as e:
+        logger.error(f"🎞️ [SEGMENTS] Render failed: {e}")
+    finally:
+        # Wake anyone still waiting on a segment that will not arrive
+        for segment in segments:
+            event = _segment_pending.pop(segment.id, None)
+            if event is not None:
+                event.set()
+
+async def _zip_async(items: list, audio_iter):
+    index = 0
+    async for audio in audio_iter:
+        yield items[index], audio
+        index += 1
+
+def schedule_segment_render(tts, segments: list[Segment], voice: str):
+    """Starts rendering the segments that are neither stored nor already in flight."""
+    missing = []
+    for segment in segments:
+        if segment.id in audio_store or segment.id in _segment_pending or segment in missing:
+            continue
+        missing.append(segment)
+    if not missing:
+        return
+    for segment in missing:
+        _segment_pending[segment.id] = asyncio.Event()
+    task = asyncio.create_task(render_segments(tts, missing, voice, torch.cuda.is_available()))
+    _segment_tasks.add(task)
+    task.add_done_callback(_segment_tasks.discard)
+
+def playlist_response(request: GenerateRequest, kind: str, audio_format: str) -> Response:
+    """Playlist manifest for a job; segments render in the background as it is read."""
+    tts = get_handler("tts")
+    segments = plan_segments(tts, request.preGeneratedText or "", request.voice)
+    schedule_segment_render(tts, segments, request.voice)
+    
+    entries = []
+    for index, segment in enumerate(segments):
+        entry = audio_store.get(segment.id)
+        entries.append({
+            "index": index,
+            "id": segment.id,
+            "url": audio_file_url("/api/segments", segment.id, audio_format),
+            "text": segment.text,
+            "ready": entry is not None,
+            # Exact once rendered, estimated from the text before that
+            "duration": round(entry.length / (2 * entry.sample_rate), 3) if entry else round(estimate_duration(segment.text), 3),
+        })
+    
+    headers = {"Cache-Control": CACHE_REVALIDATE}
+    if kind == "m3u8":
+        return PlainTextResponse(
+            render_m3u8([(e["url"], e["duration"]) for e in entries]),
+            media_type=M3U_MEDIA_TYPE, headers=headers
+        )
+    return JSONResponse({"jobId": request.jobId, "format": audio_format, "segments": entries}, headers=headers)
+
+@app.get("/api/segments/{filename}")
+async def get_segment(filename: str, http_request: Request, format: str | None = None):
+    """One playlist segment; waits for it if it is still being synthesized."""
+    key, extension = split_audio_filename(filename)
+    audio_format = stored_file_format(http_request, "/api/segments", key, extension, format)
+    pending = _segment_pending.get(key)
+    if key not in audio_store and pending is not None:
+        await pending.wait()
+    if key not in audio_store:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    return await stored_audio_response(http_request, key, audio_format)
+
+# --- Speculative Synthesis ---
+class SpeculativeRender:
+    """Book-keeping for one in-flight speculative render."""
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.promoted = asyncio.Event() # Set when a real /api/tts request wants this audio
+
+_speculative_tasks: dict[str, SpeculativeRender] = {} # store key -> in-flight render
+_speculative_audio: dict[str, float] = {} # store key -> finished at (unclaimed)
+
+def speculative_enabled(request: GenerateRequest) -> bool:
+    if request.speculativeAudio is not None:
+        return request.speculativeAudio
+    return SPECULATIVE_TTS
+
+def schedule_speculative_tts(request: GenerateRequest):
+    """Queues a lowest-priority render of the answer under its /api/tts key."""
+    key = tts_cache_key(request.preGeneratedText, request.voice)
+    if key in _speculative_tasks or key in audio_store:
+        return
+    task = asyncio.create_task(handle_tts_generation(request, key))
+    _speculative_tasks[key] = SpeculativeRender(task)
+    task.add_done_callback(lambda _: _speculative_tasks.pop(key, None))
+
+def evict_speculative_audio(now: float) -> int:
+    """Deletes speculative renders that were never played within the TTL."""
+    expired = [key for key, ts in _speculative_audio.items() if now - ts > SPECULATIVE_TTL]
+    for key in expired:
+        _speculative_audio.pop(key, None)
+        try:
+            delete_stored_audio(key)
+        except OSError as e:
+            logger.warning(f"Speculative eviction failed for {key}: {e}")
+    return len(expired)
+
+async def handle_tts_generation(request: GenerateRequest, key: str):
     """
-    Background task to generate TTS audio.
-    Runs in a separate thread/process to avoid blocking the API response.
+    Background task to pre-render TTS audio for an answer nobody asked to hear yet.
+    Runs one sentence at a time at the lowest priority so real requests preempt it
+    at the next sentence boundary. Promoted to foreground if the user hits play.
     """
     try:
-        if not request.preGeneratedText:
-            logger.warning(f"Job {job_id}: No text to speak.")
+        text = request.preGeneratedText
+        if not text or not text.strip():
             return
             
-        # Get handler
         tts = get_handler("tts")
         if not tts:
-             logger.error(f"Job {job_id}: TTS Handler not found/initialized.")
+             logger.error(f"🔮 [SPECULATIVE] {key}: TTS Handler not found/initialized.")
              return
-             
-        logger.info(f"Job {job_id}: Start TTS (Voice: {request.voice})...")
         
-        # Determine voice ID
-        voice_id = request.voice
-        # Logic for custom voice if needed (request.customVoiceId is not in model currently but handled logic elsewhere - stick to request.voice for now or map it)
-        # Actually in Pydantic model 'customVoiceId' isn't defined in view. 
-        # But 'voice' string is passed. If custom, it's a GUID. TTS handler handles it if in cache.
+        render = _speculative_tasks.get(key)
         
-        # Call Generate Speech (Correct Method)
-        # Signature: generate_speech(text, voice="alba", use_cuda=False)
-        # Note: speed is handled by frontend, clone_audio not supported in simple handler yet
+        def gate():
+            # One chunk at a time at the lowest priority, unless the user already hit play
+            if render is not None and render.promoted.is_set():
+                return tts_gate.foreground()
+            return tts_gate.background()
         
-        audio_data = tts.generate_speech(
-            text=request.preGeneratedText,
-            voice=voice_id,
-            use_cuda=torch.cuda.is_available() # Pass global cuda state or config?
-        )
-        
-        if audio_data is None:
-             logger.error(f"Job {job_id}: TTS returned None.")
-             return
-
-        # Save to Disk (WAV)
-        save_path = AUDIO_DIR / f"{job_id}.wav"
+        logger.info(f"🔮 [SPECULATIVE] {key}: Queued ({len(text)} chars, Voice: {request.voice})")
+        audio_iter = render_text_audio(tts, text, request.voice, torch.cuda.is_available(), gate=gate, workers=1)
+        sample_rate = getattr(tts, 'sample_rate', 24000)
+        async for _ in assemble_wav(audio_iter, sample_rate, audio_store.writer(key, sample_rate), emit=False):
+            pass
         
-        # Ensure 16-bit PCM
-        import numpy as np
-        if audio_data.dtype != np.int16:
-             # Normalize float -1..1 to int16
-             audio_data = (audio_data * 32767).astype(np.int16)
-             
-        with wave.open(str(save_path), 'wb') as wf:
-            wf.setnchannels(1) # Mono
-            wf.setsampwidth(2) # 16-bit
-            wf.setframerate(24000) # PocketTTS rate
-            wf.writeframes(audio_data.tobytes())
-            
-        file_size = save_path.stat().st_size
-        logger.info(f"🎤 [TTS] Job {job_id}: Audio saved to {save_path} - {file_size} bytes")
+        if render is None or not render.promoted.is_set():
+            _speculative_audio[key] = time.time()
+        logger.info(f"🔮 [SPECULATIVE] {key}: Audio ready ({audio_store.size(key)} bytes)")
         
+    except asyncio.CancelledError:
+        logger.info(f"🔮 [SPECULATIVE] {key}: Cancelled")
+        raise
     except Exception as e:
-        logger.error(f"Job {job_id}: TTS Executor Failed - {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"🔮 [SPECULATIVE] {key}: TTS Failed - {e}")
+
+JOB_ID_PATTERN = re.compile(r"job_[A-Za-z0-9_-]{1,64}")
 
 @app.post("/api/generate")
 async def generate(request: GenerateRequest):
     logger.info(f"🎯 [GENERATE] Request received - LLM: {request.llmProvider}, Voice: {request.voice}, ShouldAudio: {request.shouldAudio}, Stream: {request.stream}")
     logger.info(f"🎯 [GENERATE] Text length: {len(request.text)}, Prompt length: {len(request.prompt)}")
+    try:
+        audio_format = negotiate_format(None, request.audioFormat)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if request.stream:
+        audio_format = streamable_format(audio_format)
+    request.audioFormat = audio_format # Kept on the job, for the audioUrl pollers get
+    if request.jobId is not None and (not JOB_ID_PATTERN.fullmatch(request.jobId) or request.jobId in job_store):
+        raise HTTPException(status_code=400, detail="jobId must be an unused job_* id")
+    job_id = request.jobId or f"job_{int(time.time()*1000)}"
     # Old legacy mode support or unified?
     # User plan says "StreamingResponse".
     
@@ -536,62 +1246,128 @@ async def generate(request: GenerateRequest):
     # This ensures we can return the text immediately to the frontend
     llm = get_handler("llm")
     
-    key_to_use = None
-    if request.llmProvider == "groq":
-        key_to_use = request.apiKeyGroq or os.getenv("GROQ_API_KEY")
-    elif request.llmProvider == "openai":
-        key_to_use = request.apiKeyOpenai or os.getenv("OPENAI_API_KEY")
-    elif request.llmProvider == "claude":
-        key_to_use = request.apiKeyClaude or os.getenv("ANTHROPIC_API_KEY")
-    else:
-        key_to_use = request.apiKey or os.getenv("GEMINI_API_KEY")
-
-    if key_to_use:
-        key_to_use = key_to_use.strip()
+    key_to_use = llm_api_key(request)
+    try:
+        apply_session(request)
+        images = resolve_images(request)
+    except UnknownSession as e:
+        raise unknown_session_error(e)
+    except MissingImages as e:
+        raise missing_images_error(e)
     
     # Run LLM generation in thread pool to avoid blocking main loop
     # Define sync helper
+    budget = answer_budget(request)
     def _generate_text_sync():
         logger.info("Generating full text response immediately (Threaded)...")
         text_stream = llm.generate_answer_stream(
             text=request.text, prompt=request.prompt, screenshot_b64=request.screenshot,
             screenshots=request.screenshots, api_key=key_to_use,
             provider=request.llmProvider, tone=request.responseTone,
-            history=request.history, custom_persona=request.customPersona
+            history=request.history, custom_persona=request.customPersona,
+            images=images, api_keys=llm_api_keys(request),
+            budget=budget, two_stage=False # Joined before any TTS: an opener gains nothing
         )
         return "".join(text_stream)
 
-    # Await in executor
-    logger.info("🎯 [GENERATE] Calling LLM handler...")
-    full_text_response = await asyncio.get_event_loop().run_in_executor(
-        executor, _generate_text_sync
-    )
-    logger.info(f"🎯 [GENERATE] LLM response received - {len(full_text_response)} chars")
+    # A near-duplicate of an earlier question gets that answer (and its audio) instead
+    scope = answer_cache_scope(request)
+    cached, similarity = None, 0.0
+    if scope is not None:
+        cached, similarity = answer_cache.lookup(
+            scope, request.text, request.prompt, request.responseTone, request.customPersona
+        )
+        metrics.increment("answer_cache.hits" if cached else "answer_cache.misses")
+    if cached is not None:
+        logger.info(f"🎯 [GENERATE] Answer cache hit ({similarity:.2f}, {cached.hits} hits): {cached.prompt[:50]!r}")
+        metrics.observe("answer_cache.similarity", similarity)
+        full_text_response = cached.answer
+        if answer_cache.should_audit():
+            schedule_answer_audit(cached, request, images)
+    else:
+        # Await in executor
+        logger.info("🎯 [GENERATE] Calling LLM handler...")
+        if request.shouldAudio:
+            # Tracked from the start, so pollers see the answer being written
+            job_store.create(job_id, request, state=jobs.LLM)
+        try:
+            full_text_response = await asyncio.get_event_loop().run_in_executor(
+                executor, _generate_text_sync
+            )
+        except Exception as e:
+            job_store.update(job_id, state=jobs.FAILED, error=str(e))
+            raise
+        logger.info(f"🎯 [GENERATE] LLM response received - {len(full_text_response)} chars")
+    if request.sessionId:
+        session_store.append_turn(request.sessionId, request.prompt, full_text_response)
         
     # Store in request for the stream generator to use
     request.preGeneratedText = full_text_response
 
     # Cache Job
-    job_id = f"job_{int(time.time()*1000)}"
     request.jobId = job_id  # Store job ID in request for saving file
     
     # Only cache if we plan to stream audio
     audio_url = ""
-    if request.shouldAudio:
-        # Cache with timestamp for TTL
-        _request_cache[job_id] = {
-            "request": request,
-            "timestamp": time.time()
-        }
-        audio_url = f"/api/stream/{job_id}"
+    reused = reusable_audio(cached, request) if cached is not None and request.shouldAudio else None
+    if reused:
+        # Same answer, same voice: its audio is already rendered (or rendering)
+        metrics.increment("answer_cache.audio_reused")
+        job_id = request.jobId = reused
+        audio_url = with_format(f"/api/stream/{job_id}", audio_format)
+    elif request.shouldAudio:
+        # Tracked (with a TTL) until the extension streams it; audio is next
+        if job_id not in job_store:
+            job_store.create(job_id, request)
+        job_store.update(job_id, state=jobs.TTS, answer=budget.to_dict())
+        audio_url = with_format(f"/api/stream/{job_id}", audio_format)
+    elif speculative_enabled(request) and full_text_response.strip():
+        # Nothing plays until the user clicks, so use the reading time to render it
+        schedule_speculative_tts(request)
+
+    # Answers cut short by a slow provider are not worth repeating
+    if cached is None and scope is not None and cacheable_answer(full_text_response) and budget.truncated != "time":
+        answer_cache.store(
+            scope, request.text, request.prompt, full_text_response,
+            job_id if audio_url else None, request.voice
+        )
+    elif cached is not None and audio_url and not reused:
+        cached.job_id, cached.voice = job_id, request.voice
     
     logger.info(f"🎯 [GENERATE] Returning response - audioUrl: {audio_url}")
     return {
         "audioUrl": audio_url,
+        "jobId": job_id if audio_url else None,
+        "sessionId": request.sessionId,
         "text": full_text_response,
+        "truncated": budget.truncated, # "tokens" | "time" when the answer was stopped early
         "duration": 0
     }
 
+def transcribe_audio(audio_data: bytes) -> str:
+    """Whisper transcription of a recorded clip (blocking; run in the executor)."""
+    # We need a file-like object with a proper name for OpenAI
+    # Using temp storage avoids complex memory buffer naming issues
+    temp_path = AUDIO_DIR / f"temp_stt_{time.time_ns()}.wav"
+    with open(temp_path, "wb") as f:
+        f.write(audio_data)
+        
+    try:
+        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        with open(temp_path, "rb") as audio_file:
+            transcript = client.audio.transcriptions.create(
+                model="whisper-1", 
+                file=audio_file,
+                response_format="text"
+            )
+        
+        logger.info(f"🎙️ [STT] Transcribed text: {transcript[:50]}...")
+        return transcript
+        
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
 @app.post("/api/stt")
 async def speech_to_text(file: UploadFile = File(...)):
     """🎯 v4.10.0: Transcribe voice using OpenAI Whisper"""
@@ -600,77 +1376,386 @@ async def speech_to_text(file: UploadFile = File(...)):
         
         # Read file into memory
         audio_data = await file.read()
-        
-        # We need a file-like object with a proper name for OpenAI
-        # Using temp storage avoids complex memory buffer naming issues
-        temp_path = AUDIO_DIR / f"temp_stt_{int(time.time())}.wav"
-        with open(temp_path, "wb") as f:
-            f.write(audio_data)
-            
-        try:
-            client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-            with open(temp_path, "rb") as audio_file:
-                transcript = client.audio.transcriptions.create(
-                    model="whisper-1", 
-                    file=audio_file,
-                    response_format="text"
-                )
-            
-            logger.info(f"🎙️ [STT] Transcribed text: {transcript[:50]}...")
-            return {"success": True, "text": transcript}
-            
-        finally:
-            if temp_path.exists():
-                temp_path.unlink()
+        transcript = await asyncio.get_event_loop().run_in_executor(executor, transcribe_audio, audio_data)
+        return {"success": True, "text": transcript}
                 
     except Exception as e:
         logger.error(f"🎙️ [STT] Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # Cache for Stream Jobs
-_request_cache = {}
+job_store = JobStore(ttl=1800)
+_live_renders: dict[str, LiveRender] = {} # job_id -> render in progress
 
 @app.head("/api/stream/{job_id}")
 async def check_stream_audio(job_id: str):
     # Check Cache
-    if job_id in _request_cache:
+    if job_id in job_store:
         return {} # 200 OK
         
-    # Check Disk
-    saved_path = AUDIO_DIR / f"{job_id}.wav"
-    if saved_path.exists():
+    # Check the audio store (in-memory index, no filesystem calls)
+    if job_id in audio_store:
         return {} # 200 OK
         
     raise HTTPException(status_code=404, detail="Job not found")
 
 @app.get("/api/stream/{job_id}")
-async def stream_audio(job_id: str):
-    # 1. Check if the file already exists on disk (Cachced/Persistent)
-    saved_path = AUDIO_DIR / f"{job_id}.wav"
-    if saved_path.exists():
-        logger.info(f"🎯 [STREAM] Serving persistent audio from disk: {saved_path}")
-        return FileResponse(saved_path, media_type="audio/wav")
-
-    # 2. Check if the job is in memory cache
-    if job_id not in _request_cache:
+async def stream_audio(job_id: str, http_request: Request, format: str | None = None, playlist: str | None = None):
+    audio_format = resolve_audio_format(http_request, format)
+    
+    # Segmented playlist (?playlist=json|m3u8) instead of one monolithic file
+    if playlist is None and M3U_MEDIA_TYPE in http_request.headers.get("accept", ""):
+        playlist = "m3u8"
+    if playlist is not None:
+        if playlist not in ("json", "m3u8"):
+            raise HTTPException(status_code=400, detail="playlist must be 'json' or 'm3u8'")
+        job = job_store.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job expired or not found")
+        if not job.request.preGeneratedText:
+            if job.terminal:
+                raise HTTPException(status_code=404, detail=f"Job {job.state} without an answer")
+            # Still writing the answer: no segments yet, and an empty playlist would read as finished
+            return JSONResponse(
+                {"jobId": job_id, "state": job.state}, status_code=202,
+                headers={"Cache-Control": CACHE_NONE, "Retry-After": "1"}
+            )
+        return playlist_response(job.request, playlist, audio_format)
+    
+    # 1. Check if the audio was already rendered (Cached/Persistent)
+    if job_id in audio_store:
+        logger.info(f"🎯 [STREAM] Serving persistent audio from the store: {job_id}")
+        return await stored_audio_response(http_request, job_id, audio_format)
+    
+    # 2. Still rendering: serve what exists instead of synthesizing it twice
+    live = _live_renders.get(job_id)
+    if live is not None:
+        if audio_format == "wav":
+            return await live_audio_response(http_request, job_id, live)
+        await live.wait_for(float("inf"))
+        if job_id in audio_store:
+            return await stored_audio_response(http_request, job_id, audio_format)
+
+    # 3. Check if the job is in memory cache
+    job = job_store.get(job_id)
+    if job is None:
         logger.warning(f"🎯 [STREAM] Job {job_id} not found on disk or in cache")
         raise HTTPException(status_code=404, detail="Job expired or not found")
     
-    cache_entry = _request_cache.get(job_id)
-    request = cache_entry['request']
+    request = job.request
+    if request.stream:
+        audio_format = streamable_format(audio_format)
     
     logger.info(f"🎯 [STREAM] Starting generator for job {job_id}")
     return StreamingResponse(
-        stream_generator(request),
-        media_type="audio/wav"
+        stream_generator(request, audio_format),
+        media_type=FORMATS[audio_format].media_type
     )
 
-@app.get("/api/audio/{filename}")
-async def get_audio(filename: str):
-    filepath = AUDIO_DIR / filename
-    if not filepath.exists():
-        raise HTTPException(status_code=404, detail="Audio not found")
-    return FileResponse(filepath, media_type="audio/wav")
+# --- Duplex voice session (WebSocket) ---
+# One connection per conversation instead of STT upload + generate + HEAD + stream
+# round trips per turn. Client -> server text frames are JSON:
+#   {"type": "query", ...GenerateRequest fields}  start a turn (barges in on a running one)
+#   {"type": "stop"}                              cancel the running turn
+#   {"type": "transcribe", "query": {...}?}       transcribe the binary frames sent so far
+#                                                 (and, with "query", ask it as the prompt)
+#   {"type": "reset"}                             forget the session's history and context
+# Server -> client: JSON events (turn, text, audio_start, audio_end, done, stopped,
+# transcript, error) and binary frames carrying the current turn's audio.
+SESSION_MAX_RECORDING_BYTES = 25 * 1024 * 1024 # Whisper's upload limit
+# Query fields remembered for follow-ups, so screenshots and keys are sent once
+SESSION_STICKY_FIELDS = (
+    "text", "screenshot", "screenshots", "imageHashes", "sessionId", "voice", "llmProvider", "apiKey", "apiKeyOpenai",
+    "apiKeyClaude", "apiKeyGroq", "responseTone", "customPersona", "shouldAudio", "useCuda", "audioFormat",
+)
+
+async def iterate_in_executor(make_iterator, stop: threading.Event):
+    """Async view of a blocking iterator (an LLM token stream) consumed on the executor."""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            pass # Loop closed (shutdown)
+
+    pump(make_iterator, put, stop)
+    try:
+        while True:
+            item = await queue.get()
+            if item is END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set() # Cancelled turn: the worker thread stops at the next token
+
+class VoiceSession:
+    """State of one WebSocket conversation: remembered context, history and the running turn."""
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.settings: dict = {"text": ""}
+        self.history: list[dict[str, str]] = []
+        self.recording = bytearray()
+        self.turn = 0
+        self.task: asyncio.Task | None = None
+        self._send_lock = asyncio.Lock() # Text and audio frames come from different tasks
+
+    async def send(self, event: dict):
+        async with self._send_lock:
+            await self.websocket.send_text(json.dumps(event))
+
+    async def send_audio(self, data: bytes):
+        async with self._send_lock:
+            await self.websocket.send_bytes(data)
+
+    async def stop(self) -> bool:
+        """Cancels the running turn; once this returns no more of its frames are sent."""
+        task, self.task = self.task, None
+        if task is None or task.done():
+            return False
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return True
+
+    async def start(self, payload: dict):
+        await self.stop()
+        fields = {**self.settings, **{k: v for k, v in payload.items() if k != "type"}}
+        try:
+            request = GenerateRequest(**fields)
+            # Sent as it is encoded, so never FLAC
+            audio_format = streamable_format(negotiate_format(None, request.audioFormat))
+        except (ValidationError, ValueError) as e:
+            await self.send({"type": "error", "error": str(e)})
+            return
+        try:
+            apply_session(request)
+        except UnknownSession as e:
+            await self.send({"type": "error", "error": f"Unknown session: {e}", "unknownSession": True})
+            return
+        self.settings.update({k: v for k, v in fields.items() if k in SESSION_STICKY_FIELDS})
+        if request.history is None:
+            request.history = list(self.history)
+        self.turn += 1
+        self.task = asyncio.create_task(self.run_turn(self.turn, request, audio_format))
+
+    async def run_turn(self, turn: int, request: GenerateRequest, audio_format: str):
+        """Streams the answer's text deltas, and its audio sentence by sentence as the text arrives."""
+        answer = ""
+        speaker = None
+        await self.send({"type": "turn", "turn": turn})
+        try:
+            llm = get_handler("llm")
+            key_to_use = llm_api_key(request)
+            images = resolve_images(request)
+            sentences: asyncio.Queue = asyncio.Queue()
+            if request.shouldAudio:
+                speaker = asyncio.create_task(self.speak(turn, sentences, request, audio_format))
+
+            budget = answer_budget(request)
+
+            def token_stream():
+                return llm.generate_answer_stream(
+                    text=request.text, prompt=request.prompt, screenshot_b64=request.screenshot,
+                    screenshots=request.screenshots, api_key=key_to_use,
+                    provider=request.llmProvider, tone=request.responseTone,
+                    history=request.history, custom_persona=request.customPersona,
+                    images=images, api_keys=llm_api_keys(request),
+                    budget=budget, two_stage=request.twoStage
+                )
+
+            pending = ""
+            async for delta in iterate_in_executor(token_stream, threading.Event()):
+                answer += delta
+                await self.send({"type": "text", "turn": turn, "delta": delta})
+                if speaker is not None:
+                    pending += delta
+                    ready, pending = take_sentences(pending, TTS_FIRST_CHUNK_CHARS)
+                    if ready:
+                        sentences.put_nowait(ready)
+            if speaker is not None:
+                if pending.strip():
+                    sentences.put_nowait(pending.strip())
+                sentences.put_nowait(None)
+                await speaker
+            await self.send({"type": "done", "turn": turn, "text": answer, "truncated": budget.truncated})
+        except asyncio.CancelledError:
+            if speaker is not None:
+                speaker.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"🔌 [SESSION] Turn {turn} failed: {e}")
+            if speaker is not None:
+                speaker.cancel()
+            event = {"type": "error", "turn": turn, "error": str(e)}
+            if isinstance(e, MissingImages):
+                event["missingImages"] = e.hashes
+            await self.send(event)
+        finally:
+            # Barged-in answers are kept as far as they got: that's what the user heard
+            if answer and request.sessionId:
+                session_store.append_turn(request.sessionId, request.prompt, answer)
+            elif answer:
+                self.history += [
+                    {"role": "user", "content": request.prompt},
+                    {"role": "assistant", "content": answer},
+                ]
+
+    async def speak(self, turn: int, sentences: asyncio.Queue, request: GenerateRequest, audio_format: str):
+        """Synthesizes queued text in order and sends it as binary frames of one audio stream."""
+        tts = get_handler("tts")
+        sample_rate = getattr(tts, 'sample_rate', 24000)
+        encoder = make_encoder(audio_format, sample_rate)
+        try:
+            await self.send({
+                "type": "audio_start", "turn": turn, "format": audio_format,
+                "mediaType": FORMATS[audio_format].media_type,
+                "sampleRate": encoder.sample_rate if encoder else sample_rate,
+            })
+            if encoder is None:
+                await self.send_audio(streaming_wav_header(sample_rate))
+            while (text := await sentences.get()) is not None:
+                async for audio in render_text_audio(tts, text, request.voice, request.useCuda):
+                    data = encoder.write(audio) if encoder else bytes(pcm_view(to_int16(audio)))
+                    if data:
+                        await self.send_audio(data)
+            if encoder is not None:
+                tail = encoder.finish()
+                if tail:
+                    await self.send_audio(tail)
+            await self.send({"type": "audio_end", "turn": turn})
+        finally:
+            if encoder is not None:
+                encoder.close()
+
+    async def transcribe(self, payload: dict):
+        audio_data, self.recording = bytes(self.recording), bytearray()
+        if not audio_data:
+            await self.send({"type": "error", "error": "No audio recorded"})
+            return
+        try:
+            transcript = await asyncio.get_running_loop().run_in_executor(executor, transcribe_audio, audio_data)
+        except Exception as e:
+            logger.error(f"🎙️ [STT] Error: {e}")
+            await self.send({"type": "error", "error": str(e)})
+            return
+        await self.send({"type": "transcript", "text": transcript})
+        query = payload.get("query")
+        if isinstance(query, dict):
+            await self.start({**query, "prompt": transcript})
+
+@app.websocket("/ws/session")
+async def voice_session(websocket: WebSocket):
+    await websocket.accept()
+    session = VoiceSession(websocket)
+    logger.info("🔌 [SESSION] Connected")
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                # Recorded speech for the next "transcribe"
+                if len(session.recording) + len(message["bytes"]) > SESSION_MAX_RECORDING_BYTES:
+                    session.recording.clear()
+                    await session.send({"type": "error", "error": "Recording too large"})
+                    continue
+                session.recording.extend(message["bytes"])
+                continue
+            try:
+                payload = json.loads(message.get("text") or "")
+            except json.JSONDecodeError:
+                await session.send({"type": "error", "error": "Expected a JSON message"})
+                continue
+            kind = payload.get("type") if isinstance(payload, dict) else None
+            if kind == "query":
+                await session.start(payload)
+            elif kind == "stop":
+                turn = session.turn
+                stopped = await session.stop()
+                await session.send({"type": "stopped", "turn": turn, "cancelled": stopped})
+            elif kind == "transcribe":
+                await session.stop() # Talking over the answer is a barge-in
+                await session.transcribe(payload)
+            elif kind == "reset":
+                await session.stop()
+                session.history.clear()
+                session.settings = {"text": ""}
+            else:
+                await session.send({"type": "error", "error": f"Unknown message type: {kind}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await session.stop()
+        logger.info("🔌 [SESSION] Disconnected")
+
+# --- Job status ---
+JOB_WAIT_MAX_SECONDS = 60
+
+class JobStatusItem(BaseModel):
+    text: str
+    voice: str = "alba"
+
+class JobStatusRequest(BaseModel):
+    ids: list[str] = [] # Job ids, tts_ keys or audio URLs
+    items: list[JobStatusItem] = [] # Or the text itself (looked up by content hash)
+
+def job_id_from_ref(ref: str) -> str:
+    """/api/stream/job_1?format=opus, /api/audio/tts_ab.wav -> job_1, tts_ab"""
+    name = ref.split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1]
+    return name.rsplit(".", 1)[0] if name.endswith((".wav", ".opus", ".flac")) else name
+
+def job_status(job_id: str) -> dict:
+    """Status of a stream job or a content-addressed render; state 'unknown' if neither."""
+    job = job_store.get(job_id)
+    if job is not None:
+        status = job.to_dict()
+        if job.state != jobs.DONE and job_id in audio_store:
+            status.update(state=jobs.DONE, etaSeconds=0.0)
+        # In the format the job was asked for, as /api/generate's audioUrl has it
+        status["audioUrl"] = with_format(f"/api/stream/{job_id}", getattr(job.request, "audioFormat", None) or "wav")
+        return status
+    if job_id in audio_store:
+        state = jobs.DONE
+    elif job_id in _speculative_tasks or job_id in _batch_tasks:
+        state = jobs.TTS
+    else:
+        return {"id": job_id, "state": "unknown"}
+    url = f"/api/audio/{job_id}.wav" if job_id.startswith("tts_") else f"/api/stream/{job_id}"
+    return {"id": job_id, "state": state, "etaSeconds": 0.0 if state == jobs.DONE else None, "audioUrl": url}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0, version: int | None = None):
+    """
+    Job state (queued / llm / tts with chunk progress / done / failed) and an
+    estimate of the synthesis time left.
+    wait=N long-polls up to N seconds for a change past `version` (default:
+    the version current at the time of the call).
+    """
+    job = job_store.get(job_id)
+    if job is not None and wait > 0:
+        await job_store.wait(job, version, min(wait, JOB_WAIT_MAX_SECONDS))
+    status = job_status(job_id)
+    if status["state"] == "unknown":
+        raise HTTPException(status_code=404, detail="Job expired or not found")
+    return status
+
+@app.post("/api/jobs/status")
+async def get_job_statuses(request: JobStatusRequest):
+    """Status of many jobs in one call (history validation, reconnects)."""
+    statuses = {}
+    for ref in request.ids:
+        statuses[ref] = job_status(job_id_from_ref(ref))
+    for item in request.items:
+        key = tts_cache_key(item.text, item.voice)
+        statuses[key] = job_status(key)
+    return {"jobs": statuses}
 
 if __name__ == "__main__":
     print("\n" + "="*50)
@@ -0,0 +1,243 @@
+# server/audio_codecs.py
+
+"""
+Compressed output formats for rendered audio.
+Raw 24 kHz 16-bit WAV is ~48 KB per second of speech; Ogg/Opus is roughly a
+tenth of that. Encoders take PCM chunk by chunk so the progressive path can
+stream encoded bytes, and spool the complete file to disk for caching.
+"""
+
+import logging
+import math
+import os
+import tempfile
+from typing import Iterator, NamedTuple, Optional
+
+import numpy as np
+
+from audio_pipeline import READ_BLOCK_BYTES, pcm_view, to_int16, wav_header
+
+# Optional encoders: Opus and FLAC need libsndfile (pip install soundfile)
+try:
+    import soundfile as sf
+except (ImportError, OSError):
+    sf = None
+
+try:
+    from scipy.signal import resample_poly
+except ImportError:
+    resample_poly = None
+
+logger = logging.getLogger(__name__)
+
+
+class AudioFormat(NamedTuple):
+    name: str
+    media_type: str
+    sample_rate: Optional[int] = None # Output rate; None keeps the model's rate
+    extension: str = "wav"
+    # Bytes valid as they are sent. FLAC's STREAMINFO (total length, MD5) is
+    # only patched in when the file is closed, so streamed FLAC is malformed.
+    streamable: bool = True
+
+
+FORMATS = {
+    "wav": AudioFormat("wav", "audio/wav"),
+    "wav16k": AudioFormat("wav16k", "audio/wav", 16000),
+    "opus": AudioFormat("opus", "audio/ogg; codecs=opus", extension="opus"),
+    "flac": AudioFormat("flac", "audio/flac", extension="flac", streamable=False),
+}
+
+# Accept-header media types -> format (wildcards deliberately map to nothing: WAV stays the default)
+_ACCEPT_TYPES = {
+    "audio/ogg": "opus",
+    "audio/opus": "opus",
+    "audio/flac": "flac",
+    "audio/x-flac": "flac",
+    "audio/wav": "wav",
+    "audio/wave": "wav",
+    "audio/x-wav": "wav",
+}
+
+# Among equally acceptable formats, prefer the smallest
+_PREFERENCE = ["opus", "flac", "wav16k", "wav"]
+
+
+def available_formats() -> list[str]:
+    formats = ["wav", "wav16k"]
+    if sf is not None:
+        if "OPUS" in sf.available_subtypes("OGG"):
+            formats.append("opus")
+        if "FLAC" in sf.available_formats():
+            formats.append("flac")
+    return formats
+
+
+def streamable_format(name: str) -> str:
+    """The format for a progressive response: the negotiated one, or Opus (else 16 kHz WAV) instead of FLAC."""
+    if FORMATS[name].streamable:
+        return name
+    return "opus" if "opus" in available_formats() else "wav16k"
+
+
+def negotiate_format(accept: Optional[str], requested: Optional[str] = None) -> str:
+    """
+    Picks the output format: an explicit request field wins, then the best
+    concrete match in the Accept header, then WAV.
+    Raises ValueError for an unknown requested format.
+    """
+    available = available_formats()
+    if requested:
+        requested = requested.lower()
+        if requested not in FORMATS:
+            raise ValueError(f"Unknown audio format '{requested}' (choose from {', '.join(FORMATS)})")
+        if requested in available:
+            return requested
+        logger.warning(f"Audio format '{requested}' unavailable (soundfile not installed?), using WAV")
+        return "wav"
+
+    best, best_q = "wav", 0.0
+    for part in (accept or "").split(","):
+        fields = part.strip().split(";")
+        name = _ACCEPT_TYPES.get(fields[0].strip().lower())
+        if name is None or name not in available:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q <= 0:
+            continue
+        if q > best_q or (q == best_q and _PREFERENCE.index(name) < _PREFERENCE.index(best)):
+            best, best_q = name, q
+    return best
+
+
+def resample(audio: np.ndarray, from_rate: int, to_rate: int) -> np.ndarray:
+    """Resamples 16-bit PCM (polyphase with scipy, linear interpolation without)."""
+    if from_rate == to_rate or not audio.size:
+        return audio
+    if resample_poly is not None:
+        divisor = math.gcd(from_rate, to_rate)
+        out = resample_poly(audio.astype(np.float32), to_rate // divisor, from_rate // divisor)
+    else:
+        positions = np.arange(int(len(audio) * to_rate / from_rate)) * (from_rate / to_rate)
+        out = np.interp(positions, np.arange(len(audio)), audio)
+    return np.clip(out, -32768, 32767).astype(np.int16)
+
+
+class AudioEncoder:
+    """
+    Incremental encoder: write() takes a PCM chunk and returns whatever encoded
+    bytes are ready for the wire; finish() flushes the rest. The complete file
+    is spooled to an anonymous temp file (see blocks()) for caching.
+    """
+
+    def __init__(self, audio_format: AudioFormat, sample_rate: int):
+        self.format = audio_format
+        self.input_rate = sample_rate
+        self.sample_rate = audio_format.sample_rate or sample_rate
+        self.spool = tempfile.TemporaryFile()
+        self._sent = 0
+
+    def write(self, audio: np.ndarray) -> bytes:
+        self._encode(to_int16(audio))
+        return self._new_bytes()
+
+    def finish(self) -> bytes:
+        self._close()
+        return self._new_bytes()
+
+    @property
+    def size(self) -> int:
+        return self.spool.seek(0, os.SEEK_END)
+
+    def blocks(self) -> Iterator[bytes]:
+        """The complete encoded file (after finish)."""
+        self.spool.seek(0)
+        while True:
+            block = self.spool.read(READ_BLOCK_BYTES)
+            if not block:
+                break
+            yield block
+
+    def close(self):
+        self.spool.close()
+
+    def _new_bytes(self) -> bytes:
+        # Bytes past what was already sent. Encoders that patch headers at the
+        # end (FLAC, WAV sizes) only change the spooled copy, not the stream.
+        position = self.spool.tell()
+        end = self.spool.seek(0, os.SEEK_END)
+        if end <= self._sent:
+            self.spool.seek(position)
+            return b""
+        self.spool.seek(self._sent)
+        data = self.spool.read(end - self._sent)
+        self.spool.seek(position)
+        self._sent = end
+        return data
+
+    def _encode(self, audio: np.ndarray):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+
+class PCMEncoder(AudioEncoder):
+    """WAV at a lower sample rate (e.g. 16 kHz: a third less data, still clear speech)."""
+
+    def __init__(self, audio_format: AudioFormat, sample_rate: int):
+        super().__init__(audio_format, sample_rate)
+        self._data_bytes = 0
+        self.spool.write(wav_header(self.sample_rate))
+
+    def _encode(self, audio: np.ndarray):
+        self._data_bytes += self.spool.write(pcm_view(resample(audio, self.input_rate, self.sample_rate)))
+
+    def _close(self):
+        position = self.spool.tell()
+        self.spool.seek(0)
+        self.spool.write(wav_header(self.sample_rate, self._data_bytes))
+        self.spool.seek(position)
+
+
+class SoundFileEncoder(AudioEncoder):
+    """Ogg/Opus or FLAC through libsndfile, writing into the spool."""
+
+    _CONTAINERS = {"opus": ("OGG", "OPUS"), "flac": ("FLAC", "PCM_16")}
+
+    def __init__(self, audio_format: AudioFormat, sample_rate: int):
+        super().__init__(audio_format, sample_rate)
+        container, subtype = self._CONTAINERS[audio_format.name]
+        self._file = sf.SoundFile(
+            self.spool, "w", samplerate=self.sample_rate, channels=1,
+            format=container, subtype=subtype
+        )
+
+    def _encode(self, audio: np.ndarray):
+        self._file.write(audio)
+
+    def _close(self):
+        self._file.close()
+
+    def close(self):
+        # Abandoned mid-stream: finalize libsndfile before its spool goes away
+        if not self._file.closed:
+            self._file.close()
+        super().close()
+
+
+def make_encoder(name: str, sample_rate: int) -> Optional[AudioEncoder]:
+    """Encoder for a negotiated format; None for plain WAV (the native path)."""
+    if name == "wav":
+        return None
+    audio_format = FORMATS[name]
+    if name in SoundFileEncoder._CONTAINERS:
+        return SoundFileEncoder(audio_format, sample_rate)
+    return PCMEncoder(audio_format, sample_rate)
@@ -0,0 +1,120 @@
+# server/audio_http.py
+
+"""
+HTTP caching and byte-range handling for served audio.
+Renders are immutable once stored, so they get strong ETags (304 on replay)
+and Range/206 support (seeking without re-downloading). Content-addressed
+renders are additionally marked immutable so browsers skip revalidation.
+"""
+
+from typing import Callable, Iterator, Optional
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+# Content-addressed audio (tts_{hash}) never changes under its URL
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+# Stable once rendered, but the URL isn't derived from the content: revalidate (cheap 304)
+CACHE_REVALIDATE = "no-cache"
+# Still being synthesized: header sizes are provisional
+CACHE_NONE = "no-store"
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header names this ETag (or '*'); weak comparison."""
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def if_range_matches(header: str, etag: str) -> bool:
+    """
+    True if an If-Range header is exactly this ETag. RFC 9110 requires a
+    strong comparison: weak validators (and dates, which renders don't carry)
+    never match, so the range is ignored and the full body sent.
+    """
+    return header.strip() == etag and not etag.startswith("W/")
+
+
+def parse_range(header: Optional[str], size: Optional[int]) -> Optional[tuple[int, Optional[int]]]:
+    """
+    Parses a single "bytes=" range into (start, end) with end inclusive.
+    Returns None when there is no usable range (absent, multi-range, other units):
+    the caller then serves the whole body, which RFC 9110 allows.
+    With size=None (length not known yet) an open range returns end=None.
+    Raises RangeNotSatisfiable for ranges that start past the end.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if not first:
+            # Suffix range: the last N bytes (needs the total length)
+            if size is None or not last:
+                return None
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else None
+    except ValueError:
+        return None
+    if end is not None and end < start:
+        return None
+    if size is not None:
+        if start >= size:
+            raise RangeNotSatisfiable()
+        end = size - 1 if end is None else min(end, size - 1)
+    return start, end
+
+
+def cached_file_response(
+    request: Request,
+    size: int,
+    read: Callable[[int, int], Iterator[bytes]],
+    media_type: str,
+    etag: str,
+    cache_control: str,
+    headers: Optional[dict] = None,
+) -> Response:
+    """
+    Serves an immutable body with conditional and range support.
+    read(start, end) yields the bytes [start, end).
+    """
+    headers = {
+        **(headers or {}),
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range_matches(if_range, etag):
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        return StreamingResponse(
+            read(0, size), media_type=media_type,
+            headers={**headers, "Content-Length": str(size)}
+        )
+    start, end = byte_range
+    return StreamingResponse(
+        read(start, end + 1), status_code=206, media_type=media_type,
+        headers={
+            **headers,
+            "Content-Length": str(end - start + 1),
+            "Content-Range": f"bytes {start}-{end}/{size}",
+        }
+    )
@@ -0,0 +1,390 @@
+# server/audio_pipeline.py
+
+"""
+Shared TTS rendering pipeline: text chunks -> parallel synthesis -> audio in
+text order -> WAV. Used by /api/stream, /api/tts and speculative renders so
+they all get the same parallelism, ordering and chunk-level caching.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import partial
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkCache:
+    """
+    In-memory LRU of synthesized chunk audio, bounded by bytes.
+    Keyed by model version, voice and chunk text, so identical sentences are
+    reused across /api/tts, /api/stream and speculative renders.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model_version: str, voice: str, text: str) -> str:
+        return hashlib.md5(f"{model_version}|{voice}|{text}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return audio
+
+    def put(self, key: str, audio: np.ndarray):
+        if audio.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._entries[key] = audio
+            self._bytes += audio.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+
+# Block size for streaming a finished WAV back out of its file
+READ_BLOCK_BYTES = 256 * 1024
+
+
+def to_int16(audio: np.ndarray) -> np.ndarray:
+    """Float audio in [-1, 1] -> 16-bit PCM (scaled in place); int16 passes through."""
+    if audio.dtype == np.int16:
+        return audio
+    if audio.flags.writeable and audio.dtype.kind == 'f':
+        audio *= 32767
+        return audio.astype(np.int16)
+    return (audio * 32767).astype(np.int16)
+
+
+def pcm_view(audio: np.ndarray) -> memoryview:
+    """Zero-copy byte view of 16-bit PCM samples."""
+    return memoryview(np.ascontiguousarray(audio)).cast('B')
+
+
+def wav_header(sample_rate: int, data_bytes: int = None) -> bytes:
+    """
+    44-byte 16-bit mono PCM WAV header.
+    With data_bytes=None the sizes are set to the maximum (a stream of unknown
+    length) so players keep reading until the connection closes.
+    """
+    byte_rate = sample_rate * 2
+    if data_bytes is None:
+        riff_size, data_size = 0xFFFFFFFF, 0xFFFFFFFF - 36
+    else:
+        riff_size, data_size = 36 + data_bytes, data_bytes
+    return (
+        b"RIFF" + struct.pack("<I", riff_size) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, byte_rate, 2, 16)
+        + b"data" + struct.pack("<I", data_size)
+    )
+
+
+def streaming_wav_header(sample_rate: int) -> bytes:
+    """Header for a progressive WAV stream of unknown length."""
+    return wav_header(sample_rate)
+
+
+class WavFileWriter:
+    """
+    Streams PCM chunks straight into a WAV file on disk.
+    Chunks are written through a memoryview (no intermediate copies) and the
+    header sizes are patched in place on close, so memory use is one chunk.
+    The file appears at its final path atomically; a temporary writer deletes
+    it once read back.
+    """
+
+    def __init__(self, path: Path, sample_rate: int, temporary: bool = False):
+        self.path = Path(path)
+        self.temp_path = self.path.with_suffix(".part")
+        self.sample_rate = sample_rate
+        self.temporary = temporary
+        self.data_bytes = 0
+        self._file = open(self.temp_path, "wb")
+        self._file.write(wav_header(sample_rate))
+
+    def write(self, audio: np.ndarray):
+        self.data_bytes += self._file.write(pcm_view(audio))
+
+    def close(self) -> int:
+        """Patches the RIFF/data sizes and publishes the file. Returns its size."""
+        self._file.seek(0)
+        self._file.write(wav_header(self.sample_rate, self.data_bytes))
+        self._file.close()
+        os.replace(self.temp_path, self.path)
+        return 44 + self.data_bytes
+
+    def abort(self):
+        self._file.close()
+        self.temp_path.unlink(missing_ok=True)
+        if self.temporary:
+            self.path.unlink(missing_ok=True)
+
+    def blocks(self) -> Iterator[bytes]:
+        """The finished WAV, read back from disk."""
+        try:
+            with open(self.path, "rb") as f:
+                while True:
+                    block = f.read(READ_BLOCK_BYTES)
+                    if not block:
+                        break
+                    yield block
+        finally:
+            if self.temporary:
+                self.path.unlink(missing_ok=True)
+
+    @classmethod
+    def temporary_file(cls, sample_rate: int) -> "WavFileWriter":
+        fd, temp_name = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        return cls(Path(temp_name), sample_rate, temporary=True)
+
+
+class LiveRender:
+    """
+    Wraps a store writer so other requests can read a job's WAV while it is
+    still being synthesized (range requests for seeking, a second listener).
+    Bytes before the end are final; only the header sizes are provisional
+    (0xFFFFFFFF, like the progressive stream) until the render completes.
+    Create it on the event loop; write and close block (run them in the
+    executor, as assemble_wav does), and readers wake on the loop.
+    """
+
+    def __init__(self, sink, sample_rate: int):
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.done = False
+        self.failed = False
+        self._changed = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._io = threading.Lock() # The spool is shared by the writer and readers
+
+    @property
+    def available(self) -> int:
+        """WAV bytes readable so far (header included)."""
+        return 44 + self.sink.data_bytes
+
+    def write(self, audio: np.ndarray):
+        with self._io:
+            self.sink.write(audio)
+        self._loop.call_soon_threadsafe(self._notify)
+
+    def close(self) -> int:
+        with self._io:
+            size = self.sink.close()
+        self.done = True
+        self._loop.call_soon_threadsafe(self._notify)
+        return size
+
+    def abort(self):
+        with self._io:
+            self.sink.abort()
+        self.done = self.failed = True
+        self._loop.call_soon_threadsafe(self._notify)
+
+    def blocks(self) -> Iterator[bytes]:
+        return self.sink.blocks()
+
+    def store_variant(self, encoder):
+        if hasattr(self.sink, 'store_variant'):
+            self.sink.store_variant(encoder)
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_for(self, position: int):
+        """Waits until byte `position` exists or the render has ended."""
+        while not self.done and self.available <= position:
+            await self._changed.wait()
+
+    def _read(self, start: int, end: int) -> bytes:
+        end = min(end, self.available)
+        header = streaming_wav_header(self.sample_rate)[start:end] if start < 44 else b""
+        with self._io:
+            return header + self.sink.read_pcm_bytes(max(0, start - 44), max(0, end - 44))
+
+    async def read(self, start: int, end: int) -> bytes:
+        """WAV bytes [start, end) of what has been rendered so far."""
+        return await self._loop.run_in_executor(None, self._read, start, end)
+
+    async def follow(self) -> AsyncIterator[bytes]:
+        """The whole WAV from the start, tailing the render until it ends."""
+        position = 0
+        while True:
+            await self.wait_for(position)
+            if self.failed:
+                return
+            if self.available > position:
+                end = min(self.available, position + READ_BLOCK_BYTES)
+                yield await self.read(position, end)
+                position = end
+            elif self.done:
+                return
+
+
+def synthesize_ordered(
+    tts,
+    chunks: list[str],
+    voice: str,
+    use_cuda: bool,
+    executor,
+    workers: int,
+    gate: Callable,
+    cache: Optional[ChunkCache] = None,
+) -> AsyncIterator[np.ndarray]:
+    """
+    Starts rendering chunks (up to `workers` in parallel) immediately and
+    returns an iterator over their audio in text order; each chunk is yielded
+    as soon as it and everything before it is ready.
+    `gate` is called per chunk and must return an async context manager
+    (e.g. the priority gate's foreground/background).
+    Must be called from a running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max(1, workers))
+    # Bounded lookahead: a chunk may only start once the consumer is close
+    # enough behind, so finished-but-unconsumed audio never piles up
+    window = asyncio.Semaphore(max(1, workers) * 2)
+    model_version = getattr(tts, 'model_version', 'unknown')
+
+    async def render(index: int, text: str) -> np.ndarray:
+        await window.acquire()
+        key = ChunkCache.key(model_version, voice, text)
+        if cache is not None:
+            audio = cache.get(key)
+            if audio is not None:
+                logger.info(f"Chunk {index}: cache hit ({len(text)} chars)")
+                return audio
+        async with semaphore, gate():
+            logger.info(f"Parallel Worker: Processing Chunk {index} ({len(text)} chars)")
+            audio = await loop.run_in_executor(
+                executor,
+                partial(tts.generate_speech, text, voice=voice, use_cuda=use_cuda)
+            )
+        audio = to_int16(audio)
+        if cache is not None:
+            cache.put(key, audio)
+        return audio
+
+    tasks = [asyncio.create_task(render(i, chunk)) for i, chunk in enumerate(chunks)]
+    return _in_order(tasks, window)
+
+
+async def _in_order(tasks: list[asyncio.Task], window: asyncio.Semaphore) -> AsyncIterator[np.ndarray]:
+    try:
+        for index in range(len(tasks)):
+            audio = await tasks[index]
+            # A finished task keeps its result alive: drop it once consumed
+            tasks[index] = None
+            window.release()
+            yield audio
+            del audio
+    finally:
+        # Consumer went away (client disconnect, cancellation): drop queued work
+        for task in tasks:
+            if task is not None:
+                task.cancel()
+
+
+async def _read_blocks(blocks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """Blocks read back from disk, each on the executor."""
+    loop = asyncio.get_running_loop()
+    while True:
+        block = await loop.run_in_executor(None, next, blocks, None)
+        if block is None:
+            break
+        yield block
+
+
+async def assemble_wav(
+    audio_iter: AsyncIterator[np.ndarray],
+    sample_rate: int,
+    sink=None,
+    progressive: bool = False,
+    emit: bool = True,
+    encoder=None,
+) -> AsyncIterator[bytes]:
+    """
+    Turns ordered chunk audio into WAV bytes, holding at most one chunk in memory.
+
+    - progressive: yields an open-ended header, then each chunk as it arrives.
+    - buffered (default): yields a complete WAV (exact header) once everything
+      is rendered, read back from the sink in blocks.
+    - emit=False: yields nothing; only persists (for JSON-returning endpoints).
+
+    Chunks are written to `sink` as they arrive (a WavFileWriter or an audio
+    store writer); without one, a temporary file is used.
+    With an `encoder` (audio_codecs) the emitted bytes are in its format
+    instead, encoded chunk by chunk, and a store sink caches the result too.
+    """
+    if sink is None:
+        sink = WavFileWriter.temporary_file(sample_rate)
+    # Sink writes and the close (a store sink copies its spool into a segment) hit the disk
+    loop = asyncio.get_running_loop()
+
+    try:
+        if progressive and emit and encoder is None:
+            yield streaming_wav_header(sample_rate)
+        async for audio_chunk in audio_iter:
+            await loop.run_in_executor(None, sink.write, audio_chunk)
+            if encoder is not None:
+                encoded = encoder.write(audio_chunk)
+                if progressive and emit and encoded:
+                    yield encoded
+            elif progressive and emit:
+                yield pcm_view(audio_chunk)
+            del audio_chunk
+        if encoder is not None:
+            encoded = encoder.finish()
+            if progressive and emit and encoded:
+                yield encoded
+    except BaseException:
+        sink.abort()
+        if encoder is not None:
+            encoder.close()
+        raise
+
+    # PERSISTENCE: Save so we can serve it later (even after restart)
+    file_size = await loop.run_in_executor(None, sink.close)
+    logger.info(f"Saved audio ({file_size} bytes)")
+
+    if encoder is not None:
+        try:
+            if hasattr(sink, 'store_variant'):
+                await loop.run_in_executor(None, sink.store_variant, encoder)
+            if emit and not progressive:
+                async for block in _read_blocks(encoder.blocks()):
+                    yield block
+        finally:
+            encoder.close()
+            if getattr(sink, 'temporary', False):
+                sink.abort()
+    elif emit and not progressive:
+        async for block in _read_blocks(sink.blocks()):
+            yield block
+    elif getattr(sink, 'temporary', False):
+        sink.abort()
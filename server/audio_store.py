@@ -0,0 +1,448 @@
+# server/audio_store.py
+
+"""
+Append-only segment store for rendered audio.
+Instead of one small WAV file per job/text hash, PCM is appended to a few
+large segment files and located through an in-memory index
+(key -> segment, offset, length), so lookups never touch filesystem metadata.
+Reads are served from memory-mapped segments with a synthesized WAV header;
+segments that are mostly dead (deleted or overwritten audio) are compacted
+in the background. Encoded variants (Opus, FLAC, ...) of a render are stored
+next to its PCM under variant_key() and served as-is.
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+
+import numpy as np
+
+from audio_pipeline import READ_BLOCK_BYTES, pcm_view, wav_header
+
+logger = logging.getLogger(__name__)
+
+# Record layout: magic, flags, key length, sample rate, PCM length, key, PCM
+_RECORD = struct.Struct("<4sHHIQ")
+_MAGIC = b"LAS1"
+_TOMBSTONE = 1
+_ENCODED = 2 # Data is a complete encoded file, served without a synthesized header
+_SEGMENT_PATTERN = re.compile(r"^segment_(\d{6})\.dat$")
+
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+
+
+class StoreEntry(NamedTuple):
+    segment: int
+    offset: int # Start of the PCM data within the segment
+    length: int # PCM (or encoded file) bytes
+    sample_rate: int
+    encoded: bool = False
+
+
+def variant_key(key: str, format_name: str) -> str:
+    """Store key of an encoded variant of a render ("tts_ab12" -> "tts_ab12.opus")."""
+    return key if format_name == "wav" else f"{key}.{format_name}"
+
+
+class AudioStore:
+    """
+    Keyed 16-bit mono PCM audio in append-only segment files.
+    Thread-safe; writes go through StoreWriter so a job never holds its whole
+    audio in memory.
+    """
+
+    def __init__(self, directory: Path, segment_bytes: int = DEFAULT_SEGMENT_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self._lock = threading.Lock() # Index, sizes and maps; never held while copying audio
+        self._append_lock = threading.RLock() # Appends to the active segment, one at a time
+        self._index: dict[str, StoreEntry] = {}
+        self._segment_sizes: dict[int, int] = {} # segment -> bytes on disk
+        self._segment_live: dict[int, int] = {} # segment -> bytes still referenced
+        self._tombstones: dict[int, set[str]] = {} # segment -> keys deleted there
+        self._maps: dict[int, mmap.mmap] = {}
+        self._etags: dict[str, tuple[StoreEntry, str]] = {}
+        self._unlink_pending: list[Path] = [] # Compacted segments still mapped (Windows)
+        self._active: Optional[int] = None
+        self._active_file = None
+        self._load()
+
+    # --- Index ---
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / f"segment_{segment:06d}.dat"
+
+    def _load(self):
+        """Rebuilds the index by scanning record headers (data is skipped, not read)."""
+        segments = sorted(
+            int(m.group(1)) for m in map(_SEGMENT_PATTERN.match, os.listdir(self.directory)) if m
+        )
+        for segment in segments:
+            path = self._segment_path(segment)
+            size = path.stat().st_size
+            self._segment_sizes[segment] = size
+            self._segment_live.setdefault(segment, 0)
+            with open(path, "rb") as f:
+                position = 0
+                while position < size:
+                    header = f.read(_RECORD.size)
+                    if len(header) < _RECORD.size:
+                        break
+                    magic, flags, key_len, sample_rate, length = _RECORD.unpack(header)
+                    end = position + _RECORD.size + key_len + length
+                    if magic != _MAGIC or end > size:
+                        break
+                    key = f.read(key_len).decode()
+                    if flags & _TOMBSTONE:
+                        self._drop(key)
+                        self._tombstones.setdefault(segment, set()).add(key)
+                    else:
+                        self._set(key, StoreEntry(
+                            segment, position + _RECORD.size + key_len, length, sample_rate, bool(flags & _ENCODED)
+                        ))
+                    f.seek(end)
+                    position = end
+            if position < size:
+                # Torn write from a crash: cut the segment back to its last whole record
+                logger.warning(f"Audio store: truncating {path.name} at {position} (was {size})")
+                with open(path, "r+b") as f:
+                    f.truncate(position)
+                self._segment_sizes[segment] = position
+        if segments:
+            self._active = segments[-1]
+        logger.info(f"Audio store: {len(self._index)} entries in {len(segments)} segments")
+
+    def _set(self, key: str, entry: StoreEntry):
+        self._drop(key)
+        self._index[key] = entry
+        self._segment_live[entry.segment] = self._segment_live.get(entry.segment, 0) + entry.length
+
+    def _drop(self, key: str) -> Optional[StoreEntry]:
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            self._segment_live[entry.segment] -= entry.length
+            self._etags.pop(key, None)
+        return entry
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, key: str) -> Optional[StoreEntry]:
+        return self._index.get(key)
+
+    def size(self, key: str) -> Optional[int]:
+        """Size of the served file (WAV header included), or None if absent."""
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        return entry.length if entry.encoded else 44 + entry.length
+
+    # --- Writing ---
+
+    def writer(self, key: str, sample_rate: int) -> "StoreWriter":
+        return StoreWriter(self, key, sample_rate)
+
+    def _open_active(self, incoming: int):
+        """Returns the segment to append to, rolling over when it is full."""
+        if self._active is not None and self._active_file is None:
+            self._active_file = open(self._segment_path(self._active), "ab")
+        if self._active is None or (
+            self._segment_sizes[self._active] > 0
+            and self._segment_sizes[self._active] + incoming > self.segment_bytes
+        ):
+            if self._active_file is not None:
+                self._active_file.close()
+            self._active = 0 if self._active is None else self._active + 1
+            self._segment_sizes[self._active] = 0
+            self._segment_live[self._active] = 0
+            self._active_file = open(self._segment_path(self._active), "ab")
+        return self._active, self._active_file
+
+    def _append(self, key: str, sample_rate: int, source, length: int, flags: int = 0):
+        """Appends one record; source is a readable file object positioned at the PCM."""
+        key_bytes = key.encode()
+        with self._append_lock:
+            with self._lock:
+                segment, f = self._open_active(_RECORD.size + len(key_bytes) + length)
+                position = self._segment_sizes[segment]
+            # Readers (and the index) stay available while a long render is copied in
+            f.write(_RECORD.pack(_MAGIC, flags, len(key_bytes), sample_rate, length))
+            f.write(key_bytes)
+            if length:
+                shutil.copyfileobj(source, f, READ_BLOCK_BYTES)
+            f.flush()
+            with self._lock:
+                self._segment_sizes[segment] = position + _RECORD.size + len(key_bytes) + length
+                if flags & _TOMBSTONE:
+                    self._drop(key)
+                    self._tombstones.setdefault(segment, set()).add(key)
+                else:
+                    self._set(key, StoreEntry(
+                        segment, position + _RECORD.size + len(key_bytes), length, sample_rate, bool(flags & _ENCODED)
+                    ))
+
+    def put(self, key: str, audio: np.ndarray, sample_rate: int):
+        writer = self.writer(key, sample_rate)
+        writer.write(audio)
+        writer.close()
+
+    def put_file(self, key: str, source, length: int, sample_rate: int):
+        """Stores an already-encoded file (source positioned at its start)."""
+        self._append(key, sample_rate, source, length, flags=_ENCODED)
+
+    def encode_variant(self, key: str, encoder) -> str:
+        """
+        Encodes a stored render with an audio_codecs encoder and stores the
+        result under its variant key. Blocking: run in the executor.
+        """
+        entry = self._index[key]
+        if entry.length:
+            mapped = self._map(entry.segment, entry.offset + entry.length)
+            view = memoryview(mapped)[entry.offset:entry.offset + entry.length]
+            # ~1 second of audio per block keeps memory flat for long renders
+            step = entry.sample_rate * 2
+            for start in range(0, entry.length, step):
+                encoder.write(np.frombuffer(view[start:start + step], dtype=np.int16))
+        encoder.finish()
+        variant = variant_key(key, encoder.format.name)
+        size = encoder.size
+        encoder.spool.seek(0)
+        self.put_file(variant, encoder.spool, size, encoder.sample_rate)
+        return variant
+
+    def delete(self, key: str) -> bool:
+        """Removes a key (a tombstone record keeps it deleted across restarts)."""
+        if key not in self._index:
+            return False
+        self._append(key, 0, None, 0, flags=_TOMBSTONE)
+        return True
+
+    def clear(self):
+        """Drops every entry and segment."""
+        with self._append_lock, self._lock:
+            if self._active_file is not None:
+                self._active_file.close()
+                self._active_file = None
+            self._maps.clear()
+            for segment in list(self._segment_sizes):
+                try:
+                    self._segment_path(segment).unlink(missing_ok=True)
+                except OSError as e:
+                    logger.warning(f"Audio store: could not remove segment {segment}: {e}")
+            self._index.clear()
+            self._segment_sizes.clear()
+            self._segment_live.clear()
+            self._tombstones.clear()
+            self._active = None
+
+    # --- Reading ---
+
+    def _map(self, segment: int, needed_end: int) -> mmap.mmap:
+        with self._lock:
+            mapped = self._maps.get(segment)
+            if mapped is None or len(mapped) < needed_end:
+                # The active segment grows: remap to cover newly appended records
+                with open(self._segment_path(segment), "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[segment] = mapped
+            return mapped
+
+    def iter_audio(self, key: str, start: int = 0, end: Optional[int] = None,
+                   block_size: int = READ_BLOCK_BYTES) -> Iterator[bytes]:
+        """
+        Yields bytes [start, end) of the key's file, sliced straight out of the
+        mapped segment. PCM renders get a synthesized WAV header in front.
+        Raises KeyError if the key is absent.
+        """
+        entry = self._index[key]
+        header = b"" if entry.encoded else wav_header(entry.sample_rate, entry.length)
+        total = len(header) + entry.length
+        end = total if end is None else min(end, total)
+        if start < len(header):
+            yield header[start:min(end, len(header))]
+            start = len(header)
+        if start >= end:
+            return
+        mapped = self._map(entry.segment, entry.offset + entry.length)
+        position = entry.offset + start - len(header)
+        stop = entry.offset + end - len(header)
+        while position < stop:
+            block_end = min(position + block_size, stop)
+            yield mapped[position:block_end]
+            position = block_end
+
+    def etag(self, key: str) -> str:
+        """
+        Strong ETag derived from the content (so compaction moving a record
+        doesn't change it). Hashes the data once; blocking on first call.
+        """
+        entry = self._index[key]
+        cached = self._etags.get(key)
+        if cached is not None and cached[0] == entry:
+            return cached[1]
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(struct.pack("<I?", entry.sample_rate, entry.encoded))
+        if entry.length:
+            mapped = self._map(entry.segment, entry.offset + entry.length)
+            digest.update(memoryview(mapped)[entry.offset:entry.offset + entry.length])
+        value = f'"{digest.hexdigest()}"'
+        self._etags[key] = (entry, value)
+        return value
+
+    def read_pcm(self, key: str) -> np.ndarray:
+        """Copies a PCM render's samples out as an int16 array."""
+        entry = self._index[key]
+        if not entry.length:
+            return np.zeros(0, dtype=np.int16)
+        mapped = self._map(entry.segment, entry.offset + entry.length)
+        return np.frombuffer(mapped[entry.offset:entry.offset + entry.length], dtype=np.int16)
+
+    # --- Compaction ---
+
+    def compact(self, min_live_ratio: float = 0.5) -> int:
+        """
+        Rewrites sealed segments whose live data fell below min_live_ratio into
+        the active segment and removes them. Blocking: run in the executor.
+        Returns the number of segments reclaimed.
+        """
+        self._retry_unlinks()
+        with self._lock:
+            candidates = [
+                segment for segment, size in self._segment_sizes.items()
+                if segment != self._active and size
+                and self._segment_live.get(segment, 0) < size * min_live_ratio
+            ]
+        reclaimed = 0
+        for segment in sorted(candidates):
+            with self._lock:
+                live = [(key, entry) for key, entry in self._index.items() if entry.segment == segment]
+            for key, entry in live:
+                if entry.length:
+                    mapped = self._map(segment, entry.offset + entry.length)
+                    source = _MemoryReader(memoryview(mapped)[entry.offset:entry.offset + entry.length])
+                else:
+                    source = None
+                # Only move the record if nothing replaced it meanwhile: every write
+                # appends under _append_lock, so the check holds until this append lands
+                with self._append_lock:
+                    if self._index.get(key) == entry:
+                        self._append(key, entry.sample_rate, source, entry.length,
+                                     flags=_ENCODED if entry.encoded else 0)
+            with self._lock:
+                # Deletions recorded here still shadow audio in older segments
+                older_exists = any(s < segment for s in self._segment_sizes)
+                tombstones = self._tombstones.pop(segment, set())
+            if older_exists:
+                for key in tombstones:
+                    with self._append_lock:
+                        if key not in self._index:
+                            self._append(key, 0, None, 0, flags=_TOMBSTONE)
+            with self._lock:
+                self._maps.pop(segment, None)
+                self._segment_sizes.pop(segment, None)
+                self._segment_live.pop(segment, None)
+            self._unlink(self._segment_path(segment))
+            reclaimed += 1
+        if reclaimed:
+            logger.info(f"Audio store: compacted {reclaimed} segments")
+        return reclaimed
+
+    def _unlink(self, path: Path):
+        try:
+            path.unlink(missing_ok=True)
+        except OSError:
+            # Still mapped by an in-flight response (Windows): try again next pass
+            self._unlink_pending.append(path)
+
+    def _retry_unlinks(self):
+        pending, self._unlink_pending = self._unlink_pending, []
+        for path in pending:
+            self._unlink(path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._index),
+                "segments": len(self._segment_sizes),
+                "bytes": sum(self._segment_sizes.values()),
+                "live_bytes": sum(self._segment_live.values()),
+            }
+
+
+class _MemoryReader:
+    """Minimal file-like reader over a memoryview (no copy until written out)."""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._position = 0
+
+    def read(self, size: int = -1):
+        if size < 0:
+            size = len(self._view) - self._position
+        chunk = self._view[self._position:self._position + size]
+        self._position += len(chunk)
+        return chunk
+
+
+class StoreWriter:
+    """
+    Collects a job's PCM in an anonymous spool file and appends it to the store
+    as one record on close, so concurrent jobs never interleave within a segment.
+    Same interface as WavFileWriter.
+    """
+
+    def __init__(self, store: AudioStore, key: str, sample_rate: int):
+        self.store = store
+        self.key = key
+        self.sample_rate = sample_rate
+        self.data_bytes = 0
+        self._spool = tempfile.TemporaryFile()
+
+    def write(self, audio: np.ndarray):
+        self.data_bytes += self._spool.write(pcm_view(audio))
+
+    def close(self) -> int:
+        self._spool.seek(0)
+        try:
+            self.store._append(self.key, self.sample_rate, self._spool, self.data_bytes)
+        finally:
+            self._spool.close()
+        return 44 + self.data_bytes
+
+    def abort(self):
+        self._spool.close()
+
+    def read_pcm_bytes(self, start: int, end: int) -> bytes:
+        """
+        PCM bytes [start, end) written so far: from the spool while rendering,
+        from the store once closed. Call from the thread that writes.
+        """
+        if self._spool.closed:
+            return b"".join(self.store.iter_audio(self.key, 44 + start, 44 + end))
+        position = self._spool.tell()
+        self._spool.seek(start)
+        data = self._spool.read(end - start)
+        self._spool.seek(position)
+        return data
+
+    def blocks(self) -> Iterator[bytes]:
+        """The finished WAV, read back from the store."""
+        return self.store.iter_audio(self.key)
+
+    def store_variant(self, encoder):
+        """Caches a finished encoder's output next to this render."""
+        size = encoder.size
+        encoder.spool.seek(0)
+        self.store.put_file(variant_key(self.key, encoder.format.name), encoder.spool, size, encoder.sample_rate)
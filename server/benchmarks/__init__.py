@@ -0,0 +1,2 @@
+# server/benchmarks/__init__.py
+"""Offline performance benchmarks for the Lumina server (run from server/ with python -m)."""
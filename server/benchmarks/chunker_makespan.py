@@ -0,0 +1,118 @@
+# server/benchmarks/chunker_makespan.py
+
+"""
+Makespan benchmark: legacy sentence regex vs. the length-balanced chunker.
+
+Each work item costs a fixed per-call overhead plus time proportional to its
+length (a linear RTF model of Pocket TTS), scheduled on N parallel workers in
+text order, the same way stream_generator's semaphore does. Pass --live to time
+real TTSHandler calls instead of the model.
+
+    cd server && python -m benchmarks.chunker_makespan --workers 2 4 8
+"""
+
+import argparse
+import heapq
+import json
+import re
+import time
+from pathlib import Path
+
+from phrase_bank import split_opener
+from text_chunker import balanced_target, chunk_text
+
+DATA_FILE = Path(__file__).parent / "data" / "recorded_answers.json"
+
+
+def legacy_split(text: str) -> list[str]:
+    """The original stream_generator splitter."""
+    return [s for s in re.split(r'(?<=[.!?])\s+', text) if s.strip()]
+
+
+def simulate(durations: list[float], workers: int) -> tuple[float, float]:
+    """List-schedules items in order on N workers. Returns (makespan, first_item_done)."""
+    free_at = [0.0] * workers
+    heapq.heapify(free_at)
+    finish = []
+    for duration in durations:
+        start = heapq.heappop(free_at)
+        end = start + duration
+        finish.append(end)
+        heapq.heappush(free_at, end)
+    return (max(finish), finish[0]) if finish else (0.0, 0.0)
+
+
+def model_cost(overhead: float, per_char: float):
+    return lambda item: overhead + per_char * len(item)
+
+
+def live_cost():
+    from tts_handler import TTSHandler
+    tts = TTSHandler()
+    timings = {}
+
+    def cost(item: str) -> float:
+        if item not in timings:
+            start = time.perf_counter()
+            tts.generate_speech(item)
+            timings[item] = time.perf_counter() - start
+        return timings[item]
+    return cost
+
+
+def run(workers_list: list[int], cost, answers: list[dict]) -> dict:
+    report = {}
+    for workers in workers_list:
+        totals = {"legacy": [0.0, 0.0, 0], "chunker": [0.0, 0.0, 0]}
+        for answer in answers:
+            # Openers come pre-rendered from the phrase bank in both pipelines
+            _, body = split_opener(answer["text"])
+            plans = {
+                "legacy": legacy_split(body),
+                "chunker": chunk_text(body, target=balanced_target(body, workers)),
+            }
+            for name, items in plans.items():
+                makespan, first = simulate([cost(i) for i in items], workers)
+                totals[name][0] += makespan
+                totals[name][1] += first
+                totals[name][2] += len(items)
+        n = len(answers)
+        report[workers] = {
+            name: {
+                "mean_makespan_s": round(t[0] / n, 3),
+                "mean_first_audio_s": round(t[1] / n, 3),
+                "mean_items": round(t[2] / n, 1),
+            }
+            for name, t in totals.items()
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--overhead", type=float, default=0.35, help="Per-call TTS overhead (s)")
+    parser.add_argument("--per-char", type=float, default=0.012, help="Synthesis time per character (s)")
+    parser.add_argument("--live", action="store_true", help="Time real TTSHandler calls")
+    parser.add_argument("--json", action="store_true", help="Print the raw report as JSON")
+    args = parser.parse_args()
+
+    answers = json.loads(DATA_FILE.read_text(encoding="utf-8"))["answers"]
+    cost = live_cost() if args.live else model_cost(args.overhead, args.per_char)
+    report = run(args.workers, cost, answers)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{len(answers)} recorded answers, {'live TTS' if args.live else f'model: {args.overhead}s + {args.per_char}s/char'}")
+    print(f"{'workers':>7} | {'splitter':<8} | {'items':>5} | {'makespan':>9} | {'first audio':>11}")
+    for workers, rows in report.items():
+        for name, row in rows.items():
+            print(f"{workers:>7} | {name:<8} | {row['mean_items']:>5} | {row['mean_makespan_s']:>8.2f}s | {row['mean_first_audio_s']:>10.2f}s")
+        legacy, chunked = rows["legacy"]["mean_makespan_s"], rows["chunker"]["mean_makespan_s"]
+        print(f"{'':>7}   makespan change: {100 * (chunked - legacy) / legacy:+.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# server/benchmarks/load/__init__.py
+"""End-to-end load test: the app in-process with stub backends under mixed traffic (python -m benchmarks.load)."""
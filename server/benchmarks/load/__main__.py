@@ -0,0 +1,168 @@
+# server/benchmarks/load/__main__.py
+
+"""
+End-to-end load test: starts the app in-process (uvicorn on a local port, on
+its own thread) with a stub TTS (fixed real-time factor) and the replay LLM
+provider (answers paced at a set time-to-first-token and token rate, or
+recorded streams with --replay), then drives a mix of generate, stream, tts,
+follow-up-with-screenshot and history-restore requests at each concurrency
+level. Reports p50/p95/p99 of time to first token, time to first audio and
+total per scenario, plus requests/s and peak RSS. --save writes the report;
+--baseline compares against a saved one and exits 1 on a regression.
+
+Caches that would turn repeated requests into hits (the answer cache, the TTS
+chunk cache) are off unless --warm-caches. Needs httpx.
+
+    cd server && python -m benchmarks.load --concurrency 1 4 16 --save before.json
+    cd server && python -m benchmarks.load --concurrency 1 4 16 --baseline before.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import psutil
+
+from benchmarks.load.backends import FirstTokenClock, StubTTS, synthetic_recordings
+from benchmarks.load.report import compare, print_table, summarize
+from benchmarks.load.traffic import Traffic, parse_mix, schedule
+from llm_replay import Recordings
+
+DATA_FILE = Path(__file__).parent.parent / "data" / "recorded_answers.json"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, answers: list[dict], workdir: Path):
+    """Imports the app with the benchmark's settings, installs the stubs and serves it. Returns (server, clock, url)."""
+    # Startup clears the audio store and sessions persist: keep both in the workdir, not the user's
+    os.environ["LUMINA_AUDIO_DIR"] = str(workdir / "audio")
+    os.environ["LUMINA_SESSION_DB"] = str(workdir / "sessions.sqlite3")
+    if not args.warm_caches:
+        os.environ["LUMINA_ANSWER_CACHE"] = "0"
+        os.environ["LUMINA_CHUNK_CACHE_MB"] = "0"
+    import uvicorn
+    import app
+    from llm_handler import LLMHandler, ReplayProvider
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    recordings = (Recordings(args.replay) if args.replay
+                  else synthetic_recordings(answers, args.llm_ttft, args.llm_tps, workdir / "replay.json"))
+    clock = FirstTokenClock(ReplayProvider(recordings, strict=False))
+    llm = LLMHandler()
+    llm.providers["replay"] = clock
+    app._handlers["llm"] = llm
+    app._handlers["tts"] = StubTTS(rtf=args.tts_rtf, overhead=args.tts_overhead)
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 30
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("Server did not start")
+        time.sleep(0.05)
+    return server, clock, f"http://127.0.0.1:{port}"
+
+
+async def run_level(url: str, clock: FirstTokenClock, answers: list[dict], concurrency: int,
+                    scenarios: list[str], numbers: itertools.count) -> dict:
+    process = psutil.Process()
+    peak = process.memory_info().rss
+    work: asyncio.Queue = asyncio.Queue()
+    for scenario in scenarios:
+        work.put_nowait((scenario, next(numbers)))
+    samples = []
+
+    async with httpx.AsyncClient(base_url=url, timeout=300, limits=httpx.Limits(max_connections=concurrency * 2)) as client:
+        traffic = Traffic(client, clock, answers)
+
+        async def user():
+            while not work.empty():
+                scenario, n = work.get_nowait()
+                samples.append(await traffic.run(scenario, n))
+
+        async def sample_rss():
+            nonlocal peak
+            while True:
+                peak = max(peak, process.memory_info().rss)
+                await asyncio.sleep(0.05)
+
+        sampler = asyncio.create_task(sample_rss())
+        started = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        seconds = time.perf_counter() - started
+        sampler.cancel()
+    return summarize(concurrency, samples, seconds, peak)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Concurrent users per level")
+    parser.add_argument("--requests", type=int, default=60, help="Requests per level")
+    parser.add_argument("--mix", default="generate=3,stream=3,tts=2,followup=1,restore=1", help="Scenario weights")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the scenario sequence")
+    parser.add_argument("--llm-ttft", type=float, default=0.6, help="Stub LLM time to first token (s)")
+    parser.add_argument("--llm-tps", type=float, default=60, help="Stub LLM output tokens per second")
+    parser.add_argument("--replay", help="Replay recorded streams from this file instead (see llm_replay)")
+    parser.add_argument("--tts-rtf", type=float, default=0.3, help="Stub TTS real-time factor")
+    parser.add_argument("--tts-overhead", type=float, default=0.05, help="Stub TTS per-call overhead (s)")
+    parser.add_argument("--warm-caches", action="store_true", help="Keep the answer and TTS chunk caches on")
+    parser.add_argument("--save", help="Write the report (JSON) here")
+    parser.add_argument("--baseline", help="Compare against this saved report; exit 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed change against the baseline (0.15 = 15%%)")
+    parser.add_argument("--json", action="store_true", help="Print the raw report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Keep the server's INFO logging")
+    args = parser.parse_args()
+
+    answers = json.loads(DATA_FILE.read_text(encoding="utf-8"))["answers"]
+    mix = parse_mix(args.mix)
+    with tempfile.TemporaryDirectory() as workdir:
+        server, clock, url = start_server(args, answers, Path(workdir))
+        numbers = itertools.count()
+        levels = []
+        try:
+            for concurrency in args.concurrency:
+                scenarios = schedule(mix, args.requests, args.seed + concurrency)
+                levels.append(asyncio.run(run_level(url, clock, answers, concurrency, scenarios, numbers)))
+        finally:
+            server.should_exit = True
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("save", "baseline", "json", "verbose")},
+        "levels": levels,
+    }
+    if args.save:
+        Path(args.save).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_table(report)
+
+    if args.baseline:
+        regressions = compare(report, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
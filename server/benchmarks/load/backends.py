@@ -0,0 +1,89 @@
+# server/benchmarks/load/backends.py
+
+"""
+Stand-ins for the model backends, so a load test measures the server and not
+a GPU or an API quota: a TTS with a fixed real-time factor, and the replay
+LLM provider fed recorded answers at a set pace.
+"""
+
+import re
+import time
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from llm_handler import LLMProvider
+from llm_replay import Recordings
+
+SPEECH_CHARS_PER_SECOND = 15 # Audio length per character of text at a normal speaking rate
+CHARS_PER_TOKEN = 4
+TOKENS_PER_CHUNK = 3 # Providers stream a few tokens per chunk
+
+# Each request tags its prompt, so the provider side can say when its first token left
+REQUEST_TAG = re.compile(r"\[req (\d+)\]")
+
+
+class StubTTS:
+    """
+    Duck-types TTSHandler: each call sleeps overhead + rtf x the audio's duration
+    and returns a tone that long. Sleeping leaves the CPU free, like a GPU would.
+    """
+
+    def __init__(self, rtf: float = 0.3, overhead: float = 0.05, sample_rate: int = 24000):
+        self.rtf = rtf
+        self.overhead = overhead
+        self.sample_rate = sample_rate
+        self.is_available = True
+        self.model_version = "stub"
+        self.voice_cache = {}
+        self.current_device = "cpu"
+
+    def generate_speech(self, text: str, voice: str = "alba", use_cuda: bool = False) -> np.ndarray:
+        seconds = max(0.2, len(text) / SPEECH_CHARS_PER_SECOND)
+        time.sleep(self.overhead + self.rtf * seconds)
+        t = np.arange(int(seconds * self.sample_rate), dtype=np.float32) / self.sample_rate
+        return (0.1 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def synthetic_recordings(answers: list[dict], ttft: float, tokens_per_second: float, path: Path) -> Recordings:
+    """A replay file with each answer streamed after ttft, at tokens_per_second."""
+    recordings = Recordings(str(path))
+    chunk_chars = CHARS_PER_TOKEN * TOKENS_PER_CHUNK
+    for index, answer in enumerate(answers):
+        chunks, current = [], ""
+        for word in answer["text"].split(" "):
+            current += word + " "
+            if len(current) >= chunk_chars:
+                chunks.append(current)
+                current = ""
+        if current:
+            chunks.append(current)
+        pause = len(chunks[0]) / CHARS_PER_TOKEN / tokens_per_second
+        recordings.put(f"synthetic-{index}", {
+            "provider": "synthetic",
+            "model": "synthetic",
+            "prompt": answer["prompt"],
+            "chunks": [[round(ttft if i == 0 else pause, 4), chunk] for i, chunk in enumerate(chunks)],
+        })
+    return recordings
+
+
+class FirstTokenClock(LLMProvider):
+    """Wraps a provider and notes when each tagged request's first chunk came out of it."""
+
+    def __init__(self, provider: LLMProvider):
+        self.provider = provider
+        self.model = provider.model
+        self.vision = provider.vision
+        self.fast = provider.fast
+        self.first_token: dict[int, float] = {}
+
+    def generate_stream(self, prompt, images, api_key, tone, history=None, custom_persona=None, max_tokens=None) -> Iterator[str]:
+        tag = REQUEST_TAG.search(prompt)
+        first = True
+        for chunk in self.provider.generate_stream(prompt, images, api_key, tone, history, custom_persona, max_tokens):
+            if first and tag:
+                self.first_token.setdefault(int(tag.group(1)), time.perf_counter())
+                first = False
+            yield chunk
@@ -0,0 +1,98 @@
+# server/benchmarks/load/report.py
+
+"""Latency percentiles per concurrency level, and comparison against a saved baseline run."""
+
+from typing import Optional
+
+import numpy as np
+
+from benchmarks.load.traffic import Sample
+
+METRICS = ("ttft", "ttfa", "total")
+PERCENTILES = (50, 95, 99)
+
+
+def percentiles(values: list[float]) -> Optional[dict]:
+    if not values:
+        return None
+    points = np.percentile(values, PERCENTILES)
+    return {f"p{p}": round(float(v), 4) for p, v in zip(PERCENTILES, points)}
+
+
+def _latencies(samples: list[Sample]) -> dict:
+    ok = [s for s in samples if s.error is None]
+    return {
+        metric: percentiles([getattr(s, metric) for s in ok if getattr(s, metric) is not None])
+        for metric in METRICS
+    }
+
+
+def summarize(concurrency: int, samples: list[Sample], seconds: float, peak_rss: int) -> dict:
+    scenarios = {}
+    for name in sorted({s.scenario for s in samples}):
+        matching = [s for s in samples if s.scenario == name]
+        scenarios[name] = {
+            "count": len(matching),
+            "errors": sum(1 for s in matching if s.error),
+            **_latencies(matching),
+        }
+    errors = [s.error for s in samples if s.error]
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": len(errors),
+        "firstErrors": errors[:3],
+        "seconds": round(seconds, 3),
+        "requestsPerSecond": round(len(samples) / seconds, 3) if seconds else None,
+        "peakRssMb": round(peak_rss / 2**20, 1),
+        "overall": _latencies(samples),
+        "scenarios": scenarios,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Regressions against a baseline run, level by level: p95/p99 latencies or
+    peak RSS more than tolerance above it, throughput more than tolerance below.
+    """
+    regressions = []
+    levels = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    for level in report["levels"]:
+        before = levels.get(level["concurrency"])
+        if before is None:
+            continue
+        where = f"c={level['concurrency']}"
+        if before["requestsPerSecond"] and level["requestsPerSecond"] < before["requestsPerSecond"] * (1 - tolerance):
+            regressions.append(f"{where} requests/s {before['requestsPerSecond']} -> {level['requestsPerSecond']}")
+        if level["peakRssMb"] > before["peakRssMb"] * (1 + tolerance):
+            regressions.append(f"{where} peak RSS {before['peakRssMb']}MB -> {level['peakRssMb']}MB")
+        if level["errors"] > before["errors"]:
+            regressions.append(f"{where} errors {before['errors']} -> {level['errors']}")
+        for name, scenario in level["scenarios"].items():
+            old = before["scenarios"].get(name)
+            if old is None:
+                continue
+            for metric in METRICS:
+                for p in ("p95", "p99"):
+                    now, then = (scenario.get(metric) or {}).get(p), (old.get(metric) or {}).get(p)
+                    if now is not None and then and now > then * (1 + tolerance):
+                        regressions.append(f"{where} {name} {metric} {p} {then * 1000:.0f}ms -> {now * 1000:.0f}ms")
+    return regressions
+
+
+def print_table(report: dict):
+    def ms(stats: Optional[dict], p: str) -> str:
+        return f"{stats[p] * 1000:.0f}" if stats else "-"
+
+    print(f"{'conc':>4} | {'scenario':<8} | {'n':>4} | {'err':>3} | "
+          f"{'ttft p50/p95/p99 (ms)':>22} | {'ttfa p50/p95/p99 (ms)':>22} | {'total p50/p95/p99 (ms)':>23}")
+    for level in report["levels"]:
+        rows = list(level["scenarios"].items()) + [("all", {"count": level["requests"], "errors": level["errors"], **level["overall"]})]
+        for name, stats in rows:
+            cells = [
+                "/".join(ms(stats[metric], p) for p in ("p50", "p95", "p99"))
+                for metric in METRICS
+            ]
+            print(f"{level['concurrency']:>4} | {name:<8} | {stats['count']:>4} | {stats['errors']:>3} | "
+                  f"{cells[0]:>22} | {cells[1]:>22} | {cells[2]:>23}")
+        print(f"{'':>4}   {level['requestsPerSecond']} requests/s, peak RSS {level['peakRssMb']}MB")
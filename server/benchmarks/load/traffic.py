@@ -0,0 +1,157 @@
+# server/benchmarks/load/traffic.py
+
+"""
+The request mix. Each scenario is one user action against the running
+server, timed from the client: time to first token (from the provider
+clock, same process), time to first audio byte, and total. Answers come
+from the replay provider, so every request names llmProvider "replay".
+"""
+
+import io
+import random
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+from PIL import Image
+
+from benchmarks.load.backends import FirstTokenClock
+
+WAV_HEADER_BYTES = 44
+SCENARIOS = ("generate", "stream", "tts", "followup", "restore")
+
+
+@dataclass
+class Sample:
+    scenario: str
+    total: float
+    ttft: Optional[float] = None
+    ttfa: Optional[float] = None
+    error: Optional[str] = None
+
+
+class Traffic:
+    def __init__(self, client: httpx.AsyncClient, clock: FirstTokenClock, answers: list[dict]):
+        self.client = client
+        self.clock = clock
+        self.answers = answers
+        self._image_hash: Optional[str] = None
+
+    def _answer(self, n: int, offset: int = 0) -> dict:
+        return self.answers[(n + offset) % len(self.answers)]
+
+    def _query(self, n: int, **fields) -> dict:
+        answer = self._answer(n)
+        return {
+            "text": self._answer(n, 1)["text"], # Another answer's prose stands in for the selection
+            "prompt": f"{answer['prompt']} [req {n}]",
+            "llmProvider": "replay",
+            "responseTone": answer["tone"],
+            **fields,
+        }
+
+    async def _post(self, path: str, payload: dict) -> dict:
+        response = await self.client.post(path, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    async def _audio(self, method: str, path: str, started: float, **kwargs) -> float:
+        """Reads an audio response to the end; returns when its first sample arrived."""
+        first_audio, received = None, 0
+        async with self.client.stream(method, path, **kwargs) as response:
+            response.raise_for_status()
+            async for data in response.aiter_bytes():
+                received += len(data)
+                if first_audio is None and received > WAV_HEADER_BYTES:
+                    first_audio = time.perf_counter() - started
+        return first_audio if first_audio is not None else time.perf_counter() - started
+
+    def _ttft(self, n: int, started: float) -> Optional[float]:
+        at = self.clock.first_token.pop(n, None)
+        return at - started if at is not None else None
+
+    async def screenshot_hash(self) -> str:
+        """One screenshot for every follow-up session (uploaded once, like the extension does)."""
+        if self._image_hash is None:
+            rng = random.Random(0)
+            image = Image.new("RGB", (1280, 800), "white")
+            for _ in range(400):
+                x, y = rng.randrange(1240), rng.randrange(790)
+                image.paste((rng.randrange(256), 40, 90), (x, y, x + rng.randrange(8, 40), y + 10))
+            data = io.BytesIO()
+            image.save(data, "PNG")
+            response = await self.client.post("/api/images", files=[("files", ("page.png", data.getvalue(), "image/png"))])
+            response.raise_for_status()
+            self._image_hash = response.json()["images"][0]["hash"]
+        return self._image_hash
+
+    async def generate(self, n: int) -> Sample:
+        """Text-only answer."""
+        started = time.perf_counter()
+        await self._post("/api/generate", self._query(n))
+        return Sample("generate", time.perf_counter() - started, ttft=self._ttft(n, started))
+
+    async def stream(self, n: int) -> Sample:
+        """Answer, then its audio as a progressive WAV (what the extension plays)."""
+        started = time.perf_counter()
+        data = await self._post("/api/generate", self._query(n, shouldAudio=True, stream=True))
+        ttft = self._ttft(n, started)
+        ttfa = await self._audio("GET", data["audioUrl"], started)
+        return Sample("stream", time.perf_counter() - started, ttft=ttft, ttfa=ttfa)
+
+    async def tts(self, n: int) -> Sample:
+        """Read-aloud of a selection (unique text, so nothing comes from the audio store)."""
+        started = time.perf_counter()
+        text = f"{self._answer(n)['text']} That was take {n}."
+        ttfa = await self._audio("POST", "/api/tts", started, json={"text": text, "stream": True})
+        return Sample("tts", time.perf_counter() - started, ttfa=ttfa)
+
+    async def followup(self, n: int) -> Sample:
+        """A question about a screenshot, then a follow-up naming only the session (the timed turn)."""
+        session = f"load-{n}"
+        first = self._query(n, sessionId=session, history=[], imageHashes=[await self.screenshot_hash()])
+        first["prompt"] = first["prompt"].replace(f"[req {n}]", "")
+        await self._post("/api/generate", first)
+        started = time.perf_counter()
+        await self._post("/api/generate", {
+            "text": "", "prompt": f"Can you give me an example? [req {n}]", "sessionId": session, "llmProvider": "replay"
+        })
+        return Sample("followup", time.perf_counter() - started, ttft=self._ttft(n, started))
+
+    async def restore(self, n: int) -> Sample:
+        """A follow-up that re-sends its history (the server lost the session, e.g. restarted)."""
+        history = []
+        for offset in range(3):
+            answer = self._answer(n, offset + 2)
+            history += [{"role": "user", "content": answer["prompt"]}, {"role": "assistant", "content": answer["text"]}]
+        started = time.perf_counter()
+        await self._post("/api/generate", self._query(n, sessionId=f"restore-{n}", history=history))
+        return Sample("restore", time.perf_counter() - started, ttft=self._ttft(n, started))
+
+    async def run(self, scenario: str, n: int) -> Sample:
+        started = time.perf_counter()
+        try:
+            return await getattr(self, scenario)(n)
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            self.clock.first_token.pop(n, None)
+            return Sample(scenario, time.perf_counter() - started, error=f"{type(e).__name__}: {e}"[:200])
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    """"generate=3,stream=3,tts=2" -> weights by scenario."""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name!r} (expected one of {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def schedule(mix: dict[str, float], count: int, seed: int) -> list[str]:
+    """The scenario of each request, drawn by weight (the same sequence for the same seed)."""
+    rng = random.Random(seed)
+    names = list(mix)
+    return rng.choices(names, weights=[mix[name] for name in names], k=count)
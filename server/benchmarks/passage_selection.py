@@ -0,0 +1,124 @@
+# server/benchmarks/passage_selection.py
+
+"""
+Prompt size and time-to-first-token with and without passage selection.
+
+Builds long "articles" from the recorded answers (each answer a section under
+its prompt as heading, the set repeated to the requested size), then asks each
+prompt against them. Compares the selected text with the whole selection and
+with the whole selection truncated to the prompt budget (what the handler
+falls back to without selection), reporting tokens, recall (the share of the
+asked-about answer's sentences that reach the prompt) and TTFT from a linear
+prefill model. Pass --live to time real first tokens from a provider instead.
+
+    cd server && python -m benchmarks.passage_selection --copies 2 4 8
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import passages
+from prompt_budget import MAX_PROMPT_TOKENS, estimate_tokens, truncate_to_tokens
+from text_chunker import split_sentences
+
+DATA_FILE = Path(__file__).parent / "data" / "recorded_answers.json"
+
+# Room left for the selection once instructions and question are in (see LLMHandler)
+TEXT_BUDGET = MAX_PROMPT_TOKENS - 500
+
+
+def build_document(answers: list[dict], copies: int) -> str:
+    sections = []
+    for copy in range(copies):
+        for answer in answers:
+            sections.append(f"## {answer['prompt']} (part {copy + 1})\n\n{answer['text']}")
+    return "\n\n".join(sections)
+
+
+def recall(answer: str, context: str) -> float:
+    sentences = split_sentences(answer)
+    return sum(s in context for s in sentences) / max(1, len(sentences))
+
+
+def model_ttft(base: float, per_token: float):
+    return lambda provider, context, prompt: base + per_token * estimate_tokens(context + prompt, provider)
+
+
+def live_ttft():
+    from llm_handler import LLMHandler
+    llm = LLMHandler()
+
+    def ttft(provider: str, context: str, prompt: str) -> float:
+        # Selection already happened here; keep the handler from redoing it
+        passages.PASSAGE_SELECTION = False
+        start = time.perf_counter()
+        for _ in llm.generate_answer_stream(context, prompt, provider=provider):
+            break
+        return time.perf_counter() - start
+    return ttft
+
+
+def run(copies_list: list[int], answers: list[dict], provider: str, ttft) -> dict:
+    report = {}
+    for copies in copies_list:
+        document = build_document(answers, copies)
+        totals = {name: [0.0, 0.0, 0.0] for name in ("full", "truncated", "selected")}
+        for answer in answers:
+            prompt = answer["prompt"]
+            contexts = {
+                "full": document,
+                "truncated": truncate_to_tokens(document, TEXT_BUDGET, provider),
+                "selected": passages.select_passages(document, prompt, passages.PASSAGE_BUDGET_TOKENS, provider),
+            }
+            for name, context in contexts.items():
+                totals[name][0] += estimate_tokens(context, provider)
+                totals[name][1] += recall(answer["text"], context)
+                totals[name][2] += ttft(provider, context, prompt)
+        n = len(answers)
+        report[copies] = {
+            "document_tokens": estimate_tokens(document, provider),
+            **{
+                name: {
+                    "mean_tokens": round(t[0] / n),
+                    "mean_recall": round(t[1] / n, 3),
+                    "mean_ttft_s": round(t[2] / n, 3),
+                }
+                for name, t in totals.items()
+            },
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, nargs="+", default=[2, 4, 8], help="Times the answer set is repeated")
+    parser.add_argument("--provider", default="gemini")
+    parser.add_argument("--base", type=float, default=0.4, help="TTFT with an empty prompt (s)")
+    parser.add_argument("--per-token", type=float, default=0.0002, help="Prefill time per input token (s)")
+    parser.add_argument("--live", action="store_true", help="Time real first tokens (needs the provider's API key)")
+    parser.add_argument("--json", action="store_true", help="Print the raw report as JSON")
+    args = parser.parse_args()
+
+    answers = json.loads(DATA_FILE.read_text(encoding="utf-8"))["answers"]
+    ttft = live_ttft() if args.live else model_ttft(args.base, args.per_token)
+    report = run(args.copies, answers, args.provider, ttft)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{len(answers)} questions per document, budget {passages.PASSAGE_BUDGET_TOKENS} tokens, "
+          f"{'live ' + args.provider if args.live else f'model: {args.base}s + {args.per_token}s/token'}")
+    print(f"{'doc tokens':>10} | {'context':<9} | {'tokens':>6} | {'recall':>6} | {'ttft':>7}")
+    for copies, rows in report.items():
+        for name in ("full", "truncated", "selected"):
+            row = rows[name]
+            print(f"{rows['document_tokens']:>10} | {name:<9} | {row['mean_tokens']:>6} | {row['mean_recall']:>6.2f} | {row['mean_ttft_s']:>6.2f}s")
+        full, selected = rows["full"]["mean_ttft_s"], rows["selected"]["mean_ttft_s"]
+        print(f"{'':>10}   ttft change vs full: {100 * (selected - full) / full:+.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# server/benchmarks/two_stage.py
+
+"""
+Time to first audio with and without the two-stage opener.
+
+Runs LLMHandler against stub providers: a slow "strong" one (configurable
+time-to-first-token, then the recorded answer at a fixed rate) and a fast one
+that restates the question. First audio is when the first TTS chunk is
+ready (the WebSocket session's take_sentences rule: the session is the
+only caller with two-stage answers, the job endpoints voice whole answers)
+plus that chunk's synthesis time (the linear model from chunker_makespan). Latencies are
+compressed by --speed while running and reported unscaled.
+
+    cd server && python -m benchmarks.two_stage --strong-ttft 0.8 1.5 3
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from text_chunker import take_sentences
+
+DATA_FILE = Path(__file__).parent / "data" / "recorded_answers.json"
+FIRST_CHUNK_CHARS = 60 # TTS_FIRST_CHUNK_CHARS
+
+
+class StubProvider:
+    def __init__(self, ttft: float, chars_per_second: float, reply, fast: bool, speed: float):
+        self.ttft = ttft
+        self.chars_per_second = chars_per_second
+        self.reply = reply # prompt -> text
+        self.fast = fast
+        self.vision = True
+        self.speed = speed
+
+    def generate_stream(self, prompt, images, api_key, tone, history=None, custom_persona=None, max_tokens=None):
+        time.sleep(self.ttft / self.speed)
+        for word in self.reply(prompt).split(" "):
+            time.sleep(len(word) / self.chars_per_second / self.speed)
+            yield word + " "
+
+
+def first_audio(stream, overhead: float, per_char: float, speed: float) -> float:
+    started = time.perf_counter()
+    pending = ""
+    for chunk in stream:
+        pending += chunk
+        ready, _ = take_sentences(pending, FIRST_CHUNK_CHARS)
+        if ready:
+            return (time.perf_counter() - started) * speed + overhead + per_char * len(ready)
+    return (time.perf_counter() - started) * speed + overhead + per_char * len(pending)
+
+
+def run(strong_ttfts: list[float], answers: list[dict], args) -> dict:
+    from llm_handler import LLMHandler
+    report = {}
+    for strong_ttft in strong_ttfts:
+        totals = {"single": 0.0, "two_stage": 0.0}
+        for answer in answers:
+            handler = LLMHandler()
+            handler.providers = {
+                "openai": StubProvider(strong_ttft, args.strong_cps, lambda _: answer["text"], False, args.speed),
+                "groq": StubProvider(args.fast_ttft, args.fast_cps,
+                                     lambda _: f"So you want to know: {answer['prompt'].rstrip('?.')}.", True, args.speed),
+            }
+            for mode in totals:
+                stream = handler.generate_answer_stream(
+                    "", answer["prompt"], provider="openai", api_keys={"openai": "stub", "groq": "stub"},
+                    two_stage=mode == "two_stage"
+                )
+                totals[mode] += first_audio(stream, args.overhead, args.per_char, args.speed)
+                stream.close()
+        n = len(answers)
+        report[strong_ttft] = {mode: round(total / n, 3) for mode, total in totals.items()}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--strong-ttft", type=float, nargs="+", default=[0.8, 1.5, 3.0], help="Strong model TTFT (s)")
+    parser.add_argument("--fast-ttft", type=float, default=0.25, help="Fast model TTFT (s)")
+    parser.add_argument("--strong-cps", type=float, default=300, help="Strong model output (chars/s)")
+    parser.add_argument("--fast-cps", type=float, default=1200, help="Fast model output (chars/s)")
+    parser.add_argument("--overhead", type=float, default=0.35, help="Per-call TTS overhead (s)")
+    parser.add_argument("--per-char", type=float, default=0.012, help="Synthesis time per character (s)")
+    parser.add_argument("--speed", type=float, default=4, help="Run this many times faster than real time")
+    parser.add_argument("--json", action="store_true", help="Print the raw report as JSON")
+    args = parser.parse_args()
+
+    answers = json.loads(DATA_FILE.read_text(encoding="utf-8"))["answers"]
+    report = run(args.strong_ttft, answers, args)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{len(answers)} recorded answers, fast model TTFT {args.fast_ttft}s, TTS {args.overhead}s + {args.per_char}s/char")
+    print(f"{'strong ttft':>11} | {'single':>7} | {'two-stage':>9} | change")
+    for strong_ttft, row in report.items():
+        change = 100 * (row["two_stage"] - row["single"]) / row["single"]
+        print(f"{strong_ttft:>10.2f}s | {row['single']:>6.2f}s | {row['two_stage']:>8.2f}s | {change:+.1f}%")
+
+
+if __name__ == "__main__":
+    main()
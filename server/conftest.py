@@ -0,0 +1,85 @@
+# server/conftest.py
+import threading
+import time
+
+import numpy as np
+import pytest
+
+
+class StubTTS:
+    """Duck-types TTSHandler: a short silence per call, after delay seconds; records what it was asked."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.is_available = True
+        self.sample_rate = 24000
+        self.model_version = "stub"
+        self.voice_cache = {"alba": None}
+        self.calls: list[str] = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def generate_speech(self, text: str, voice: str = "alba", use_cuda: bool = False) -> np.ndarray:
+        with self._lock:
+            self.calls.append(text)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(self.delay)
+            return np.zeros(len(text) * 10, dtype=np.float32)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+class StubLLM:
+    """Duck-types LLMHandler: streams chunks with a pause before each; a chunk that is an exception is raised."""
+
+    def __init__(self, chunks=("Osmosis is water crossing a membrane. ", "It evens out concentrations."), pause: float = 0.0):
+        self.chunks = chunks
+        self.pause = pause
+        self.calls: list[dict] = []
+
+    def generate_answer_stream(self, **request):
+        self.calls.append(request)
+        for chunk in self.chunks:
+            time.sleep(self.pause)
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """
+    The app module with a stub LLM and TTS, and every store, bank and cache
+    pointed at tmp_path (the lifespan is not run, so nothing touches server/audio).
+    """
+    pytest.importorskip("torch")
+    import app
+    from answer_cache import AnswerCache
+    from audio_pipeline import ChunkCache
+    from audio_store import AudioStore
+    from jobs import JobStore
+    from phrase_bank import CUES, OPENERS, PhraseBank
+    from sessions import SessionStore
+    from tts_scheduler import TTSPriorityGate
+
+    monkeypatch.setattr(app, "AUDIO_DIR", tmp_path)
+    monkeypatch.setattr(app, "audio_store", AudioStore(tmp_path / "store"))
+    monkeypatch.setattr(app, "opener_bank", PhraseBank(tmp_path / "openers", OPENERS))
+    monkeypatch.setattr(app, "cue_bank", PhraseBank(tmp_path / "cues", CUES))
+    monkeypatch.setattr(app, "session_store", SessionStore(ttl=3600, max_bytes=1 << 20))
+    monkeypatch.setattr(app, "job_store", JobStore(ttl=1800))
+    monkeypatch.setattr(app, "answer_cache", AnswerCache())
+    monkeypatch.setattr(app, "chunk_cache", ChunkCache(0))
+    # Background work must not wait for an idle CPU on a busy test host
+    monkeypatch.setattr(app, "tts_gate", TTSPriorityGate(idle_cpu_percent=101, poll_interval=0.01))
+    for name in ("_speculative_tasks", "_speculative_audio", "_batch_tasks", "_live_renders"):
+        monkeypatch.setattr(app, name, {})
+    for name in ("_phrase_render_tasks", "_phrase_render_pending"):
+        monkeypatch.setattr(app, name, set())
+    monkeypatch.setitem(app._handlers, "tts", StubTTS())
+    monkeypatch.setitem(app._handlers, "llm", StubLLM())
+    return app
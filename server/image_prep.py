@@ -0,0 +1,160 @@
+# server/image_prep.py
+
+"""
+Screenshot preprocessing before vision calls.
+Captured tabs are full-resolution PNGs, far more pixels than any provider
+uses: each one downsamples (or tiles and bills) the image server-side. This
+stage crops uniform margins, downscales to the provider's useful resolution,
+re-encodes as JPEG/WebP, and drops near-identical duplicates by perceptual
+hash, so uploads and vision-token bills shrink before the request is sent.
+Runs inside generate_answer_stream, which callers run on the executor.
+"""
+
+import io
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from image_store import ImageData
+
+# Optional: without Pillow images pass through unchanged
+try:
+    from PIL import Image, ImageChops
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+
+class ImageProfile(NamedTuple):
+    max_edge: int # Longest side in pixels
+    format: str # "JPEG" or "WEBP"
+    quality: int
+
+
+# Longest edge each provider actually looks at (beyond it they downscale or bill more tiles):
+# Claude resizes past ~1568px, GPT-4o high detail works on a 768px short side,
+# Gemini tiles into 768px squares. Groq's model is text-only and ignores them.
+_PROVIDER_MAX_EDGE = {"gemini": 1536, "openai": 1536, "claude": 1568}
+
+IMAGE_PREP = os.getenv("LUMINA_IMAGE_PREP", "1").lower() in ("1", "true", "yes")
+IMAGE_FORMAT = os.getenv("LUMINA_IMAGE_FORMAT", "jpeg").upper()
+IMAGE_QUALITY = int(os.getenv("LUMINA_IMAGE_QUALITY", "80"))
+IMAGE_MAX_EDGE = int(os.getenv("LUMINA_IMAGE_MAX_EDGE", "0")) # 0 = per-provider default
+
+# Perceptual hashes this close (of 64 bits) are the same screen
+DUPLICATE_DISTANCE = 4
+
+_MEDIA_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+
+def provider_profile(provider: str) -> Optional[ImageProfile]:
+    """Preprocessing settings for a provider; None to send images untouched."""
+    if not IMAGE_PREP or Image is None or provider not in _PROVIDER_MAX_EDGE:
+        return None
+    image_format = IMAGE_FORMAT if IMAGE_FORMAT in _MEDIA_TYPES else "JPEG"
+    return ImageProfile(IMAGE_MAX_EDGE or _PROVIDER_MAX_EDGE[provider], image_format, IMAGE_QUALITY)
+
+
+def dhash(image: "Image.Image", size: int = 8) -> int:
+    """Difference hash: brightness gradients of a tiny grayscale thumbnail, as 64 bits."""
+    small = image.convert("L").resize((size + 1, size), Image.BILINEAR)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            bits = (bits << 1) | (left > pixels[row * (size + 1) + col + 1])
+    return bits
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def crop_uniform_border(image: "Image.Image", tolerance: int = 8) -> "Image.Image":
+    """Trims margins that are the same colour as the top-left corner (blank page gutters)."""
+    background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+    diff = ImageChops.difference(image, background).convert("L").point(lambda v: 255 if v > tolerance else 0)
+    box = diff.getbbox()
+    if box is None or box == (0, 0) + image.size:
+        return image
+    # Keep a small margin so edge text isn't clipped
+    pad = 8
+    left, top, right, bottom = box
+    return image.crop((max(0, left - pad), max(0, top - pad), min(image.width, right + pad), min(image.height, bottom + pad)))
+
+
+class PrepReport(NamedTuple):
+    images_in: int
+    images_out: int
+    duplicates: int
+    bytes_in: int
+    bytes_out: int
+    seconds: float
+
+
+class ImagePreprocessor:
+    """Prepares a turn's images for one provider; results are memoized per image and profile."""
+
+    def __init__(self, cache_entries: int = 64):
+        self.cache_entries = cache_entries
+        self._cache: "OrderedDict[tuple, tuple[ImageData, int]]" = OrderedDict()
+        self._lock = threading.Lock() # Turns run on several executor threads
+
+    def _prepare_one(self, image: ImageData, profile: ImageProfile) -> tuple[ImageData, int]:
+        key = (image.digest, profile)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        with Image.open(io.BytesIO(image.data)) as opened:
+            picture = opened.convert("RGB")
+        fingerprint = dhash(picture)
+        picture = crop_uniform_border(picture)
+        if max(picture.size) > profile.max_edge:
+            picture.thumbnail((profile.max_edge, profile.max_edge), Image.LANCZOS)
+        out = io.BytesIO()
+        picture.save(out, profile.format, quality=profile.quality, optimize=True)
+        prepared = ImageData(out.getvalue(), _MEDIA_TYPES[profile.format])
+        if len(prepared.data) >= len(image.data):
+            prepared = image # Already small (e.g. a tiny JPEG): re-encoding only loses quality
+
+        with self._lock:
+            self._cache[key] = (prepared, fingerprint)
+            if len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return prepared, fingerprint
+
+    def prepare(self, images: list[ImageData], profile: Optional[ImageProfile]) -> tuple[list[ImageData], PrepReport]:
+        started = time.perf_counter()
+        bytes_in = sum(len(image.data) for image in images)
+        if profile is None:
+            return images, PrepReport(len(images), len(images), 0, bytes_in, bytes_in, 0.0)
+
+        prepared: list[ImageData] = []
+        fingerprints: list[int] = []
+        duplicates = 0
+        for image in images:
+            try:
+                result, fingerprint = self._prepare_one(image, profile)
+            except Exception as e:
+                # Undecodable or exotic format: send it as it came
+                logger.warning(f"Image preprocessing skipped: {e}")
+                prepared.append(image)
+                continue
+            if any(hamming(fingerprint, seen) <= DUPLICATE_DISTANCE for seen in fingerprints):
+                duplicates += 1
+                continue
+            fingerprints.append(fingerprint)
+            prepared.append(result)
+
+        bytes_out = sum(len(image.data) for image in prepared)
+        return prepared, PrepReport(
+            len(images), len(prepared), duplicates, bytes_in, bytes_out, time.perf_counter() - started
+        )
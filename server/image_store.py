@@ -0,0 +1,122 @@
+# server/image_store.py
+
+"""
+Content-addressed screenshots.
+Clients upload an image once (binary, not base64 in JSON) and refer to it by
+hash in later turns. Images are decoded once and kept in a bounded LRU, so
+follow-ups neither re-send megabytes nor re-decode them per provider call.
+"""
+
+import base64
+import binascii
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+
+# Magic numbers of the formats vision providers accept
+_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def sniff_media_type(data: bytes) -> Optional[str]:
+    """Image media type from the file's leading bytes; None if it isn't a supported image."""
+    for signature, media_type in _SIGNATURES:
+        if data.startswith(signature):
+            return media_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def image_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ImageData:
+    """A decoded image; the base64 form some provider APIs want is computed once, on demand."""
+
+    __slots__ = ("data", "media_type", "digest", "_b64")
+
+    def __init__(self, data: bytes, media_type: str, digest: Optional[str] = None):
+        self.data = data
+        self.media_type = media_type
+        self.digest = digest or image_hash(data)
+        self._b64: Optional[str] = None
+
+    @property
+    def b64(self) -> str:
+        if self._b64 is None:
+            self._b64 = base64.b64encode(self.data).decode("ascii")
+        return self._b64
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.media_type};base64,{self.b64}"
+
+
+def decode_image(b64_str: str) -> Optional[ImageData]:
+    """
+    Legacy base64 screenshot (bare or a data: URL) -> ImageData.
+    Returns None for empty or undecodable input.
+    """
+    if not b64_str:
+        return None
+    media_type = None
+    if "," in b64_str:
+        prefix, b64_str = b64_str.split(",", 1)
+        if prefix.startswith("data:"):
+            media_type = prefix[len("data:"):].split(";", 1)[0] or None
+    padding = len(b64_str) % 4
+    if padding:
+        b64_str += "=" * (4 - padding)
+    try:
+        data = base64.b64decode(b64_str)
+    except (binascii.Error, ValueError):
+        return None
+    if not data:
+        return None
+    image = ImageData(data, sniff_media_type(data) or media_type or "image/png")
+    # The client already sent the base64: keep it rather than re-encoding
+    image._b64 = b64_str
+    return image
+
+
+class ImageCache:
+    """LRU of decoded images keyed by content hash, bounded by total bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._images: "OrderedDict[str, ImageData]" = OrderedDict()
+        self._bytes = 0
+
+    def put(self, image: ImageData) -> str:
+        if image.digest in self._images:
+            self._images.move_to_end(image.digest)
+            return image.digest
+        self._images[image.digest] = image
+        self._bytes += len(image.data)
+        # Never evict the image just added, even if it alone exceeds the budget
+        while self._bytes > self.max_bytes and len(self._images) > 1:
+            _, evicted = self._images.popitem(last=False)
+            self._bytes -= len(evicted.data)
+        return image.digest
+
+    def get(self, digest: str) -> Optional[ImageData]:
+        image = self._images.get(digest)
+        if image is not None:
+            self._images.move_to_end(digest)
+        return image
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._images
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    @property
+    def size(self) -> int:
+        return self._bytes
@@ -0,0 +1,122 @@
+# server/jobs.py
+
+"""
+Stream job tracking: state, synthesis progress and a change notification for
+long-polling, so clients ask "how far along is it?" once instead of probing
+the audio URLs repeatedly.
+"""
+
+import asyncio
+import time
+from typing import Any, Optional
+
+QUEUED = "queued" # Created; audio not started (nobody has opened the stream yet)
+LLM = "llm" # Generating the answer text
+TTS = "tts" # Synthesizing: chunks_done of chunks_total
+DONE = "done"
+FAILED = "failed"
+
+TERMINAL_STATES = (DONE, FAILED)
+
+
+class Job:
+    """One /api/generate answer and the progress of its audio."""
+
+    def __init__(self, job_id: str, request: Any = None, state: str = QUEUED):
+        self.id = job_id
+        self.request = request
+        self.state = state
+        self.created = self.updated = time.time()
+        self.chunks_done = 0
+        self.chunks_total = 0
+        self.tts_started: Optional[float] = None
+        self.error: Optional[str] = None
+        self.answer: Optional[dict] = None # Answer budget outcome: tokens, truncated ("tokens"/"time"), first token time
+        self.version = 0
+        self._changed = asyncio.Event()
+
+    @property
+    def terminal(self) -> bool:
+        return self.state in TERMINAL_STATES
+
+    def eta(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds of synthesis left, extrapolated from the chunks finished so far."""
+        if self.state == DONE:
+            return 0.0
+        if self.state != TTS or not self.chunks_done or self.tts_started is None:
+            return None
+        elapsed = (now or time.time()) - self.tts_started
+        return round(elapsed / self.chunks_done * (self.chunks_total - self.chunks_done), 2)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "state": self.state,
+            "chunksDone": self.chunks_done,
+            "chunksTotal": self.chunks_total,
+            "etaSeconds": self.eta(),
+            "error": self.error,
+            "answer": self.answer,
+            "version": self.version,
+            "updated": self.updated,
+        }
+
+
+class JobStore:
+    """In-memory jobs with a TTL (jobs are not meant to outlive the session)."""
+
+    def __init__(self, ttl: float = 1800):
+        self.ttl = ttl
+        self._jobs: dict[str, Job] = {}
+
+    def create(self, job_id: str, request: Any = None, state: str = QUEUED) -> Job:
+        job = Job(job_id, request, state)
+        self._jobs[job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self._jobs
+
+    def update(self, job_id: Optional[str], **changes):
+        """Applies field changes and wakes long-pollers. Unknown ids are ignored."""
+        job = self._jobs.get(job_id) if job_id else None
+        if job is None:
+            return
+        if changes.get("state") == TTS and job.state != TTS:
+            job.tts_started = time.time()
+            job.chunks_done = 0
+        for name, value in changes.items():
+            setattr(job, name, value)
+        job.updated = time.time()
+        job.version += 1
+        changed, job._changed = job._changed, asyncio.Event()
+        changed.set()
+
+    def progress(self, job_id: Optional[str], done: int, total: int):
+        self.update(job_id, chunks_done=done, chunks_total=total)
+
+    async def wait(self, job: Job, version: Optional[int], timeout: float) -> Job:
+        """
+        Long-poll: returns once the job differs from `version` (its current
+        version if None), reaches a terminal state, or timeout passes.
+        """
+        target = job.version if version is None else version
+        deadline = time.monotonic() + timeout
+        while job.version == target and not job.terminal:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(job._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        return job
+
+    def expire(self, now: float) -> int:
+        expired = [job_id for job_id, job in self._jobs.items() if now - job.created > self.ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+        return len(expired)
@@ -1,9 +1,19 @@
 import os
 import logging
-import base64
-from typing import Optional, List, Dict, Any, Generator, Iterator
+import time
+from typing import Optional, List, Dict, Any, Callable, Generator, Iterator
 from abc import ABC, abstractmethod
 
+from image_prep import ImagePreprocessor, provider_profile
+from image_store import ImageData, decode_image
+from metrics import metrics
+from answer_budget import AnswerBudget, bounded_stream, max_answer_tokens
+from llm_replay import LLM_RECORD_FILE, LLM_REPLAY_FILE, LLM_REPLAY_STRICT, Recordings, record, replay, request_key
+from llm_router import ProviderRouter
+from passages import relevant_text
+from two_stage import BODY_CONTINUATION, OPENER_MAX_TOKENS, TWO_STAGE, opener_prompt, splice_opener
+from prompt_budget import MAX_PROMPT_TOKENS, budget_history, estimate_tokens, history_bucket, truncate_to_tokens
+
 # Third-party SDKs
 import google.generativeai as genai
 # Pre-load optional SDKs to avoid runtime import lag
@@ -24,9 +34,13 @@ logger = logging.getLogger(__name__)
 
 # --- Provider Interface ---
 class LLMProvider(ABC):
+    model: str = ""
+    vision: bool = True # Can use screenshots (routing skips text-only models when there are some)
+    fast: bool = False # Low time-to-first-token: can speak a two-stage opener
+
     @abstractmethod
-    def generate_stream(self, prompt: str, images: List[str], api_key: str, tone: str, history: List[Dict[str, str]] = None, custom_persona: str = None) -> Iterator[str]:
-        """Yield content chunks from text prompt and list of base64 images"""
+    def generate_stream(self, prompt: str, images: List[ImageData], api_key: str, tone: str, history: List[Dict[str, str]] = None, custom_persona: str = None, max_tokens: Optional[int] = None) -> Iterator[str]:
+        """Yield content chunks from text prompt and list of decoded images (max_tokens: None = provider default)"""
         pass
 
 # --- PROMPT MANAGEMENT ---
@@ -40,6 +54,8 @@ def get_system_instructions(tone: str, custom_persona: str = None) -> str:
         "- Do not use symbols like %, write 'percent'.\n"
         "- Use ellipses (...) for natural pauses instead of commas.\n"
         "- DO NOT use markdown lists or headers... speak in full sentences.\n"
+        "- Avoid short, choppy sentences... connect thoughts with 'and' or 'so' to keep the flow going.\n"
+        "- Start the answer with a natural filler if appropriate (e.g., 'Oh...', 'Well...', 'You know...') to sound conversational.\n"
     )
 
     if custom_persona and custom_persona.strip():
@@ -75,45 +91,85 @@ def get_system_instructions(tone: str, custom_persona: str = None) -> str:
         f"{base_tts_rules}"
     )
 
+# Prompts are assembled most-stable first (system instructions, history, selected text,
+# question, screenshots) so consecutive requests share a byte-identical prefix that the
+# providers' prompt caches can serve
+
+def history_transcript(history: List[Dict[str, str]]) -> str:
+    return "".join(f"{'User' if m['role'] == 'user' else 'Lumina'}: {m['content']}\n" for m in history)
+
+def record_prompt_cache(provider: str, read_usage: Callable[[], tuple[Optional[int], Optional[int]]]):
+    """
+    Prompt tokens the provider reports it served from its prefix cache.
+    read_usage returns (prompt_tokens, cached_tokens). It runs after the answer
+    has streamed, so a usage shape the SDK doesn't have is logged, never
+    reported as a provider error.
+    """
+    try:
+        prompt_tokens, cached_tokens = read_usage()
+        if not prompt_tokens:
+            return
+        cached = cached_tokens or 0
+        metrics.increment(f"prompt.{provider}.input_tokens", prompt_tokens)
+        metrics.increment(f"prompt.{provider}.cached_tokens", cached)
+        metrics.observe(f"prompt.{provider}.cached_ratio", cached / prompt_tokens)
+    except Exception as e:
+        logger.warning(f"{provider}: could not read prompt usage ({e})")
+
+def chat_completion_text(stream, provider: str) -> Iterator[str]:
+    """Text deltas of an OpenAI-style stream; the usage (with cached tokens) comes in a final chunk without choices."""
+    for chunk in stream:
+        usage = getattr(chunk, "usage", None)
+        if usage:
+            record_prompt_cache(provider, lambda: (
+                usage.prompt_tokens, getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+            ))
+        if chunk.choices and chunk.choices[0].delta.content is not None:
+            yield chunk.choices[0].delta.content
+
+def claude_prompt_usage(usage) -> tuple[int, int]:
+    """Anthropic counts cache reads and writes apart from the other input tokens."""
+    cached = usage.cache_read_input_tokens or 0
+    return usage.input_tokens + cached + (usage.cache_creation_input_tokens or 0), cached
+
 # --- Gemini Provider ---
 class GeminiProvider(LLMProvider):
-    def generate_stream(self, prompt: str, images: List[str], api_key: str, tone: str, history: List[Dict[str, str]] = None, custom_persona: str = None) -> Iterator[str]:
+    model = "gemini-2.5-flash-lite"
+    fast = True
+
+    def generate_stream(self, prompt: str, images: List[ImageData], api_key: str, tone: str, history: List[Dict[str, str]] = None, custom_persona: str = None, max_tokens: Optional[int] = None) -> Iterator[str]:
         if not api_key:
             yield "Error: No Gemini API Key provided."
             return
         
         try:
             genai.configure(api_key=api_key)
-            # Switch to faster Lite model
-            model = genai.GenerativeModel('gemini-2.5-flash-lite')
-            
+            # The system instruction leads the request, where Gemini's implicit cache can reuse it
             system_instruction = get_system_instructions(tone, custom_persona)
+            model = genai.GenerativeModel(self.model, system_instruction=system_instruction)
             
             # Format history for Gemini
             history_text = ""
             if history:
-                 for msg in history:
-                     role = "User" if msg['role'] == 'user' else "Lumina"
-                     history_text += f"{role}: {msg['content']}\n"
-                 history_text += "\nNow answer the following new question:\n"
+                 history_text = history_transcript(history) + "\nNow answer the following new question:\n"
 
-            content_parts = [system_instruction + "\n\n" + history_text + prompt + f"\n\nTone: {tone}"]
+            content_parts = [history_text + prompt + f"\n\nTone: {tone}"]
             
-            for b64_str in images:
-                if not b64_str: continue
-                if "," in b64_str: b64_str = b64_str.split(",", 1)[1]
-                padding = len(b64_str) % 4
-                if padding > 0: b64_str += '=' * (4 - padding)
-                
+            for image in images:
                 content_parts.append({
-                    "mime_type": "image/png",
-                    "data": base64.b64decode(b64_str)
+                    "mime_type": image.media_type,
+                    "data": image.data
                 })
                 
-            response = model.generate_content(content_parts, stream=True)
+            generation_config = {"max_output_tokens": max_tokens} if max_tokens else None
+            response = model.generate_content(content_parts, stream=True, generation_config=generation_config)
+            usage = None
             for chunk in response:
+                usage = getattr(chunk, "usage_metadata", None) or usage
                 if chunk.text:
                     yield chunk.text
+            if usage:
+                record_prompt_cache("gemini", lambda: (usage.prompt_token_count, usage.cached_content_token_count))
             
         except Exception as e:
             logger.error(f"Gemini Error: {e}")
@@ -121,7 +177,9 @@ class GeminiProvider(LLMProvider):
 
 # --- OpenAI Provider ---
 class OpenAIProvider(LLMProvider):
-    def generate_stream(self, prompt: str, images: List[str], api_key: str, tone: str, history: List[Dict[str, str]] = None, custom_persona: str = None) -> Iterator[str]:
+    model = "gpt-4o"
+
+    def generate_stream(self, prompt: str, images: List[ImageData], api_key: str, tone: str, history: List[Dict[str, str]] = None, custom_persona: str = None, max_tokens: Optional[int] = None) -> Iterator[str]:
         if not api_key:
             yield "Error: No OpenAI API Key provided."
             return
@@ -141,25 +199,22 @@ class OpenAIProvider(LLMProvider):
                 
             user_content = [{"type": "text", "text": prompt + f"\n\nTone: {tone}"}]
             
-            for b64_str in images:
-                if "," in b64_str: b64_str = b64_str.split(",", 1)[1]
-                image_url = f"data:image/png;base64,{b64_str}"
+            for image in images:
                 user_content.append({
                     "type": "image_url",
-                    "image_url": {"url": image_url}
+                    "image_url": {"url": image.data_url}
                 })
             
             messages.append({"role": "user", "content": user_content})
             
             stream = client.chat.completions.create(
-                model="gpt-4o",
+                model=self.model,
                 messages=messages,
-                max_tokens=600,
-                stream=True
+                max_tokens=max_tokens or 600,
+                stream=True,
+                stream_options={"include_usage": True}
             )
-            for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
+            yield from chat_completion_text(stream, "openai")
             
         except ImportError:
             yield "Error: OpenAI SDK not installed on server."
@@ -169,7 +224,11 @@ class OpenAIProvider(LLMProvider):
 
 # --- Groq Provider ---
 class GroqProvider(LLMProvider):
-    def generate_stream(self, prompt: str, images: List[str], api_key: str, tone: str, history: List[Dict[str, str]] = None, custom_persona: str = None) -> Iterator[str]:
+    model = "llama-3.1-8b-instant"
+    vision = False
+    fast = True
+
+    def generate_stream(self, prompt: str, images: List[ImageData], api_key: str, tone: str, history: List[Dict[str, str]] = None, custom_persona: str = None, max_tokens: Optional[int] = None) -> Iterator[str]:
         if not api_key:
             yield "Error: No Groq API Key provided."
             return
@@ -193,7 +252,6 @@ class GroqProvider(LLMProvider):
             # Actually, Llama 3.2 11B Vision is available... lets stick to text for speed/stability or user requested 8b-instant.
             # We will ignore images for 8b-instant or append explanation.
             
-            final_text_prompt = prompt + f"\n\nTone: {tone}"
             final_text_prompt = prompt + f"\n\nTone: {tone}"
             
             # Smart Handling for Text-Only Model
@@ -222,14 +280,13 @@ class GroqProvider(LLMProvider):
             
             # API Call (No images in payload)
             stream = client.chat.completions.create(
-                model="llama-3.1-8b-instant",
+                model=self.model,
                 messages=messages,
-                max_tokens=800,
-                stream=True
+                max_tokens=max_tokens or 800,
+                stream=True,
+                stream_options={"include_usage": True}
             )
-            for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
+            yield from chat_completion_text(stream, "groq")
             
         except ImportError:
             yield "Error: OpenAI SDK not installed (required for Groq)."
@@ -239,7 +296,9 @@ class GroqProvider(LLMProvider):
 
 # --- Claude Provider ---
 class ClaudeProvider(LLMProvider):
-    def generate_stream(self, prompt: str, images: List[str], api_key: str, tone: str, history: List[Dict[str, str]] = None, custom_persona: str = None) -> Iterator[str]:
+    model = "claude-3-5-sonnet-20240620"
+
+    def generate_stream(self, prompt: str, images: List[ImageData], api_key: str, tone: str, history: List[Dict[str, str]] = None, custom_persona: str = None, max_tokens: Optional[int] = None) -> Iterator[str]:
         if not api_key:
             yield "Error: No Claude API Key provided."
             return
@@ -248,40 +307,45 @@ class ClaudeProvider(LLMProvider):
             import anthropic
             client = anthropic.Anthropic(api_key=api_key)
             
-            system_instruction = get_system_instructions(tone, custom_persona)
+            # Claude takes the system prompt separately; cache breakpoints after it and after the history
+            system = [{
+                "type": "text",
+                "text": get_system_instructions(tone, custom_persona),
+                "cache_control": {"type": "ephemeral"}
+            }]
             
-            messages = [{"role": "system", "content": system_instruction}]
+            content_list = []
             if history:
                 # Claude expects clean alternating roles. 
-                # Simplification: Append history as text to the first user message for stability
-                history_text = "\n\nConversation History:\n"
-                for msg in history:
-                     role = "User" if msg['role'] == 'user' else "Lumina"
-                     history_text += f"{role}: {msg['content']}\n"
-                content_list = [{"type": "text", "text": history_text + "\n" + prompt + f"\n\nTone: {tone}"}]
-            else:
-                 content_list = [{"type": "text", "text": prompt + f"\n\nTone: {tone}"}]
+                # Simplification: Append history as text to the first user message for stability.
+                # One block per message, so last turn's blocks are an unchanged prefix of this
+                # turn's: the breakpoint on the newest one reads the cache the last turn wrote.
+                content_list.append({"type": "text", "text": "Conversation History:"})
+                content_list.extend({"type": "text", "text": history_transcript([m])} for m in history)
+                content_list[-1]["cache_control"] = {"type": "ephemeral"}
+            content_list.append({"type": "text", "text": prompt + f"\n\nTone: {tone}"})
             
-            for b64_str in images:
-                if "," in b64_str: b64_str = b64_str.split(",", 1)[1]
+            for image in images:
                 content_list.append({
                     "type": "image",
                     "source": {
                         "type": "base64",
-                        "media_type": "image/png",
-                        "data": b64_str
+                        "media_type": image.media_type,
+                        "data": image.b64
                     }
                 })
 
-            messages.append({"role": "user", "content": content_list})
+            messages = [{"role": "user", "content": content_list}]
             
             with client.messages.stream(
-                model="claude-3-5-sonnet-20240620",
-                max_tokens=600,
+                model=self.model,
+                max_tokens=max_tokens or 600,
+                system=system,
                 messages=messages
             ) as stream:
                 for text in stream.text_stream:
                     yield text
+                record_prompt_cache("claude", lambda: claude_prompt_usage(stream.get_final_message().usage))
             
         except ImportError:
             yield "Error: Anthropic SDK not installed on server."
@@ -289,6 +353,31 @@ class ClaudeProvider(LLMProvider):
             logger.error(f"Claude Error: {e}")
             yield f"Claude Error: {str(e)}"
 
+# --- Replay Provider ---
+class ReplayProvider(LLMProvider):
+    """Plays back recorded streams (see llm_replay) instead of calling a model; needs no key."""
+    model = "replay"
+
+    def __init__(self, recordings: Optional[Recordings] = None, strict: bool = LLM_REPLAY_STRICT):
+        self.recordings = recordings or (Recordings(LLM_REPLAY_FILE) if LLM_REPLAY_FILE else None)
+        self.strict = strict
+
+    def generate_stream(self, prompt: str, images: List[ImageData], api_key: str, tone: str, history: List[Dict[str, str]] = None, custom_persona: str = None, max_tokens: Optional[int] = None) -> Iterator[str]:
+        if self.recordings is None:
+            yield "Replay Error: No recordings loaded (set LUMINA_LLM_REPLAY_FILE)."
+            return
+        key = request_key(prompt, tone, history, custom_persona, len(images))
+        recording = self.recordings.get(key, self.strict)
+        if recording is None:
+            metrics.increment("llm.replay.misses")
+            yield f"Replay Error: No recording for request {key}."
+            return
+        metrics.increment("llm.replay.hits")
+        yield from replay(recording)
+
+# Instruction wording around the text, question and history in final_prompt
+PROMPT_TEMPLATE_TOKENS = 150
+
 # --- Main Handler ---
 class LLMHandler:
     def __init__(self):
@@ -296,10 +385,15 @@ class LLMHandler:
             "gemini": GeminiProvider(),
             "openai": OpenAIProvider(),
             "claude": ClaudeProvider(),
-            "groq": GroqProvider()
+            "groq": GroqProvider(),
+            "replay": ReplayProvider()
         }
         # Default fallback
         self.default_key = os.environ.get("GEMINI_API_KEY")
+        self.image_preprocessor = ImagePreprocessor()
+        self.router = ProviderRouter()
+        # Capture real provider streams for the replay provider
+        self.recordings = Recordings(LLM_RECORD_FILE) if LLM_RECORD_FILE else None
 
     def generate_answer_stream(
         self,
@@ -311,15 +405,85 @@ class LLMHandler:
         provider: str = "gemini",
         tone: str = "helpful",
         history: List[Dict[str, str]] = None,
-        custom_persona: str = None
+        custom_persona: str = None,
+        images: Optional[List[ImageData]] = None,
+        api_keys: Optional[Dict[str, str]] = None,
+        budget: Optional[AnswerBudget] = None,
+        two_stage: Optional[bool] = None
     ) -> Iterator[str]:
+        """
+        provider may be "auto" (the fastest healthy provider there is a key for);
+        api_keys are every key the user has, which routing may fall back to.
+        budget bounds the answer's length and time and records whether it was cut.
+        two_stage (None: LUMINA_TWO_STAGE) lets a fast model speak an opener for slower ones;
+        only worth it when the caller speaks sentences as they arrive.
+        """
         
-        # 1. Normalize Images
-        images = []
-        if screenshot_b64: images.append(screenshot_b64)
-        if screenshots: images.extend(screenshots)
+        # 1. Normalize Images: uploaded (already decoded) first, then legacy base64, decoded once here
+        images = list(images or [])
+        for b64_str in ([screenshot_b64] if screenshot_b64 else []) + (screenshots or []):
+            image = decode_image(b64_str)
+            if image is not None:
+                images.append(image)
         
-        # 2. Prepare Prompt
+        # 2. Route: providers to try in order (see llm_router). Text-only models can't
+        # use screenshots, so they are only picked for them if nothing else has a key
+        keys = {name: key for name, key in (api_keys or {}).items() if key and name in self.providers}
+        if provider != "auto" and provider not in self.providers:
+            provider = "gemini"
+        if api_key and provider != "auto":
+            keys[provider] = api_key
+        if "gemini" not in keys and self.default_key:
+            keys["gemini"] = self.default_key
+        if provider == "replay":
+            # Offline runs stay offline: no routing to live providers
+            keys = {"replay": "local"}
+        else:
+            keys.pop("replay", None)
+        candidates = [name for name in keys if self.providers[name].vision or not images] or list(keys)
+        if provider in keys and provider not in candidates:
+            candidates.insert(0, provider)
+        plan = self.router.plan(provider, candidates)
+        if not plan:
+            yield f"Error: No API Key provided for {provider}."
+            return
+        if plan[0] != provider:
+            logger.info(f"LLM router: {provider} -> {plan}")
+        provider = plan[0]
+        # Prompt sizing follows the first choice. Recording and replay size prompts the same
+        # way whatever the provider, so a replayed request builds the prompt it was recorded by.
+        sizing = "replay" if provider == "replay" or self.recordings is not None else provider
+
+        # 3. Long selections: keep only the passages relevant to this question (and the
+        # last exchange, which follow-ups like "what about the second one?" lean on)
+        query = " ".join([prompt] + [m.get("content") or "" for m in (history or [])[-2:]])
+        selected = relevant_text(text, query, sizing)
+        if selected is not text:
+            metrics.increment("prompt.passages_selected")
+            metrics.observe("prompt.passage_ratio", len(selected) / max(1, len(text)))
+            logger.info(f"Passage selection: {len(text)} chars -> {len(selected)}")
+            text = selected
+
+        # 4. Fit history and selected text into the prompt budget. The system
+        # instructions and the question itself are never cut.
+        fixed_tokens = estimate_tokens(get_system_instructions(tone, custom_persona) + prompt, sizing) + PROMPT_TEMPLATE_TOKENS
+        available = max(0, MAX_PROMPT_TOKENS - fixed_tokens)
+        history_length = len(history or [])
+        if history:
+            # Selected text is the primary context: history may use what it leaves, but at least half
+            history_budget = max(available // 2, available - estimate_tokens(text, sizing))
+            budgeted = budget_history(history, history_budget, sizing)
+            history = budgeted.history
+            if budgeted.compacted or budgeted.dropped:
+                metrics.increment("prompt.history_compacted", budgeted.compacted)
+                metrics.increment("prompt.history_dropped", budgeted.dropped)
+                logger.info(f"History budget: {history_length} messages -> {len(history)} ({budgeted.compacted} compacted), {budgeted.tokens} tokens")
+            available -= budgeted.tokens
+        if estimate_tokens(text, sizing) > available:
+            metrics.increment("prompt.text_truncated")
+            text = truncate_to_tokens(text, available, sizing)
+
+        # 5. Prepare Prompt
         if "No text selected" in text or not text.strip() or text.strip().lower() == "context":
             # CASE A: No Text Selection
             
@@ -380,26 +544,88 @@ class LLMHandler:
                         f"USER QUESTION: {prompt}\n\n"
                     )
         
-        final_prompt += (
-            f"\n\nSYSTEM INSTRUCTIONS FOR AUDIO OUTPUT:\n"
-            f"1. TONE: {tone}\n"
-            f"2. FORMAT: Write for the ear... strict rule: do not use lists or headers.\n"
-            f"3. RHYTHM: Use ellipses (...) instead of commas for natural pauses... it sounds much more human.\n"
-            f"4. FLOW: Avoid short, choppy sentences... connect thoughts with 'and' or 'so' to keep the flow going.\n"
-            f"5. EXPRESSION: Start the answer with a natural filler if appropriate (e.g., 'Oh...', 'Well...', 'You know...') to sound conversational.\n"
-        )
-        
-        # 3. Select Provider
-        handler = self.providers.get(provider, self.providers["gemini"])
+        # The audio-output rules are in the system instructions (and the tone is appended by
+        # each provider), so they aren't repeated here
         
-        # 4. Determine Key (Custom or Env)
-        key_to_use = api_key
-        if not key_to_use and provider == "gemini":
-            key_to_use = self.default_key
-            
-        if not key_to_use:
-            yield f"Error: No API Key provided for {provider}."
-            return
+        # 6. Answer budget: tokens by tone, time by request (a tight audible deadline also hedges sooner)
+        budget = budget or AnswerBudget()
+        if budget.max_tokens is None:
+            budget.max_tokens = max_answer_tokens(tone, provider, custom_persona)
+        hedge_after = self.router.hedge_after
+        if budget.first_token_deadline is not None:
+            hedge_after = min(hedge_after, budget.first_token_deadline) if hedge_after > 0 else budget.first_token_deadline
+
+        # 7. Two-stage: while a slow model writes the body, a fast one restates the question
+        opener_provider = self._opener_provider(provider, keys) if (TWO_STAGE if two_stage is None else two_stage) else None
+        if opener_provider:
+            logger.info(f"Two-stage answer: opener from {opener_provider}, body from {provider}")
+
+        # 8. Stream from the first provider in the plan to answer (hedged, with fallback);
+        # a body that follows a spoken opener is told so
+        def body(continued: bool) -> Iterator[str]:
+            body_prompt = final_prompt + (BODY_CONTINUATION if continued else "")
+            return self.router.stream([
+                (name, lambda name=name: self._provider_stream(
+                    name, body_prompt, images, keys[name], tone, history, custom_persona, history_length,
+                    budget.provider_max_tokens
+                ))
+                for name in plan
+            ], hedge_after)
+
+        if opener_provider:
+            answer = splice_opener(lambda: self.providers[opener_provider].generate_stream(
+                opener_prompt(text, prompt), [], keys[opener_provider], tone, None, custom_persona, OPENER_MAX_TOKENS
+            ), body)
+        else:
+            answer = body(False)
+        yield from bounded_stream(answer, budget, provider)
+
+    def _opener_provider(self, provider: str, keys: Dict[str, str]) -> Optional[str]:
+        """The fastest healthy fast model with a key, when the answer comes from a slower one."""
+        if self.providers[provider].fast:
+            return None
+        plan = self.router.plan("auto", [name for name in keys if self.providers[name].fast])
+        if not plan or self.router.health(plan[0]).state(time.time()) == "open":
+            return None
+        return plan[0]
+
+    def _provider_stream(self, provider: str, final_prompt: str, images: List[ImageData], api_key: str,
+                         tone: str, history: Optional[List[Dict[str, str]]], custom_persona: Optional[str],
+                         history_length: int, max_tokens: int) -> Iterator[str]:
+        handler = self.providers[provider]
+
+        # Shrink screenshots to what this provider can use
+        if images:
+            images, report = self.image_preprocessor.prepare(images, provider_profile(provider))
+            metrics.increment("images.in", report.images_in)
+            metrics.increment("images.duplicates", report.duplicates)
+            metrics.increment("images.bytes_in", report.bytes_in)
+            metrics.increment("images.bytes_out", report.bytes_out)
+            metrics.observe("images.prep", report.seconds)
+            if report.bytes_out < report.bytes_in or report.duplicates:
+                logger.info(
+                    f"Images for {provider}: {report.images_in} -> {report.images_out} "
+                    f"({report.duplicates} duplicate), {report.bytes_in} -> {report.bytes_out} bytes "
+                    f"in {report.seconds * 1000:.0f}ms"
+                )
 
-        # 5. Execute Stream
-        yield from handler.generate_stream(final_prompt, images, key_to_use, tone, history, custom_persona)
+        # Execute Stream (timed per provider, with and without images, to compare payload effects)
+        label = f"llm.{provider}.{'vision' if images else 'text'}"
+        prompt_tokens = estimate_tokens(get_system_instructions(tone, custom_persona) + final_prompt, provider)
+        prompt_tokens += sum(estimate_tokens(m["content"], provider) for m in history or [])
+        metrics.observe(f"prompt.{provider}.tokens", prompt_tokens)
+        started = time.perf_counter()
+        first = True
+        stream = handler.generate_stream(final_prompt, images, api_key, tone, history, custom_persona, max_tokens)
+        if self.recordings is not None and provider != "replay":
+            key = request_key(final_prompt, tone, history, custom_persona, len(images))
+            stream = record(stream, self.recordings, key, provider, handler.model, final_prompt)
+        for chunk in stream:
+            if first:
+                ttft = time.perf_counter() - started
+                metrics.observe(f"{label}.first_token", ttft)
+                # Time to first token against the length of the conversation so far
+                metrics.observe(f"llm.first_token.history_{history_bucket(history_length)}", ttft)
+                first = False
+            yield chunk
+        metrics.observe(f"{label}.total", time.perf_counter() - started)
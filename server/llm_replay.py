@@ -0,0 +1,132 @@
+# server/llm_replay.py
+
+"""
+Recorded LLM streams, for running the server offline with realistic pacing.
+With LUMINA_LLM_RECORD_FILE set, every complete provider stream is saved with
+the pause before each chunk. The "replay" provider plays recordings from
+LUMINA_LLM_REPLAY_FILE, with the same pauses (divided by
+LUMINA_LLM_REPLAY_SPEED). Recordings are keyed by a hash of what the
+provider was asked, so a request recorded against Groq replays for the same
+request sent with llmProvider "replay":
+
+    LUMINA_LLM_RECORD_FILE=replay.json python main.py     # real keys, drive some traffic
+    LUMINA_LLM_REPLAY_FILE=replay.json python main.py     # offline, llmProvider: "replay"
+
+File format:
+    {"version": 1, "recordings": {"<key>": {"provider": "groq", "model": "...",
+     "prompt": "<start of the prompt>", "chunks": [[0.41, "Well..."], [0.03, " it"], ...]}}}
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from llm_router import ERROR_TEXT
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+LLM_REPLAY_FILE = os.getenv("LUMINA_LLM_REPLAY_FILE", "")
+# Playback speed (2 = pauses halved, 0 = no pauses)
+LLM_REPLAY_SPEED = float(os.getenv("LUMINA_LLM_REPLAY_SPEED", "1"))
+# A request with no recording fails; with 0 it gets a recording picked by its key (still deterministic)
+LLM_REPLAY_STRICT = os.getenv("LUMINA_LLM_REPLAY_STRICT", "1").lower() in ("1", "true", "yes")
+LLM_RECORD_FILE = os.getenv("LUMINA_LLM_RECORD_FILE", "")
+
+FORMAT_VERSION = 1
+PROMPT_PREVIEW_CHARS = 200
+
+
+def request_key(prompt: str, tone: str, history: Optional[List[Dict[str, str]]] = None,
+                custom_persona: Optional[str] = None, images: int = 0) -> str:
+    """
+    What the provider was asked. Screenshots count by number only: their bytes
+    differ per capture and per provider's image preparation.
+    """
+    request = {
+        "prompt": prompt,
+        "tone": tone,
+        "history": [[m["role"], m["content"]] for m in history or []],
+        "persona": (custom_persona or "").strip(),
+        "images": images,
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()[:24]
+
+
+class Recordings:
+    """A replay file, loaded on first use; saves are atomic so a crash never leaves half a file."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._recordings: Optional[dict] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        if self._recordings is None:
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                self._recordings = data.get("recordings", {})
+            except FileNotFoundError:
+                self._recordings = {}
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not read LLM recordings from {self.path}: {e}")
+                self._recordings = {}
+        return self._recordings
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load())
+
+    def get(self, key: str, strict: bool = True) -> Optional[dict]:
+        with self._lock:
+            recordings = self._load()
+            if key in recordings:
+                return recordings[key]
+            if strict or not recordings:
+                return None
+            keys = sorted(recordings)
+            return recordings[keys[int(key, 16) % len(keys)]]
+
+    def put(self, key: str, recording: dict):
+        with self._lock:
+            self._load()[key] = recording
+            temp = self.path.with_suffix(self.path.suffix + ".tmp")
+            temp.write_text(json.dumps({"version": FORMAT_VERSION, "recordings": self._recordings}, indent=1), encoding="utf-8")
+            os.replace(temp, self.path)
+
+
+def replay(recording: dict, speed: float = LLM_REPLAY_SPEED) -> Iterator[str]:
+    """The recording's chunks, each after its recorded pause."""
+    for pause, chunk in recording["chunks"]:
+        if speed > 0 and pause > 0:
+            time.sleep(pause / speed)
+        yield chunk
+
+
+def record(chunks: Iterator[str], recordings: Recordings, key: str, provider: str, model: str, prompt: str) -> Iterator[str]:
+    """
+    Passes the stream through, timing each chunk. Only complete answers are
+    saved: not errors, and not streams the consumer stopped early.
+    """
+    timed = []
+    last = time.perf_counter()
+    for chunk in chunks:
+        now = time.perf_counter()
+        timed.append([round(now - last, 4), chunk])
+        last = now
+        yield chunk
+    if not timed or ERROR_TEXT.match(timed[0][1]):
+        return
+    recordings.put(key, {
+        "provider": provider,
+        "model": model,
+        "prompt": prompt[:PROMPT_PREVIEW_CHARS],
+        "recorded": int(time.time()),
+        "chunks": timed,
+    })
+    metrics.increment("llm.replay.recorded")
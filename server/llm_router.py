@@ -0,0 +1,255 @@
+# server/llm_router.py
+
+"""
+Latency-aware LLM provider routing.
+Keeps an EWMA of time-to-first-token and of the error rate per provider, plus
+a circuit breaker each, and turns a request into an ordered plan: the
+requested provider first (for "auto", the fastest healthy one), then the
+others the user has keys for. stream() runs the plan: a provider that fails
+before its first token falls through to the next one, and with a hedge
+deadline the next one also starts when the current one is still silent; the
+first to produce a token wins and the others are cancelled.
+Providers report failures in-band ("Gemini Error: ..."), so a first chunk
+that looks like that counts as a failure too.
+"""
+
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from typing import Callable, Iterator, Optional
+
+from metrics import metrics
+from stream_pump import END, pump
+
+logger = logging.getLogger(__name__)
+
+# Start the next provider when the current one has produced no token after this (0 = no hedging)
+LLM_HEDGE_MS = int(os.getenv("LUMINA_LLM_HEDGE_MS", "0"))
+# Try the user's other providers when the requested one fails before answering
+LLM_FALLBACK = os.getenv("LUMINA_LLM_FALLBACK", "1").lower() in ("1", "true", "yes")
+# Consecutive failures that open a provider's breaker, and how long it stays open (s)
+LLM_BREAKER_FAILURES = int(os.getenv("LUMINA_LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LUMINA_LLM_BREAKER_COOLDOWN", "30"))
+
+ERROR_TEXT = re.compile(r"^(?:\w+ )?Error: ")
+
+Attempt = tuple[str, Callable[[], Iterator[str]]] # (provider, starts its stream)
+
+
+class ProviderHealth:
+    def __init__(self, ttft: float):
+        self.ttft = ttft # EWMA of seconds to first token (starts at a prior)
+        self.error_rate = 0.0 # EWMA of failures per attempt
+        self.samples = 0
+        self.failures = 0 # Consecutive
+        self.open_until = 0.0
+
+    def state(self, now: float) -> str:
+        if self.failures < LLM_BREAKER_FAILURES:
+            return "closed"
+        # After the cooldown one more attempt decides (success closes it, failure reopens)
+        return "open" if now < self.open_until else "half_open"
+
+
+class ProviderRouter:
+    def __init__(self, alpha: float = 0.2, prior_ttft: float = 1.0, error_penalty: float = 4.0,
+                 hedge_after: float = LLM_HEDGE_MS / 1000, fallback: bool = LLM_FALLBACK):
+        self.alpha = alpha
+        self.prior_ttft = prior_ttft
+        self.error_penalty = error_penalty
+        self.hedge_after = hedge_after
+        self.fallback = fallback
+        self._health: dict[str, ProviderHealth] = {}
+        self._lock = threading.Lock()
+
+    def health(self, name: str) -> ProviderHealth:
+        with self._lock:
+            return self._health.setdefault(name, ProviderHealth(self.prior_ttft))
+
+    def record_success(self, name: str, ttft: float):
+        health = self.health(name)
+        with self._lock:
+            health.ttft += self.alpha * (ttft - health.ttft)
+            health.error_rate -= self.alpha * health.error_rate
+            health.samples += 1
+            health.failures = 0
+
+    def record_failure(self, name: str):
+        health = self.health(name)
+        with self._lock:
+            health.error_rate += self.alpha * (1 - health.error_rate)
+            health.samples += 1
+            health.failures += 1
+            if health.failures >= LLM_BREAKER_FAILURES:
+                if health.failures == LLM_BREAKER_FAILURES:
+                    logger.warning(f"LLM router: {name} failed {health.failures} times in a row, opening its breaker")
+                    metrics.increment(f"llm.router.breaker_open.{name}")
+                health.open_until = time.time() + LLM_BREAKER_COOLDOWN
+
+    def record_cancelled(self, name: str, elapsed: float):
+        """A hedged attempt that lost: its first token would have taken at least this long."""
+        health = self.health(name)
+        with self._lock:
+            if elapsed > health.ttft:
+                health.ttft += self.alpha * (elapsed - health.ttft)
+
+    def score(self, name: str) -> float:
+        health = self.health(name)
+        return health.ttft * (1 + self.error_penalty * health.error_rate)
+
+    def plan(self, requested: str, candidates: list[str]) -> list[str]:
+        """
+        Providers to try, in order. Healthy ones come before those with an open
+        breaker, which are only tried as a last resort.
+        """
+        now = time.time()
+        ranked = sorted(candidates, key=self.score)
+        if requested != "auto" and requested in candidates:
+            if not self.fallback:
+                return [requested]
+            ranked.remove(requested)
+            ranked.insert(0, requested)
+        healthy = [name for name in ranked if self.health(name).state(now) != "open"]
+        return healthy + [name for name in ranked if name not in healthy]
+
+    def stream(self, attempts: list[Attempt], hedge_after: Optional[float] = None) -> Iterator[str]:
+        """
+        The answer of the first attempt to produce a token (or the last failure's
+        error text). hedge_after overrides the router's deadline for this stream.
+        """
+        hedge_after = self.hedge_after if hedge_after is None else hedge_after
+        if hedge_after > 0 and len(attempts) > 1:
+            yield from self._hedged(attempts, hedge_after)
+        else:
+            yield from self._sequential(attempts)
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        with self._lock:
+            return {
+                name: {
+                    "ttftEwma": round(health.ttft, 3),
+                    "errorRate": round(health.error_rate, 3),
+                    "samples": health.samples,
+                    "breaker": health.state(now),
+                }
+                for name, health in self._health.items()
+            }
+
+    def _failed(self, name: str, error: str, remaining: bool) -> str:
+        self.record_failure(name)
+        logger.warning(f"LLM router: {name} failed before answering: {error[:120]}")
+        if remaining:
+            metrics.increment("llm.router.fallbacks")
+        return error
+
+    def _sequential(self, attempts: list[Attempt]) -> Iterator[str]:
+        error = "Error: No LLM provider available."
+        for index, (name, start) in enumerate(attempts):
+            remaining = index < len(attempts) - 1
+            started = time.perf_counter()
+            answered = False
+            iterator = None
+            try:
+                iterator = start()
+                for chunk in iterator:
+                    if not chunk:
+                        continue
+                    if not answered:
+                        if ERROR_TEXT.match(chunk):
+                            error = self._failed(name, chunk, remaining)
+                            break
+                        answered = True
+                        self.record_success(name, time.perf_counter() - started)
+                    elif ERROR_TEXT.match(chunk):
+                        self.record_failure(name)
+                    yield chunk
+            except Exception as e:
+                if answered:
+                    self.record_failure(name)
+                    raise
+                error = self._failed(name, f"{name.capitalize()} Error: {e}", remaining)
+            finally:
+                if iterator is not None and hasattr(iterator, "close"):
+                    iterator.close()
+            if answered:
+                return
+        yield error
+
+    def _hedged(self, attempts: list[Attempt], hedge_after: float) -> Iterator[str]:
+        events: queue.Queue = queue.Queue()
+        stops: list[threading.Event] = []
+        started: list[float] = []
+
+        def launch():
+            index = len(stops)
+            stops.append(threading.Event())
+            started.append(time.perf_counter())
+            pump(attempts[index][1], lambda item: events.put((index, item)), stops[index])
+
+        error = "Error: No LLM provider available."
+        running: set[int] = set()
+        winner = None
+        try:
+            launch()
+            running.add(0)
+            while winner is None:
+                more = len(stops) < len(attempts)
+                timeout = None
+                if more and running:
+                    timeout = max(0.0, started[-1] + hedge_after - time.perf_counter())
+                if more and not running:
+                    launch() # Everything so far failed: fall through right away
+                    running.add(len(stops) - 1)
+                    continue
+                try:
+                    index, item = events.get(timeout=timeout)
+                except queue.Empty:
+                    metrics.increment("llm.router.hedges")
+                    logger.info(f"LLM router: no token from {attempts[len(stops) - 1][0]} after {hedge_after:.2f}s, hedging")
+                    launch()
+                    running.add(len(stops) - 1)
+                    continue
+                if index not in running or item == "":
+                    continue # Late events from an attempt that already failed, or empty keep-alive chunks
+                name = attempts[index][0]
+                if isinstance(item, str) and not ERROR_TEXT.match(item):
+                    winner = index
+                    self.record_success(name, time.perf_counter() - started[index])
+                    if index > 0:
+                        metrics.increment("llm.router.hedge_wins")
+                    for other in running - {index}:
+                        stops[other].set()
+                        self.record_cancelled(attempts[other][0], time.perf_counter() - started[other])
+                    yield item
+                    break
+                running.discard(index)
+                stops[index].set()
+                if item is END:
+                    item = f"{name.capitalize()} Error: empty response"
+                elif isinstance(item, Exception):
+                    item = f"{name.capitalize()} Error: {item}"
+                error = self._failed(name, item, bool(running) or len(stops) < len(attempts))
+                if not running and len(stops) == len(attempts):
+                    yield error
+                    return
+
+            # The winner streams on; everything else is ignored
+            while True:
+                index, item = events.get()
+                if index != winner or item == "":
+                    continue
+                if item is END:
+                    return
+                if isinstance(item, Exception):
+                    self.record_failure(attempts[winner][0])
+                    raise item
+                if ERROR_TEXT.match(item):
+                    self.record_failure(attempts[winner][0])
+                yield item
+        finally:
+            for stop in stops:
+                stop.set()
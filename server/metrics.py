@@ -0,0 +1,44 @@
+# server/metrics.py
+
+"""
+In-process counters and timings, served at /api/metrics.
+Cheap enough to record on every request, and thread-safe since LLM calls run
+on executor threads.
+"""
+
+import threading
+import time
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = {}
+        self._timings: dict[str, list[float]] = {} # name -> [count, total, max]
+        self.started = time.time()
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        """Records one sample of a timing (seconds) or size distribution."""
+        with self._lock:
+            timing = self._timings.setdefault(name, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += value
+            timing[2] = max(timing[2], value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "uptimeSeconds": round(time.time() - self.started, 1),
+                "counters": dict(self._counters),
+                "timings": {
+                    name: {"count": count, "mean": round(total / count, 4), "max": round(peak, 4)}
+                    for name, (count, total, peak) in self._timings.items()
+                },
+            }
+
+
+metrics = Metrics()
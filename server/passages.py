@@ -0,0 +1,217 @@
+# server/passages.py
+
+"""
+Relevance-based passage selection for long selected text.
+Selecting a whole article used to put all of it into every prompt, follow-ups
+included, and input length drives both the bill and time-to-first-token.
+This splits the selection into passages, ranks them against the question with
+BM25, and keeps the headings plus the best passages (in document order) within
+a token budget. Indexes are cached by text hash, so follow-ups about the same
+selection only score the new question.
+"""
+
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from prompt_budget import estimate_tokens, truncate_to_tokens
+from text_chunker import split_sentences
+
+# Selections shorter than this (estimated tokens) go into the prompt whole
+PASSAGE_SELECTION = os.getenv("LUMINA_PASSAGE_SELECTION", "1").lower() in ("1", "true", "yes")
+PASSAGE_MIN_TOKENS = int(os.getenv("LUMINA_PASSAGE_MIN_TOKENS", "1500"))
+# Budget for the passages chosen from a long selection
+PASSAGE_BUDGET_TOKENS = int(os.getenv("LUMINA_PASSAGE_BUDGET_TOKENS", "1200"))
+
+PASSAGE_CHARS = 600
+OMISSION_MARK = "[...]"
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i in is it its of on or so that the this "
+    "to was were what when where which who why will with you your do does did can about".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS]
+
+
+def is_heading(line: str) -> bool:
+    """
+    Looks like a heading: a short line without sentence punctuation ("Results",
+    "## Methods", "2.1 Setup"). Hard-wrapped prose has plenty of those, so
+    split_passages also wants a "#" or blank lines around it.
+    """
+    line = line.strip()
+    if not line or len(line) > 80:
+        return False
+    if line.startswith("#"):
+        return True
+    return not line.endswith((".", "!", "?", ",", ";", ":")) and len(line.split()) <= 10
+
+
+class Passage:
+    __slots__ = ("index", "text", "heading")
+
+    def __init__(self, index: int, text: str, heading: Optional[str]):
+        self.index = index
+        self.text = text
+        self.heading = heading # Nearest heading above the passage
+
+
+def split_passages(text: str, target: int = PASSAGE_CHARS) -> list[Passage]:
+    """Paragraph-aligned passages of about target characters, each tagged with its section heading."""
+    passages: list[Passage] = []
+    heading = None
+    current = ""
+
+    def flush():
+        nonlocal current
+        if current.strip():
+            passages.append(Passage(len(passages), current.strip(), heading))
+        current = ""
+
+    lines = text.splitlines()
+
+    def blank(i: int) -> bool:
+        return i < 0 or i >= len(lines) or not lines[i].strip()
+
+    for i, line in enumerate(lines):
+        if is_heading(line) and (line.strip().startswith("#") or (blank(i - 1) and blank(i + 1))):
+            flush()
+            heading = line.strip().lstrip("#").strip()
+            continue
+        pieces = [line] if len(line) <= target else split_sentences(line)
+        for piece in pieces:
+            if current and len(current) + len(piece) > target:
+                flush()
+            current = f"{current}\n{piece}" if current else piece
+        if not line.strip():
+            # Paragraph break: close the passage once it is reasonably full
+            if len(current) >= target // 2:
+                flush()
+    flush()
+    return passages
+
+
+class BM25Index:
+    """Okapi BM25 over passages: postings per term, scored with NumPy."""
+
+    def __init__(self, passages: list[Passage], k1: float = 1.5, b: float = 0.75):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        lengths = np.zeros(len(passages), dtype=np.float32)
+        postings: dict[str, dict[int, int]] = {}
+        for passage in passages:
+            # The heading counts as part of each passage under it
+            terms = tokenize(passage.text + " " + (passage.heading or ""))
+            lengths[passage.index] = len(terms)
+            for term in terms:
+                counts = postings.setdefault(term, {})
+                counts[passage.index] = counts.get(passage.index, 0) + 1
+        for term, counts in postings.items():
+            self._postings[term] = (
+                np.fromiter(counts.keys(), dtype=np.int32, count=len(counts)),
+                np.fromiter(counts.values(), dtype=np.float32, count=len(counts)),
+            )
+        self._norm = k1 * (1 - b + b * lengths / max(float(lengths.mean()) if len(passages) else 1.0, 1.0))
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        n = len(self.passages)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            docs, tf = posting
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + self._norm[docs])
+        return scores
+
+
+_index_cache: "OrderedDict[str, BM25Index]" = OrderedDict()
+_index_lock = threading.Lock()
+INDEX_CACHE_ENTRIES = 32
+
+
+def get_index(text: str) -> BM25Index:
+    """BM25 index for a selection, cached by content hash."""
+    key = hashlib.md5(text.encode()).hexdigest()
+    with _index_lock:
+        index = _index_cache.get(key)
+        if index is not None:
+            _index_cache.move_to_end(key)
+            return index
+    index = BM25Index(split_passages(text))
+    with _index_lock:
+        _index_cache[key] = index
+        if len(_index_cache) > INDEX_CACHE_ENTRIES:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def select_passages(text: str, query: str, budget: int = PASSAGE_BUDGET_TOKENS, provider: str = "gemini") -> str:
+    """
+    The passages most relevant to query, within budget tokens, in document
+    order under their headings, with [...] marking what was left out.
+    """
+    index = get_index(text)
+    if not index.passages:
+        return text
+    scores = index.scores(query)
+    # Best first. Passages sharing no terms with the question only fill in when
+    # nothing matches at all, and then in document order (the lead usually summarizes)
+    ranked = sorted(range(len(index.passages)), key=lambda i: (-scores[i], i))
+    if scores[ranked[0]] > 0:
+        ranked = [i for i in ranked if scores[i] > 0]
+
+    chosen: dict[int, str] = {}
+    used = 0
+    seen = set()
+    for i in ranked:
+        passage = index.passages[i]
+        # Pages repeat boilerplate (and quoted passages); one copy is enough
+        if passage.text in seen:
+            continue
+        seen.add(passage.text)
+        cost = estimate_tokens(passage.text, provider)
+        if used + cost > budget:
+            if not chosen:
+                # Not even the best passage fits: keep as much of it as the budget allows
+                chosen[i] = truncate_to_tokens(passage.text, budget, provider)
+                break
+            continue
+        chosen[i] = passage.text
+        used += cost
+
+    parts = []
+    previous = -1
+    heading = None
+    for i in sorted(chosen):
+        passage = index.passages[i]
+        if i != previous + 1:
+            parts.append(OMISSION_MARK)
+        if passage.heading and passage.heading != heading:
+            parts.append(f"## {passage.heading}")
+        heading = passage.heading
+        parts.append(chosen[i])
+        previous = i
+    if previous != len(index.passages) - 1:
+        parts.append(OMISSION_MARK)
+    return "\n".join(parts)
+
+
+def relevant_text(text: str, query: str, provider: str = "gemini") -> str:
+    """select_passages for long selections; short ones (or with selection disabled) pass through."""
+    if not PASSAGE_SELECTION or estimate_tokens(text, provider) <= PASSAGE_MIN_TOKENS:
+        return text
+    return select_passages(text, query, PASSAGE_BUDGET_TOKENS, provider)
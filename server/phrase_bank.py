@@ -0,0 +1,147 @@
+# server/phrase_bank.py
+
+"""
+Pre-rendered phrase audio, per voice.
+Used for conversational openers ("Oh...", "Well...") that the prompt asks the
+LLM to start with, and for the latency-masking cues played while on-demand
+audio renders, so none of them need synthesis at request time.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import wave
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Openers the prompt explicitly encourages, keyed by a filesystem-safe slug
+OPENERS = {
+    "oh": "Oh...",
+    "well": "Well...",
+    "you_know": "You know...",
+    "so": "So...",
+    "alright": "Alright...",
+    "okay": "Okay...",
+    "hmm": "Hmm...",
+    "great_question": "Great question...",
+}
+
+# Cues played by the extension around on-demand synthesis (served as {key}.wav)
+CUES = {
+    "cue": "Sure thing! Let me get my voice ready for you...",
+    "ready": "Alright... let me explain to you...",
+}
+
+# An opener only counts when it is followed by an ellipsis, the pause the bank's
+# audio has. "So the answer is..." and "So, the answer is..." are left whole:
+# spoken as "So..." they would change meaning or rhythm.
+_OPENER_PATTERN = re.compile(
+    r"^\s*(oh|well|you know|so|alright|okay|hmm|great question)\s*(?:\.{2,}|…)\s*",
+    re.IGNORECASE
+)
+
+
+def split_opener(text: str) -> tuple[Optional[str], str]:
+    """Returns (opener_key, remaining_text). opener_key is None if there is no known opener."""
+    match = _OPENER_PATTERN.match(text)
+    if not match:
+        return None, text
+    key = match.group(1).lower().replace(" ", "_")
+    return key, text[match.end():]
+
+
+def read_wav_pcm(path: Path) -> np.ndarray:
+    """Loads a 16-bit mono WAV as an int16 array."""
+    with wave.open(str(path), 'rb') as wf:
+        return np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+
+
+def write_wav_pcm(path: Path, audio: np.ndarray, sample_rate: int):
+    """Writes an int16 array as a 16-bit mono WAV (atomically)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_suffix(".part")
+    with wave.open(str(temp_path), 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(audio.tobytes())
+    temp_path.replace(path)
+
+
+def voice_dir_name(voice: str) -> str:
+    """
+    Path-safe, collision-free directory name for a voice id (they come from
+    requests; custom voices are GUIDs). The readable prefix alone would map
+    "a.b" and "a/b" to the same place, so a hash of the id follows it.
+    """
+    readable = re.sub(r"[^A-Za-z0-9_-]", "_", voice)[:32]
+    digest = hashlib.sha1(voice.encode()).hexdigest()[:12]
+    return f"{readable}_{digest}"
+
+
+class PhraseBank:
+    """
+    Lazily rendered, disk-persisted audio for a fixed set of phrases.
+    Files live under {directory}/{model_version}/{voice_dir}/{key}.wav so a
+    model upgrade never serves stale audio (voice_dir: see voice_dir_name).
+    """
+
+    def __init__(self, directory: Path, phrases: dict[str, str]):
+        self.directory = Path(directory)
+        self.phrases = phrases
+        self._memory: dict[tuple[str, str, str], np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, tts, voice: str, key: str) -> Path:
+        model_version = getattr(tts, 'model_version', 'unknown')
+        return self.directory / model_version / voice_dir_name(voice) / f"{key}.wav"
+
+    def is_ready(self, tts, voice: str, key: str) -> bool:
+        model_version = getattr(tts, 'model_version', 'unknown')
+        return (model_version, voice, key) in self._memory or self.path_for(tts, voice, key).exists()
+
+    def get(self, tts, voice: str, key: str) -> np.ndarray:
+        """
+        Returns the phrase audio, rendering and persisting it on first use.
+        Blocking: call from the executor, not the event loop.
+        """
+        model_version = getattr(tts, 'model_version', 'unknown')
+        cache_key = (model_version, voice, key)
+        audio = self._memory.get(cache_key)
+        if audio is not None:
+            return audio
+
+        path = self.path_for(tts, voice, key)
+        if path.exists():
+            try:
+                audio = read_wav_pcm(path)
+            except Exception as e:
+                logger.warning(f"Phrase bank: unreadable {path} ({e}), re-rendering")
+                audio = None
+
+        if audio is None:
+            audio = tts.generate_speech(self.phrases[key], voice=voice)
+            if audio.dtype != np.int16:
+                audio = (audio * 32767).astype(np.int16)
+            # Never persist the mock beep from an unavailable model
+            if getattr(tts, 'is_available', False):
+                write_wav_pcm(path, audio, getattr(tts, 'sample_rate', 24000))
+                logger.info(f"Phrase bank: rendered '{self.phrases[key]}' for {voice}")
+
+        with self._lock:
+            self._memory[cache_key] = audio
+        return audio
+
+    def missing(self, tts, voices: list[str]) -> list[tuple[str, str]]:
+        """(voice, key) pairs that still need rendering."""
+        return [
+            (voice, key)
+            for voice in voices
+            for key in self.phrases
+            if not self.is_ready(tts, voice, key)
+        ]
@@ -0,0 +1,44 @@
+# server/playlist.py
+
+"""
+Segmented playlists for long answers.
+A job's audio is exposed as one segment per TTS chunk, each addressed by a
+hash of what it contains (model, voice, text), so segments are fetchable as
+soon as they are synthesized, cacheable forever, and shared between answers
+that repeat a sentence. The JSON manifest is the primary form; the m3u8
+one is a plain extended M3U for desktop players (VLC, mpv) and custom
+clients, not HLS: the segments are WAV/Opus/FLAC, which HLS players reject.
+"""
+
+import hashlib
+from typing import NamedTuple, Optional
+
+# Typical speaking rate, for durations of segments not rendered yet
+CHARS_PER_SECOND = 15.0
+
+M3U_MEDIA_TYPE = "audio/x-mpegurl" # Not application/vnd.apple.mpegurl: this isn't HLS
+
+
+class Segment(NamedTuple):
+    id: str
+    kind: str # "opener" (from the phrase bank) or "chunk" (synthesized text)
+    text: str
+    opener_key: Optional[str] = None
+
+
+def segment_id(model_version: str, voice: str, kind: str, text: str) -> str:
+    digest = hashlib.md5(f"{model_version}|{voice}|{kind}|{text}".encode()).hexdigest()
+    return f"seg_{digest}"
+
+
+def estimate_duration(text: str) -> float:
+    return max(0.5, len(text) / CHARS_PER_SECOND)
+
+
+def render_m3u8(entries: list[tuple[str, float]]) -> str:
+    """Extended M3U playlist (UTF-8) from (url, duration_seconds) pairs."""
+    lines = ["#EXTM3U"]
+    for url, duration in entries:
+        lines.append(f"#EXTINF:{duration:.3f},")
+        lines.append(url)
+    return "\n".join(lines) + "\n"
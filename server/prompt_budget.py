@@ -0,0 +1,122 @@
+# server/prompt_budget.py
+
+"""
+Token budgeting for prompt assembly.
+Sessions used to send every past turn verbatim, so each follow-up was slower
+and costlier than the last. The budgeter keeps the most recent turns as they
+were, shortens older ones to their opening sentences, drops the oldest when
+even that doesn't fit, and truncates the selected text as a last resort, so a
+prompt never exceeds the configured size.
+"""
+
+import math
+import os
+from functools import lru_cache
+from typing import NamedTuple
+
+from text_chunker import split_sentences
+
+# Average characters per token of each provider's tokenizer on English prose
+# ("replay": the provider-neutral sizing recorded and replayed runs use)
+_CHARS_PER_TOKEN = {"gemini": 4.0, "openai": 4.0, "claude": 3.5, "groq": 3.7, "replay": 4.0}
+
+MAX_PROMPT_TOKENS = int(os.getenv("LUMINA_MAX_PROMPT_TOKENS", "6000"))
+# Messages at the end of the history that are always kept verbatim (2 = the last exchange)
+HISTORY_VERBATIM_MESSAGES = int(os.getenv("LUMINA_HISTORY_VERBATIM", "4"))
+# Older messages are cut down to roughly this many characters
+COMPACT_MESSAGE_CHARS = 240
+
+TRUNCATION_MARK = " [...]"
+
+
+def estimate_tokens(text: str, provider: str = "gemini") -> int:
+    if not text:
+        return 0
+    return math.ceil(len(text) / _CHARS_PER_TOKEN.get(provider, 4.0))
+
+
+@lru_cache(maxsize=1024)
+def compact_message(content: str, limit: int = COMPACT_MESSAGE_CHARS) -> str:
+    """Extractive compaction: the leading sentences that fit in limit characters."""
+    if len(content) <= limit or (content.endswith(TRUNCATION_MARK) and len(content) <= limit + len(TRUNCATION_MARK)):
+        return content
+    kept = ""
+    for sentence in split_sentences(content):
+        candidate = f"{kept} {sentence}".strip()
+        if len(candidate) > limit:
+            break
+        kept = candidate
+    if not kept:
+        kept = content[:limit].rsplit(" ", 1)[0]
+    return kept + TRUNCATION_MARK
+
+
+def truncate_to_tokens(text: str, tokens: int, provider: str = "gemini") -> str:
+    """Cuts text at a word boundary so it fits in the given number of tokens."""
+    if estimate_tokens(text, provider) <= tokens:
+        return text
+    limit = max(0, int(tokens * _CHARS_PER_TOKEN.get(provider, 4.0)) - len(TRUNCATION_MARK))
+    return text[:limit].rsplit(" ", 1)[0] + TRUNCATION_MARK
+
+
+class BudgetedHistory(NamedTuple):
+    history: list[dict[str, str]]
+    tokens: int
+    compacted: int # Messages shortened
+    dropped: int # Oldest messages left out entirely
+
+
+def budget_history(history: list[dict], budget: int, provider: str = "gemini",
+                   verbatim: int = HISTORY_VERBATIM_MESSAGES) -> BudgetedHistory:
+    """
+    Fits history into budget tokens: the last `verbatim` messages as they are,
+    older ones compacted, and the oldest dropped until the rest fits. The
+    verbatim tail is compacted too if it alone is over budget.
+    Messages are reduced to role and content (clients attach audio URLs etc.).
+    """
+    messages = [{"role": m.get("role", "user"), "content": m.get("content") or ""} for m in history or []]
+    split = max(0, len(messages) - verbatim)
+    compacted = 0
+    for message in messages[:split]:
+        short = compact_message(message["content"])
+        if short != message["content"]:
+            message["content"] = short
+            compacted += 1
+
+    def cost(items):
+        return sum(estimate_tokens(m["content"], provider) for m in items)
+
+    dropped = 0
+    while messages and cost(messages) > budget:
+        if dropped < split:
+            messages.pop(0)
+            dropped += 1
+            continue
+        # Only the recent tail is left and it still doesn't fit
+        longest = max(messages, key=lambda m: len(m["content"]))
+        short = compact_message(longest["content"])
+        if short == longest["content"]:
+            messages.pop(0)
+            dropped += 1
+        else:
+            longest["content"] = short
+            compacted += 1
+    # Keep the user/assistant alternation: never start on an orphaned answer
+    while messages and messages[0]["role"] != "user" and dropped:
+        messages.pop(0)
+        dropped += 1
+    return BudgetedHistory(messages, cost(messages), compacted, dropped)
+
+
+def history_bucket(messages: int) -> str:
+    """Coarse history-length label for latency metrics."""
+    turns = messages // 2
+    if turns == 0:
+        return "0"
+    if turns <= 2:
+        return "1-2"
+    if turns <= 5:
+        return "3-5"
+    if turns <= 10:
+        return "6-10"
+    return "11+"
@@ -0,0 +1,152 @@
+# server/sessions.py
+
+"""
+Server-side conversation state.
+A session holds a thread's normalized history, its selected text and its
+screenshot references, so follow-ups send a session id and the new prompt
+instead of the whole conversation. Sessions expire after a TTL and are
+evicted least-recently-used beyond a memory budget; with a database path
+they are also written through to SQLite and reloaded on demand, which lets
+them survive restarts (and evictions).
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+
+class Session:
+    def __init__(self, session_id: str, history: Optional[list] = None, text: str = "",
+                 image_hashes: Optional[list] = None, updated: Optional[float] = None):
+        self.id = session_id
+        self.history: list[dict[str, str]] = history or []
+        self.text = text
+        self.image_hashes: list[str] = image_hashes or []
+        self.updated = updated or time.time()
+
+    @property
+    def size(self) -> int:
+        """Approximate memory footprint in bytes (the text dominates)."""
+        return len(self.text) + sum(len(m["content"]) + 16 for m in self.history) + 64 * len(self.image_hashes)
+
+    def to_json(self) -> str:
+        return json.dumps({"history": self.history, "text": self.text, "imageHashes": self.image_hashes})
+
+    @classmethod
+    def from_json(cls, session_id: str, data: str, updated: float) -> "Session":
+        fields = json.loads(data)
+        return cls(session_id, fields.get("history"), fields.get("text", ""), fields.get("imageHashes"), updated)
+
+
+def normalize_history(history: list) -> list[dict[str, str]]:
+    """Role and content only (clients attach audio URLs and the like)."""
+    return [
+        {"role": "assistant" if m.get("role") == "assistant" else "user", "content": str(m.get("content") or "")}
+        for m in history or []
+    ]
+
+
+class SessionStore:
+    def __init__(self, ttl: float, max_bytes: int, db_path: Optional[Path] = None, max_messages: int = 200):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._sizes: dict[str, int] = {} # Size when stored (sessions are mutated in place)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path is not None:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None and self._db is not None:
+                row = self._db.execute("SELECT data, updated FROM sessions WHERE id = ?", (session_id,)).fetchone()
+                if row is not None:
+                    session = Session.from_json(session_id, row[0], row[1])
+                    self._remember(session)
+            if session is None:
+                return None
+            if time.time() - session.updated > self.ttl:
+                self._forget(session_id)
+                return None
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def save(self, session: Session):
+        """Stores a new or changed session (write-through when persistent)."""
+        session.updated = time.time()
+        with self._lock:
+            self._forget(session.id, persistent=False)
+            self._remember(session)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sessions (id, data, updated) VALUES (?, ?, ?)",
+                    (session.id, session.to_json(), session.updated)
+                )
+                self._db.commit()
+
+    def append_turn(self, session_id: str, prompt: str, answer: str):
+        """Records a finished exchange; unknown (expired) sessions are ignored."""
+        session = self.get(session_id)
+        if session is None:
+            return
+        session.history += [{"role": "user", "content": prompt}, {"role": "assistant", "content": answer}]
+        # Prompts only use the recent end (see prompt_budget); don't grow without bound
+        del session.history[:-self.max_messages]
+        self.save(session)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._forget(session_id)
+
+    def expire(self, now: float) -> int:
+        with self._lock:
+            expired = [sid for sid, session in self._sessions.items() if now - session.updated > self.ttl]
+            for session_id in expired:
+                self._forget(session_id, persistent=False)
+            if self._db is not None:
+                self._db.execute("DELETE FROM sessions WHERE updated < ?", (now - self.ttl,))
+                self._db.commit()
+            return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def size(self) -> int:
+        return self._bytes
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, session: Session):
+        self._sessions[session.id] = session
+        self._sizes[session.id] = session.size
+        self._bytes += self._sizes[session.id]
+        # Least recently used leave memory first (they stay in the database, if any)
+        while self._bytes > self.max_bytes and len(self._sessions) > 1:
+            evicted_id, _ = self._sessions.popitem(last=False)
+            self._bytes -= self._sizes.pop(evicted_id)
+
+    def _forget(self, session_id: str, persistent: bool = True):
+        if self._sessions.pop(session_id, None) is not None:
+            self._bytes -= self._sizes.pop(session_id)
+        if persistent and self._db is not None:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._db.commit()
@@ -0,0 +1,84 @@
+# server/stream_pump.py
+
+"""
+The shared worker pool, and blocking streams read through a queue.
+LLM streams block on the network, so the async endpoints, the answer
+budget, the provider router and two-stage answers each consume them from
+a queue that a pump thread fills (from a bounded pool of their own, so
+streams never take the TTS workers). The consumer can then wait with a
+timeout, or merge several streams, and stop one at its next chunk.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+
+END = object() # Put after a stream's last item (and after its exception, if it raised)
+
+# Pumps started by a request (an endpoint reading an answer) at once; more wait their turn
+PUMP_WORKERS = int(os.getenv("LUMINA_PUMP_WORKERS", "16"))
+# Pumps one of those may have running under it (budget, router hedges, two-stage opener)
+NESTED_PUMPS = 4
+
+
+class PumpPool:
+    """
+    Bounded threads for pumps. A pump started from outside any pump queues
+    for one of `workers` threads, so load waits rather than adding threads.
+    Pumps nest (an answer's pump reads the budget's, which reads the
+    router's), and a nested pump can't queue behind its own consumer: it gets
+    a thread of its own at once, up to nested_limit of them, past which it
+    waits for one to finish. Only the budget's pump starts others, and the
+    ones it starts (providers, openers) just read the network, so with
+    NESTED_PUMPS per worker that wait always ends.
+    """
+
+    def __init__(self, workers: int, nested_limit: Optional[int] = None):
+        self._outer = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pump")
+        self._nested = threading.BoundedSemaphore(nested_limit or workers * NESTED_PUMPS)
+        self._local = threading.local()
+
+    def start(self, fn: Callable[[], None]):
+        if getattr(self._local, "inside", False):
+            self._nested.acquire()
+            threading.Thread(target=self._run, args=(fn, self._nested.release), daemon=True).start()
+        else:
+            self._outer.submit(self._run, fn, None)
+
+    def _run(self, fn: Callable[[], None], done: Optional[Callable[[], None]]):
+        self._local.inside = True
+        try:
+            fn()
+        finally:
+            self._local.inside = False # Pool threads are reused for outer pumps
+            if done:
+                done()
+
+
+executor = ThreadPoolExecutor(max_workers=10) # General pool: TTS, image prep
+pumps = PumpPool(PUMP_WORKERS)
+
+
+def pump(make_iterator: Callable[[], Iterable], put: Callable[[object], None], stop: threading.Event):
+    """
+    Calls make_iterator() on a pump thread and puts each item it yields, then
+    the exception if it raised, then END. Once stop is set the stream is
+    abandoned at its next item; it is closed either way.
+    """
+    def run():
+        iterator = None
+        try:
+            iterator = make_iterator()
+            for item in iterator:
+                if stop.is_set():
+                    break
+                put(item)
+        except Exception as e:
+            put(e)
+        finally:
+            if iterator is not None and hasattr(iterator, "close"):
+                iterator.close()
+            put(END)
+
+    pumps.start(run)
@@ -0,0 +1,55 @@
+# server/test_answer_budget.py
+import time
+
+from answer_budget import AnswerBudget, bounded_stream, max_answer_tokens
+
+
+def _words(text: str, delay: float = 0.0):
+    for word in text.split(" "):
+        if delay:
+            time.sleep(delay)
+        yield word + " "
+
+
+LONG = " ".join(f"Sentence {i} has a handful of ordinary words." for i in range(20))
+
+
+def test_token_budget_stops_at_the_next_sentence_end():
+    budget = AnswerBudget(max_tokens=20)
+    answer = "".join(bounded_stream(_words(LONG), budget))
+    assert answer.endswith("ordinary words.") and len(answer) < len(LONG) / 2
+    assert budget.truncated == "tokens" and budget.tokens > 20
+
+
+def test_unfinished_sentence_past_the_grace_is_dropped():
+    budget = AnswerBudget(max_tokens=8)
+    answer = "".join(bounded_stream(_words("Sentence one is short. Then " + "on and " * 100 + "done."), budget))
+    assert answer.strip() == "Sentence one is short." # Not the run-on that never ended in time
+    assert budget.truncated == "tokens"
+    # What the grace does finish is kept, up to its last sentence end
+    budget = AnswerBudget(max_tokens=8)
+    answer = "".join(bounded_stream(_words("Sentence one is short. Then it ends. And then " + "on and " * 100), budget))
+    assert answer.endswith("Then it ends.")
+
+
+def test_short_answers_are_untouched():
+    budget = AnswerBudget(max_tokens=200)
+    text = "Short answer. Done."
+    assert "".join(bounded_stream(_words(text), budget)).strip() == text
+    assert budget.truncated is None and budget.first_token is not None
+
+
+def test_time_budget_abandons_a_slow_stream():
+    budget = AnswerBudget(max_tokens=1000, finished_within=0.1)
+    started = time.monotonic()
+    answer = "".join(bounded_stream(_words("One. " + "never ending " * 200, delay=0.01), budget))
+    assert budget.truncated == "time"
+    assert time.monotonic() - started < 2.5
+    assert answer.startswith("One.")
+    assert budget.to_dict()["truncated"] == "time"
+
+
+def test_max_tokens_scale_with_tone():
+    assert max_answer_tokens("concise", "gemini") < max_answer_tokens("casual", "gemini") < max_answer_tokens("helpful", "gemini")
+    assert max_answer_tokens("helpful", "groq") > max_answer_tokens("helpful", "gemini")
+    assert max_answer_tokens("concise", "gemini", custom_persona="pirate") == max_answer_tokens("helpful", "gemini")
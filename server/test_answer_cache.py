@@ -0,0 +1,65 @@
+# server/test_answer_cache.py
+from answer_cache import AnswerCache, answer_similarity, parse_thresholds
+
+PASSAGE = (
+    "Photosynthesis is the process by which green plants use sunlight to synthesize glucose from carbon "
+    "dioxide and water. It takes place in the chloroplasts, where chlorophyll absorbs light energy. "
+    "The light reactions produce ATP and NADPH, which the Calvin cycle uses to fix carbon. "
+    "Oxygen is released as a by-product of splitting water molecules."
+)
+
+
+def test_near_duplicate_selection_and_prompt_hit():
+    cache = AnswerCache(threshold=0.7)
+    cache.store("gemini|helpful||", PASSAGE, "What does this mean?", "Plants make food from light.", "job_1", "alba")
+    # Selection off by a few words at the edges, prompt differing only in case and punctuation
+    shifted = "In short, " + PASSAGE.rsplit(" ", 3)[0]
+    entry, similarity = cache.lookup("gemini|helpful||", shifted, "what does this mean")
+    assert entry is not None and entry.answer == "Plants make food from light." and similarity >= 0.7
+    assert entry.job_id == "job_1" and entry.hits == 1
+
+
+def test_different_question_scope_or_persona_misses():
+    cache = AnswerCache(threshold=0.7, persona_threshold=0.99)
+    cache.store("gemini|helpful||", PASSAGE, "What does this mean?", "answer")
+    assert cache.lookup("gemini|helpful||", PASSAGE, "Why is oxygen released?")[0] is None
+    assert cache.lookup("gemini|concise||", PASSAGE, "What does this mean?")[0] is None
+    near = PASSAGE.replace("by-product", "byproduct")
+    assert cache.lookup("gemini|helpful||", near, "What does this mean?", persona="pirate")[0] is None
+    assert cache.lookup("gemini|helpful||", near, "What does this mean?")[0] is not None
+
+
+def test_eviction_removes_entries_from_the_index():
+    cache = AnswerCache(max_entries=2)
+    for i in range(3):
+        cache.store("s", f"{PASSAGE} Variant {i}.", "What does this mean?", f"answer {i}")
+    assert len(cache) == 2
+    entry, _ = cache.lookup("s", f"{PASSAGE} Variant 0.", "What does this mean?")
+    assert entry is None or entry.answer != "answer 0"
+    cache.discard(cache.lookup("s", f"{PASSAGE} Variant 2.", "What does this mean?")[0])
+    assert len(cache) == 1
+
+
+def test_general_questions_without_text():
+    cache = AnswerCache(threshold=0.9)
+    cache.store("s", "", "What is the capital of France?", "Paris.")
+    assert cache.lookup("s", "", "what is the capital of france")[0].answer == "Paris."
+    assert cache.lookup("s", "", "What is the capital of Spain?")[0] is None
+
+
+def test_thresholds_and_audit_similarity():
+    assert parse_thresholds("concise=0.8, casual = 0.9,") == {"concise": 0.8, "casual": 0.9}
+    cache = AnswerCache(threshold=0.85, tone_thresholds={"concise": 0.8}, persona_threshold=0.95)
+    assert cache.threshold_for("concise", None) == 0.8
+    assert cache.threshold_for("concise", "pirate") == 0.95
+    assert answer_similarity("Plants make food from light.", "plants make food from light") == 1.0
+    assert answer_similarity("Plants make food from light.", "Rome ruled the Mediterranean.") < 0.3
+
+
+def test_prompts_differing_in_one_key_word_miss():
+    cache = AnswerCache(threshold=0.85, tone_thresholds={"concise": 0.8})
+    cache.store("s", PASSAGE, "What were the economic causes of the war?", "causes")
+    cache.store("s", PASSAGE, "Translate this paragraph into French", "en francais")
+    assert cache.lookup("s", PASSAGE, "What were the economic consequences of the war?")[0] is None
+    assert cache.lookup("s", PASSAGE, "Translate this paragraph into German", tone="concise")[0] is None
+    assert cache.lookup("s", PASSAGE, "what were the economic causes of the war")[0].answer == "causes"
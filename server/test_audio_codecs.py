@@ -0,0 +1,87 @@
+# server/test_audio_codecs.py
+import gc
+import io
+import wave
+
+import numpy as np
+import pytest
+
+import audio_codecs
+from audio_codecs import make_encoder, negotiate_format
+
+
+def test_explicit_format_wins_over_accept():
+    assert negotiate_format("audio/flac", "wav16k") == "wav16k"
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        negotiate_format(None, "mp3")
+
+
+def test_wildcards_keep_wav(monkeypatch):
+    monkeypatch.setattr(audio_codecs, "available_formats", lambda: ["wav", "wav16k", "opus", "flac"])
+    assert negotiate_format("*/*") == "wav"
+    assert negotiate_format("audio/*;q=0.9, */*;q=0.5") == "wav"
+    assert negotiate_format(None) == "wav"
+
+
+def test_accept_quality_and_preference(monkeypatch):
+    monkeypatch.setattr(audio_codecs, "available_formats", lambda: ["wav", "wav16k", "opus", "flac"])
+    assert negotiate_format("audio/wav, audio/flac;q=0.8") == "wav"
+    assert negotiate_format("audio/wav, audio/ogg, audio/flac") == "opus"
+    assert negotiate_format("audio/ogg;q=0") == "wav"
+
+
+def test_unavailable_format_falls_back_to_wav(monkeypatch):
+    monkeypatch.setattr(audio_codecs, "available_formats", lambda: ["wav", "wav16k"])
+    assert negotiate_format("audio/ogg", "opus") == "wav"
+
+
+def test_pcm_encoder_streams_and_spools_a_complete_wav():
+    encoder = make_encoder("wav16k", 24000)
+    streamed = b"".join(encoder.write(np.zeros(24000, dtype=np.int16)) for _ in range(3))
+    streamed += encoder.finish()
+    spooled = b"".join(encoder.blocks())
+    encoder.close()
+
+    assert len(streamed) == len(spooled)
+    with wave.open(io.BytesIO(spooled), "rb") as wf:
+        assert wf.getframerate() == 16000
+        assert wf.getnframes() == 48000
+
+
+def test_opus_encoder_output_decodes():
+    sf = pytest.importorskip("soundfile")
+    if "opus" not in audio_codecs.available_formats():
+        pytest.skip("libsndfile without Opus")
+    encoder = make_encoder("opus", 24000)
+    tone = (np.sin(np.arange(24000) * 0.05) * 8000).astype(np.int16)
+    streamed = b"".join(encoder.write(tone) for _ in range(2)) + encoder.finish()
+    encoder.close()
+
+    data, rate = sf.read(io.BytesIO(streamed))
+    assert rate == 24000
+    assert len(data) == 48000
+    assert len(streamed) < 48000 * 2 / 5
+
+
+# libsndfile writing its trailer into a closed spool only shows up at garbage collection
+@pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+def test_abandoned_encoder_closes_cleanly():
+    pytest.importorskip("soundfile")
+    if "opus" not in audio_codecs.available_formats():
+        pytest.skip("libsndfile without Opus")
+    encoder = make_encoder("opus", 24000)
+    encoder.write(np.zeros(24000, dtype=np.int16))
+    encoder.close() # Client went away before finish()
+    del encoder
+    gc.collect()
+
+
+def test_progressive_responses_never_stream_flac(monkeypatch):
+    monkeypatch.setattr(audio_codecs, "available_formats", lambda: ["wav", "wav16k", "opus", "flac"])
+    assert audio_codecs.streamable_format("opus") == "opus"
+    assert audio_codecs.streamable_format("flac") == "opus"
+    monkeypatch.setattr(audio_codecs, "available_formats", lambda: ["wav", "wav16k", "flac"])
+    assert audio_codecs.streamable_format("flac") == "wav16k"
@@ -0,0 +1,65 @@
+# server/test_audio_http.py
+import pytest
+
+from audio_http import RangeNotSatisfiable, etag_matches, if_range_matches, parse_range
+
+
+def test_parse_range_forms():
+    assert parse_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_range("bytes=500-", 1000) == (500, 999)
+    assert parse_range("bytes=-100", 1000) == (900, 999)
+    assert parse_range("bytes=900-5000", 1000) == (900, 999)
+
+
+def test_parse_range_ignores_what_it_cannot_serve():
+    assert parse_range(None, 1000) is None
+    assert parse_range("bytes=0-1,5-6", 1000) is None
+    assert parse_range("items=0-1", 1000) is None
+    assert parse_range("bytes=9-3", 1000) is None
+
+
+def test_parse_range_past_the_end():
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=1000-", 1000)
+
+
+def test_parse_range_unknown_length():
+    assert parse_range("bytes=200-", None) == (200, None)
+    assert parse_range("bytes=-100", None) is None
+
+
+def test_etag_matching():
+    assert etag_matches('"a", "b"', '"b"')
+    assert etag_matches('W/"b"', '"b"')
+    assert etag_matches("*", '"b"')
+    assert not etag_matches('"a"', '"b"')
+    assert not etag_matches(None, '"b"')
+
+
+def test_if_range_needs_a_strong_match():
+    assert if_range_matches('"b"', '"b"')
+    assert not if_range_matches('W/"b"', '"b"')
+    assert not if_range_matches("*", '"b"')
+    assert not if_range_matches('"a", "b"', '"b"')
+    assert not if_range_matches("Tue, 20 Oct 2026 07:28:00 GMT", '"b"')
+
+
+def test_weak_if_range_gets_the_full_body():
+    from fastapi import FastAPI, Request
+    from fastapi.testclient import TestClient
+
+    from audio_http import CACHE_IMMUTABLE, cached_file_response
+
+    body = bytes(range(100))
+    app = FastAPI()
+
+    @app.get("/audio")
+    def audio(request: Request):
+        return cached_file_response(request, len(body), lambda start, end: iter([body[start:end]]),
+                                    "audio/wav", '"b"', CACHE_IMMUTABLE)
+
+    client = TestClient(app)
+    ranged = client.get("/audio", headers={"range": "bytes=10-19", "if-range": '"b"'})
+    assert ranged.status_code == 206 and ranged.content == body[10:20]
+    weak = client.get("/audio", headers={"range": "bytes=10-19", "if-range": 'W/"b"'})
+    assert weak.status_code == 200 and weak.content == body
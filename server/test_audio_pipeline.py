@@ -0,0 +1,118 @@
+# server/test_audio_pipeline.py
+import asyncio
+import contextlib
+import tracemalloc
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from audio_pipeline import WavFileWriter, assemble_wav, synthesize_ordered
+
+SAMPLE_RATE = 24000
+CHUNK_SAMPLES = 48000  # 2 seconds, ~96 KB of int16
+CHUNK_COUNT = 40
+
+
+class FakeTTS:
+    model_version = "fake"
+    sample_rate = SAMPLE_RATE
+
+    def generate_speech(self, text, voice="alba", use_cuda=False):
+        return np.full(CHUNK_SAMPLES, len(text), dtype=np.int16)
+
+
+def _gate():
+    return contextlib.AsyncExitStack()
+
+
+async def _render(save_path, progressive=False, emit=False):
+    chunks = [f"chunk {i}" for i in range(CHUNK_COUNT)]
+    with ThreadPoolExecutor(2) as executor:
+        audio_iter = synthesize_ordered(FakeTTS(), chunks, "alba", False, executor, 2, _gate)
+        sent = 0
+        async for block in assemble_wav(audio_iter, SAMPLE_RATE, WavFileWriter(save_path, SAMPLE_RATE),
+                                        progressive=progressive, emit=emit):
+            sent += len(block)
+        return sent
+
+
+def test_peak_memory_is_bounded_by_a_few_chunks(tmp_path):
+    path = tmp_path / "job.wav"
+    chunk_bytes = CHUNK_SAMPLES * 2
+
+    tracemalloc.start()
+    try:
+        asyncio.run(_render(path))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # The whole job is 40 chunks; assembly must not hold more than the lookahead window
+    # (and the chunk being written to disk meanwhile)
+    assert peak < chunk_bytes * 8
+
+    with wave.open(str(path), "rb") as wf:
+        assert wf.getframerate() == SAMPLE_RATE
+        assert wf.getnframes() == CHUNK_SAMPLES * CHUNK_COUNT
+
+
+def test_progressive_stream_matches_saved_file(tmp_path):
+    path = tmp_path / "job.wav"
+    sent = asyncio.run(_render(path, progressive=True, emit=True))
+    assert sent == path.stat().st_size
+    assert not path.with_suffix(".part").exists()
+
+
+def test_sink_io_runs_off_the_event_loop(tmp_path):
+    import threading
+
+    class RecordingSink(WavFileWriter):
+        def __init__(self, *args):
+            super().__init__(*args)
+            self.threads = set()
+
+        def write(self, audio):
+            self.threads.add(threading.get_ident())
+            super().write(audio)
+
+        def close(self):
+            self.threads.add(threading.get_ident())
+            return super().close()
+
+    async def scenario():
+        async def audio():
+            for _ in range(3):
+                yield np.ones(100, dtype=np.int16)
+
+        sink = RecordingSink(tmp_path / "job.wav", SAMPLE_RATE)
+        blocks = [block async for block in assemble_wav(audio(), SAMPLE_RATE, sink, progressive=True)]
+        return sink.threads, threading.get_ident(), blocks
+
+    threads, loop_thread, blocks = asyncio.run(scenario())
+    assert threads and loop_thread not in threads
+    assert all(isinstance(block, memoryview) for block in blocks[1:]) # PCM is not copied
+
+
+def test_live_render_is_readable_while_in_progress(tmp_path):
+    from audio_pipeline import LiveRender
+    from audio_store import AudioStore
+
+    async def scenario():
+        live = LiveRender(AudioStore(tmp_path).writer("job_1", SAMPLE_RATE), SAMPLE_RATE)
+        live.write(np.ones(100, dtype=np.int16))
+        partial = await live.read(40, 1000)
+
+        async def finish():
+            await asyncio.sleep(0)
+            live.write(np.ones(100, dtype=np.int16))
+            live.close()
+
+        asyncio.create_task(finish())
+        followed = b"".join([block async for block in live.follow()])
+        return partial, followed
+
+    partial, followed = asyncio.run(scenario())
+    assert len(partial) == 44 + 200 - 40
+    assert len(followed) == 44 + 400
+    assert followed[40:len(partial) + 40] == partial
@@ -0,0 +1,101 @@
+# server/test_audio_store.py
+import io
+import wave
+
+import numpy as np
+
+from audio_store import AudioStore
+
+SAMPLE_RATE = 24000
+
+
+def _tone(value, samples=2400):
+    return np.full(samples, value, dtype=np.int16)
+
+
+def _wav(store, key, start=0, end=None):
+    return b"".join(store.iter_audio(key, start, end))
+
+
+def test_served_audio_is_a_complete_wav(tmp_path):
+    store = AudioStore(tmp_path)
+    writer = store.writer("job_1", SAMPLE_RATE)
+    writer.write(_tone(1))
+    writer.write(_tone(2))
+    writer.close()
+
+    data = _wav(store, "job_1")
+    assert len(data) == store.size("job_1")
+    with wave.open(io.BytesIO(data), "rb") as wf:
+        assert wf.getframerate() == SAMPLE_RATE
+        assert wf.getnframes() == 4800
+    assert _wav(store, "job_1", 40, 48) == data[40:48]
+
+
+def test_index_is_rebuilt_after_restart(tmp_path):
+    store = AudioStore(tmp_path)
+    store.put("tts_a", _tone(1), SAMPLE_RATE)
+    store.put("tts_b", _tone(2), SAMPLE_RATE)
+    store.put("tts_a", _tone(3), SAMPLE_RATE)
+    store.delete("tts_b")
+
+    reopened = AudioStore(tmp_path)
+    assert "tts_b" not in reopened
+    assert (reopened.read_pcm("tts_a") == 3).all()
+
+
+def test_torn_record_is_truncated_on_load(tmp_path):
+    store = AudioStore(tmp_path)
+    store.put("tts_a", _tone(1), SAMPLE_RATE)
+    segment = next(tmp_path.glob("segment_*.dat"))
+    good_size = segment.stat().st_size
+    with open(segment, "ab") as f:
+        f.write(b"LAS1 partial")
+
+    reopened = AudioStore(tmp_path)
+    assert "tts_a" in reopened
+    assert segment.stat().st_size == good_size
+
+
+def test_compaction_reclaims_dead_segments(tmp_path):
+    store = AudioStore(tmp_path, segment_bytes=10_000)
+    for i in range(6):
+        store.put(f"tts_{i}", _tone(i), SAMPLE_RATE)
+    for i in range(5):
+        store.delete(f"tts_{i}")
+    before = store.stats()["segments"]
+    etag = store.etag("tts_5")
+
+    assert store.compact() > 0
+    assert store.etag("tts_5") == etag
+    assert store.stats()["segments"] < before
+    assert (store.read_pcm("tts_5") == 5).all()
+
+    reopened = AudioStore(tmp_path)
+    assert len(reopened) == 1
+    assert (reopened.read_pcm("tts_5") == 5).all()
+
+
+def test_compaction_never_writes_back_over_a_newer_render(tmp_path, monkeypatch):
+    import threading
+
+    store = AudioStore(tmp_path, segment_bytes=10_000)
+    store.put("tts_live", _tone(1), SAMPLE_RATE)
+    for i in range(3):
+        store.put(f"tts_{i}", _tone(i), SAMPLE_RATE)
+        store.delete(f"tts_{i}")
+    append = store._append
+    writers = []
+
+    def racing_append(key, *args, **kwargs):
+        if key == "tts_live" and threading.current_thread() is threading.main_thread():
+            # A new render of the key lands while compaction moves the old one
+            writers.append(threading.Thread(target=store.put, args=("tts_live", _tone(7), SAMPLE_RATE)))
+            writers[0].start()
+            writers[0].join(0.2)
+        append(key, *args, **kwargs)
+
+    monkeypatch.setattr(store, "_append", racing_append)
+    store.compact()
+    writers[0].join()
+    assert (store.read_pcm("tts_live") == 7).all()
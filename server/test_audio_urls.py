@@ -0,0 +1,42 @@
+# server/test_audio_urls.py
+import pytest
+from fastapi.testclient import TestClient
+
+import audio_codecs
+
+TEXT = "Osmosis is water crossing a membrane."
+
+
+@pytest.fixture
+def client(server, monkeypatch):
+    monkeypatch.setattr(audio_codecs, "available_formats", lambda: ["wav", "wav16k", "opus", "flac"])
+    return TestClient(server.app)
+
+
+def test_audio_urls_are_named_for_their_format(client):
+    opus_url = client.post("/api/tts", json={"text": TEXT, "format": "opus"}).json()["audioUrl"]
+    assert opus_url.endswith(".opus")
+    response = client.get(opus_url)
+    assert response.status_code == 200 and response.headers["content-type"].startswith("audio/ogg")
+
+    wav_url = client.post("/api/tts", json={"text": TEXT}).json()["audioUrl"]
+    assert wav_url == opus_url[:-len(".opus")] + ".wav"
+    assert client.post("/api/tts", json={"text": TEXT, "format": "wav16k"}).json()["audioUrl"] == wav_url + "?format=wav16k"
+
+
+def test_mismatched_extension_redirects_to_the_matching_name(client):
+    wav_url = client.post("/api/tts", json={"text": TEXT}).json()["audioUrl"]
+    response = client.get(wav_url + "?format=opus", follow_redirects=False)
+    assert response.status_code == 307
+    assert response.headers["location"] == wav_url[:-len(".wav")] + ".opus"
+    # Accept negotiation too: a .wav name is never Opus bytes
+    response = client.get(wav_url, headers={"Accept": "audio/ogg"}, follow_redirects=False)
+    assert response.headers["location"].endswith(".opus")
+    assert client.get(wav_url, headers={"Accept": "audio/ogg"}).headers["content-type"].startswith("audio/ogg")
+
+
+def test_progressive_flac_request_streams_opus(client):
+    response = client.post("/api/tts", json={"text": TEXT, "format": "flac", "stream": True})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("audio/ogg")
+    assert response.content.startswith(b"OggS")
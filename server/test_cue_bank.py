@@ -0,0 +1,59 @@
+# server/test_cue_bank.py
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+
+
+def _render(server, voice, key="cue"):
+    tts = server._handlers["tts"]
+    server.cue_bank.get(tts, voice, key)
+    return server.cue_bank.path_for(tts, voice, key).read_bytes()
+
+
+def test_cue_is_served_in_the_requested_voice(server):
+    server._handlers["tts"].voice_cache["marius"] = None
+    _render(server, "alba")
+    marius = _render(server, "marius")
+    response = TestClient(server.app).get("/api/audio/cue.wav", params={"voice": "marius"})
+    assert response.status_code == 200 and response.content == marius
+
+
+def test_missing_variant_falls_back_to_the_default_voice_and_is_queued(server):
+    tts = server._handlers["tts"]
+    tts.voice_cache["marius"] = None
+    alba = _render(server, "alba")
+    tts.calls.clear()
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/api/audio/cue.wav", params={"voice": "marius"})
+            again = await client.get("/api/audio/cue.wav", params={"voice": "marius"})
+        await asyncio.gather(*server._phrase_render_tasks)
+        return response, again
+
+    response, again = asyncio.run(run())
+    assert response.content == again.content == alba
+    # Rendered in the background, each cue once however often it was asked for
+    assert sorted(tts.calls) == sorted(server.cue_bank.phrases.values())
+    assert server.cue_bank.path_for(tts, "marius", "cue").exists()
+    assert not server._phrase_render_pending
+
+
+def test_unknown_voices_get_the_default_without_a_render(server):
+    alba = _render(server, "alba")
+    response = TestClient(server.app).get("/api/audio/cue.wav", params={"voice": "not-a-voice"})
+    assert response.content == alba and not server._phrase_render_tasks
+
+
+def test_shipped_cue_files_are_the_last_fallback_and_survive_cleanup(server):
+    server._handlers["tts"].voice_cache.clear() # No voice loaded yet, so nothing gets queued
+    client = TestClient(server.app)
+    assert client.get("/api/audio/ready.wav").status_code == 404
+    (server.AUDIO_DIR / "ready.wav").write_bytes(b"RIFF shipped")
+    (server.AUDIO_DIR / "job_1.wav").write_bytes(b"RIFF old answer")
+    assert client.get("/api/audio/ready.wav").content == b"RIFF shipped"
+
+    server.cleanup_audio_files()
+    assert sorted(p.name for p in server.AUDIO_DIR.glob("*.wav")) == ["ready.wav"]
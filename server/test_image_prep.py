@@ -0,0 +1,52 @@
+# server/test_image_prep.py
+import io
+
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image, ImageDraw
+
+from image_prep import ImagePreprocessor, ImageProfile, crop_uniform_border, dhash, hamming
+from image_store import ImageData
+
+
+def _screenshot(width=2560, height=1440, shift=0) -> bytes:
+    image = Image.new("RGB", (width, height), "white")
+    # A photo-like region: what makes real screenshots expensive as PNG
+    image.paste(Image.effect_noise((width // 3, height // 3), 30).convert("RGB"), (width // 2, height // 2))
+    draw = ImageDraw.Draw(image)
+    for row in range(40):
+        draw.rectangle((200 + shift, 100 + row * 30, 1800 + shift, 110 + row * 30), fill=(row * 5, 40, 90))
+    out = io.BytesIO()
+    image.save(out, "PNG")
+    return out.getvalue()
+
+
+def test_downscales_and_reencodes():
+    png = ImageData(_screenshot(), "image/png")
+    images, report = ImagePreprocessor().prepare([png], ImageProfile(1536, "JPEG", 80))
+    assert report.bytes_out < report.bytes_in
+    assert images[0].media_type == "image/jpeg"
+    with Image.open(io.BytesIO(images[0].data)) as result:
+        assert max(result.size) <= 1536
+
+
+def test_near_identical_screenshots_are_dropped():
+    first = ImageData(_screenshot(), "image/png")
+    again = ImageData(_screenshot(shift=2), "image/png")
+    images, report = ImagePreprocessor().prepare([first, again], ImageProfile(1536, "JPEG", 80))
+    assert len(images) == 1 and report.duplicates == 1
+
+
+def test_no_profile_passes_images_through():
+    png = ImageData(_screenshot(400, 300), "image/png")
+    images, report = ImagePreprocessor().prepare([png], None)
+    assert images == [png] and report.bytes_out == report.bytes_in
+
+
+def test_crop_and_hash_helpers():
+    image = Image.new("RGB", (500, 400), "white")
+    ImageDraw.Draw(image).rectangle((100, 100, 300, 200), fill="black")
+    cropped = crop_uniform_border(image)
+    assert cropped.size == (217, 117)
+    assert hamming(dhash(image), dhash(image)) == 0
@@ -0,0 +1,33 @@
+# server/test_image_store.py
+import base64
+
+from image_store import ImageCache, ImageData, decode_image, sniff_media_type
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 100
+
+
+def test_sniff_media_type():
+    assert sniff_media_type(PNG) == "image/png"
+    assert sniff_media_type(JPEG) == "image/jpeg"
+    assert sniff_media_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+    assert sniff_media_type(b"<html>") is None
+
+
+def test_decode_image_accepts_data_urls_and_missing_padding():
+    b64 = base64.b64encode(JPEG).decode()
+    image = decode_image(f"data:image/jpeg;base64,{b64.rstrip('=')}")
+    assert image.data == JPEG and image.media_type == "image/jpeg"
+    assert image.digest == ImageData(JPEG, "image/jpeg").digest
+    assert decode_image("") is None
+    assert decode_image("!!!") is None
+
+
+def test_cache_evicts_least_recently_used_by_bytes():
+    cache = ImageCache(max_bytes=250)
+    first = cache.put(ImageData(PNG + b"1", "image/png"))
+    second = cache.put(ImageData(PNG + b"2", "image/png"))
+    cache.get(first) # first is now the most recent
+    third = cache.put(ImageData(PNG + b"3", "image/png"))
+    assert first in cache and third in cache and second not in cache
+    assert cache.size <= 250
@@ -0,0 +1,80 @@
+# server/test_jobs.py
+import asyncio
+
+import jobs
+from jobs import JobStore
+
+
+def test_eta_extrapolates_from_finished_chunks():
+    store = JobStore()
+    job = store.create("job_1")
+    assert job.eta() is None
+    store.update("job_1", state=jobs.TTS)
+    store.progress("job_1", 2, 6)
+    job.tts_started -= 4.0 # two chunks took four seconds
+    assert abs(job.eta() - 8.0) < 0.1
+    store.update("job_1", state=jobs.DONE)
+    assert job.eta() == 0.0 and job.terminal
+
+
+def test_long_poll_wakes_on_update_and_times_out():
+    async def scenario():
+        store = JobStore()
+        job = store.create("job_1")
+        version = job.version
+        asyncio.get_running_loop().call_later(0.05, lambda: store.update("job_1", state=jobs.LLM))
+        woken = await store.wait(job, version, timeout=5)
+        timed_out = await store.wait(job, None, timeout=0.05)
+        return woken.state, timed_out.version - version
+
+    state, versions = asyncio.run(scenario())
+    assert state == jobs.LLM
+    assert versions == 1
+
+
+def test_expire_drops_old_jobs():
+    store = JobStore(ttl=10)
+    job = store.create("job_1")
+    store.create("job_2").created += 20
+    assert store.expire(job.created + 15) == 1
+    assert "job_1" not in store and "job_2" in store
+    store.update("job_1", state=jobs.DONE) # unknown ids are ignored
+
+
+def test_generate_reports_llm_while_the_answer_is_written_then_tts(server, monkeypatch):
+    import threading
+
+    import httpx
+
+    from conftest import StubLLM
+
+    class HeldLLM(StubLLM):
+        release = threading.Event()
+
+        def generate_answer_stream(self, **request):
+            self.release.wait(5)
+            yield from super().generate_answer_stream(**request)
+
+    llm = HeldLLM()
+    monkeypatch.setitem(server._handlers, "llm", llm)
+    query = {"text": "Osmosis.", "prompt": "What is it?", "shouldAudio": True, "jobId": "job_client_1", "audioFormat": "opus"}
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            generating = asyncio.create_task(client.post("/api/generate", json=query))
+            while "job_client_1" not in server.job_store:
+                await asyncio.sleep(0.01)
+            during = (await client.get("/api/jobs/job_client_1")).json()["state"]
+            llm.release.set()
+            answer = (await generating).json()
+            polled = (await client.get("/api/jobs/job_client_1")).json()
+            after = polled["state"]
+            reused_id = await client.post("/api/generate", json=query)
+        return during, answer, after, polled, reused_id.status_code
+
+    during, answer, after, polled, reused_id_status = asyncio.run(run())
+    assert (during, after) == (jobs.LLM, jobs.TTS)
+    assert answer["jobId"] == "job_client_1" and answer["audioUrl"] == "/api/stream/job_client_1?format=opus"
+    assert polled["audioUrl"] == answer["audioUrl"] # Polling hands back the same format
+    assert reused_id_status == 400 # Ids are single-use
@@ -0,0 +1,95 @@
+# server/test_llm_replay.py
+import time
+
+from llm_handler import LLMHandler, ReplayProvider
+from llm_replay import Recordings, replay, request_key
+
+
+class PacedProvider:
+    """Stands in for a live provider: a pause before each chunk."""
+    model = "paced-1"
+    vision = True
+    fast = False
+
+    def __init__(self, chunks=("Well... ", "it diffuses ", "across the membrane."), pause=0.02):
+        self.chunks = chunks
+        self.pause = pause
+
+    def generate_stream(self, prompt, images, api_key, tone, history=None, custom_persona=None, max_tokens=None):
+        for chunk in self.chunks:
+            time.sleep(self.pause)
+            yield chunk
+
+
+def _handler():
+    handler = LLMHandler()
+    handler.default_key = None # No fallback to a live Gemini
+    return handler
+
+
+def _ask(handler, provider, prompt="What is osmosis?"):
+    return "".join(handler.generate_answer_stream("Osmosis is the movement of water.", prompt, provider=provider,
+                                                  tone="concise", api_keys={"groq": "key"}))
+
+
+def test_recorded_stream_replays_offline_with_its_pacing(tmp_path):
+    path = tmp_path / "replay.json"
+    recorder = _handler()
+    recorder.providers["groq"] = PacedProvider()
+    recorder.recordings = Recordings(str(path))
+    assert _ask(recorder, "groq") == "Well... it diffuses across the membrane."
+
+    [recording] = Recordings(str(path))._load().values()
+    assert recording["provider"] == "groq" and recording["model"] == "paced-1"
+    assert [chunk for _, chunk in recording["chunks"]] == ["Well... ", "it diffuses ", "across the membrane."]
+    assert all(pause >= 0.015 for pause, _ in recording["chunks"])
+
+    player = _handler()
+    player.providers["replay"] = ReplayProvider(Recordings(str(path)))
+    started = time.perf_counter()
+    assert _ask(player, "replay") == "Well... it diffuses across the membrane."
+    assert time.perf_counter() - started >= 0.05
+
+    # A quarter of the pauses at four times the speed (checked against full speed, for slack on busy hosts)
+    total = sum(pause for pause, _ in recording["chunks"])
+    started = time.perf_counter()
+    assert "".join(replay(recording, speed=4)) == "Well... it diffuses across the membrane."
+    assert time.perf_counter() - started < total
+
+
+def test_long_selections_replay_under_the_prompt_they_were_recorded_with(tmp_path):
+    # Long enough to be cut to the prompt budget, where provider token ratios differ
+    text = " ".join(f"Paragraph {n}: osmosis moves water across a membrane toward the side with more solute." for n in range(600))
+    path = tmp_path / "replay.json"
+    recorder = _handler()
+    recorder.providers["groq"] = PacedProvider(pause=0)
+    recorder.recordings = Recordings(str(path))
+    "".join(recorder.generate_answer_stream(text, "What is osmosis?", provider="groq", api_keys={"groq": "key"}))
+
+    player = _handler()
+    player.providers["replay"] = ReplayProvider(Recordings(str(path))) # Strict: only an exact key replays
+    answer = "".join(player.generate_answer_stream(text, "What is osmosis?", provider="replay"))
+    assert answer == "Well... it diffuses across the membrane."
+
+
+def test_unrecorded_requests_fail_unless_replay_is_lenient(tmp_path):
+    recordings = Recordings(str(tmp_path / "replay.json"))
+    recordings.put(request_key("known", "concise"), {"chunks": [[0.0, "Recorded."]]})
+
+    strict = ReplayProvider(recordings)
+    assert "".join(strict.generate_stream("known", [], "local", "concise")) == "Recorded."
+    assert "".join(strict.generate_stream("other", [], "local", "concise")).startswith("Replay Error: No recording")
+    lenient = ReplayProvider(recordings, strict=False)
+    assert "".join(lenient.generate_stream("other", [], "local", "concise")) == "Recorded."
+
+
+def test_errors_and_abandoned_streams_are_not_recorded(tmp_path):
+    handler = _handler()
+    handler.recordings = Recordings(str(tmp_path / "replay.json"))
+    handler.providers["groq"] = PacedProvider(chunks=("Groq Error: 503",), pause=0)
+    _ask(handler, "groq")
+    handler.providers["groq"] = PacedProvider(pause=0.05)
+    stream = handler.generate_answer_stream("", "Cut short?", provider="groq", api_keys={"groq": "key"})
+    next(stream)
+    stream.close()
+    assert len(handler.recordings) == 0
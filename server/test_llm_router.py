@@ -0,0 +1,78 @@
+# server/test_llm_router.py
+import time
+
+import llm_router
+from llm_router import ProviderRouter
+
+
+class StubProvider:
+    """Stands in for a provider stream: waits delay seconds, then yields chunks (or fails)."""
+
+    def __init__(self, delay: float = 0.0, chunks=("Hello", " there."), error: str | None = None):
+        self.delay = delay
+        self.chunks = chunks
+        self.error = error
+        self.closed = False
+
+    def stream(self):
+        try:
+            time.sleep(self.delay)
+            if self.error:
+                yield self.error
+                return
+            yield from self.chunks
+        finally:
+            self.closed = True
+
+
+def _attempts(**providers):
+    return [(name, provider.stream) for name, provider in providers.items()]
+
+
+def test_falls_back_when_the_first_provider_fails_before_answering():
+    router = ProviderRouter(hedge_after=0)
+    answer = "".join(router.stream(_attempts(
+        gemini=StubProvider(error="Gemini Error: 503 overloaded"), groq=StubProvider(chunks=("Fine.",))
+    )))
+    assert answer == "Fine."
+    assert router.health("gemini").failures == 1 and router.health("groq").failures == 0
+
+
+def test_last_error_is_returned_when_every_provider_fails():
+    router = ProviderRouter(hedge_after=0)
+    answer = "".join(router.stream(_attempts(gemini=StubProvider(error="Gemini Error: down"))))
+    assert answer == "Gemini Error: down"
+
+
+def test_hedge_starts_second_provider_and_cancels_the_loser():
+    router = ProviderRouter(hedge_after=0.05)
+    slow, fast = StubProvider(delay=0.5), StubProvider(delay=0.01, chunks=("Fast", " answer."))
+    started = time.perf_counter()
+    answer = "".join(router.stream(_attempts(gemini=slow, openai=fast)))
+    assert answer == "Fast answer."
+    assert time.perf_counter() - started < 0.4
+    time.sleep(0.6)
+    assert slow.closed
+    assert router.health("gemini").ttft > router.health("openai").ttft
+
+
+def test_hedge_falls_through_immediately_on_failure():
+    router = ProviderRouter(hedge_after=5)
+    answer = "".join(router.stream(_attempts(
+        gemini=StubProvider(error="Gemini Error: quota"), claude=StubProvider(chunks=("Ok.",))
+    )))
+    assert answer == "Ok."
+
+
+def test_auto_plan_prefers_fast_healthy_providers_and_breaker_opens(monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_BREAKER_FAILURES", 2)
+    router = ProviderRouter()
+    router.record_success("gemini", 0.3)
+    router.record_success("groq", 0.1)
+    assert router.plan("auto", ["gemini", "groq", "openai"]) == ["groq", "gemini", "openai"]
+    assert router.plan("openai", ["gemini", "groq", "openai"])[0] == "openai"
+    router.record_failure("groq")
+    router.record_failure("groq")
+    assert router.health("groq").state(time.time()) == "open"
+    assert router.plan("auto", ["gemini", "groq"]) == ["gemini", "groq"]
+    assert router.health("groq").state(time.time() + llm_router.LLM_BREAKER_COOLDOWN + 1) == "half_open"
@@ -0,0 +1,42 @@
+# server/test_passages.py
+import textwrap
+
+from passages import OMISSION_MARK, get_index, select_passages, split_passages
+
+SECTIONS = {
+    "Photosynthesis": "Plants convert sunlight, water and carbon dioxide into glucose and oxygen in their chloroplasts. ",
+    "Compound Interest": "Interest is added to the principal, so later interest is earned on earlier interest as well. ",
+    "The Roman Empire": "Rome grew from a city state into an empire that ruled the Mediterranean for centuries. ",
+}
+
+
+def _document(repeat: int = 8) -> str:
+    return "\n\n".join(f"## {heading}\n\n" + body * repeat for heading, body in SECTIONS.items())
+
+
+def test_passages_carry_their_section_heading():
+    passages = split_passages(_document())
+    assert {p.heading for p in passages} == set(SECTIONS)
+    assert all(len(p.text) <= 600 for p in passages)
+
+
+def test_selection_keeps_relevant_section_under_its_heading():
+    selected = select_passages(_document(), "How does compound interest grow the principal?", budget=150)
+    assert "## Compound Interest" in selected
+    assert "chloroplasts" not in selected and "Mediterranean" not in selected
+    assert selected.startswith(OMISSION_MARK) and selected.endswith(OMISSION_MARK)
+
+
+def test_index_is_cached_by_text():
+    document = _document()
+    assert get_index(document) is get_index(document[:] + "")
+    assert get_index(document) is not get_index(document + " more")
+
+
+def test_hard_wrapped_lines_stay_in_the_body():
+    body = " ".join(body * 6 for body in SECTIONS.values())
+    document = "Field Notes\n\n" + textwrap.fill(body, width=60) + "\n\nRetrieved from a mailing list\n"
+    passages = split_passages(document)
+    kept = "".join(p.text for p in passages).replace("\n", "").replace(" ", "")
+    assert kept == body.replace(" ", "")
+    assert {p.heading for p in passages} == {"Field Notes"}
@@ -0,0 +1,49 @@
+# server/test_phrase_bank.py
+import numpy as np
+
+from conftest import StubTTS
+from phrase_bank import OPENERS, PhraseBank, split_opener, voice_dir_name
+
+
+def test_openers_split_only_before_an_ellipsis():
+    assert split_opener("Oh... it diffuses.") == ("oh", "it diffuses.")
+    assert split_opener("  great question… Water moves.") == ("great_question", "Water moves.")
+    assert split_opener("You know.. it evens out.") == ("you_know", "it evens out.")
+    for text in ("So, the answer is yes.", "Oh, right.", "So the answer is...", "Okay"):
+        assert split_opener(text) == (None, text)
+
+
+def test_phrases_render_once_and_persist_per_model_and_voice(tmp_path):
+    tts = StubTTS()
+    bank = PhraseBank(tmp_path, OPENERS)
+    audio = bank.get(tts, "alba", "well")
+    assert audio.dtype == np.int16
+    assert bank.get(tts, "alba", "well") is audio
+    assert tts.calls == ["Well..."]
+    assert (tmp_path / "stub" / voice_dir_name("alba") / "well.wav").exists()
+
+    # A restart reads the file instead of synthesizing again
+    fresh = PhraseBank(tmp_path, OPENERS)
+    assert np.array_equal(fresh.get(tts, "alba", "well"), audio)
+    assert tts.calls == ["Well..."]
+
+    tts.model_version = "stub-2"
+    assert not fresh.is_ready(tts, "alba", "well")
+
+
+def test_missing_lists_unrendered_phrases_and_voice_names_stay_path_safe(tmp_path):
+    tts = StubTTS()
+    bank = PhraseBank(tmp_path, {"oh": "Oh...", "hmm": "Hmm..."})
+    bank.get(tts, "../custom voice", "oh")
+    assert bank.path_for(tts, "../custom voice", "oh").parent.name.startswith("___custom_voice_")
+    # Ids that read the same once made path-safe still get their own clips
+    assert bank.path_for(tts, "a.b", "oh") != bank.path_for(tts, "a/b", "oh")
+    assert bank.missing(tts, ["../custom voice", "alba"]) == [("../custom voice", "hmm"), ("alba", "oh"), ("alba", "hmm")]
+
+
+def test_unavailable_model_output_is_never_persisted(tmp_path):
+    tts = StubTTS()
+    tts.is_available = False # generate_speech returns the fallback beep
+    bank = PhraseBank(tmp_path, OPENERS)
+    bank.get(tts, "alba", "oh")
+    assert not bank.path_for(tts, "alba", "oh").exists()
@@ -0,0 +1,39 @@
+# server/test_playlist.py
+from playlist import render_m3u8, segment_id
+
+
+def test_segment_ids_are_content_addressed():
+    a = segment_id("pocket-tts-1", "alba", "chunk", "Entropy measures disorder.")
+    assert a == segment_id("pocket-tts-1", "alba", "chunk", "Entropy measures disorder.")
+    assert a != segment_id("pocket-tts-1", "marius", "chunk", "Entropy measures disorder.")
+    assert a != segment_id("pocket-tts-2", "alba", "chunk", "Entropy measures disorder.")
+    assert a.startswith("seg_")
+
+
+def test_m3u8_lists_segments_in_order():
+    text = render_m3u8([("/api/segments/seg_a.wav", 1.2), ("/api/segments/seg_b.wav", 3.5)])
+    lines = text.splitlines()
+    assert lines[0] == "#EXTM3U"
+    assert not any(line.startswith("#EXT-X-") for line in lines) # Not an HLS playlist
+    assert lines.index("/api/segments/seg_a.wav") < lines.index("/api/segments/seg_b.wav")
+    assert "#EXTINF:1.200," in lines
+
+
+def test_playlist_waits_for_the_answer_text(server):
+    import jobs
+    from fastapi.testclient import TestClient
+
+    client = TestClient(server.app)
+    server.job_store.create("job_writing", server.GenerateRequest(text="", prompt="Why?"), state=jobs.LLM)
+    response = client.get("/api/stream/job_writing?playlist=m3u8")
+    assert response.status_code == 202 and response.headers["retry-after"] == "1"
+    assert response.json() == {"jobId": "job_writing", "state": "llm"}
+
+    server.job_store.update("job_writing", state=jobs.FAILED)
+    assert client.get("/api/stream/job_writing?playlist=json").status_code == 404
+
+    request = server.GenerateRequest(text="", prompt="Why?", preGeneratedText="Because it is. That is all.")
+    server.job_store.create("job_written", request, state=jobs.TTS)
+    response = client.get("/api/stream/job_written", headers={"accept": "audio/x-mpegurl"})
+    assert response.headers["content-type"].startswith("audio/x-mpegurl")
+    assert response.text.startswith("#EXTM3U") and "/api/segments/seg_" in response.text
@@ -0,0 +1,42 @@
+# server/test_prompt_budget.py
+from prompt_budget import TRUNCATION_MARK, budget_history, compact_message, estimate_tokens, truncate_to_tokens
+
+ANSWER = "Entropy measures disorder. " * 40
+
+
+def _history(turns: int) -> list[dict]:
+    history = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": f"Question {turn}?"})
+        history.append({"role": "assistant", "content": ANSWER, "audioUrl": "/api/stream/job_1"})
+    return history
+
+
+def test_recent_turns_stay_verbatim_and_older_ones_are_compacted():
+    result = budget_history(_history(5), budget=100000, verbatim=4)
+    assert len(result.history) == 10 and result.dropped == 0
+    assert result.history[-1]["content"] == ANSWER
+    assert result.history[1]["content"].endswith(TRUNCATION_MARK)
+    assert result.compacted == 3
+    assert set(result.history[1]) == {"role", "content"}
+
+
+def test_oldest_turns_are_dropped_to_fit_the_budget():
+    result = budget_history(_history(20), budget=800, verbatim=4)
+    assert result.tokens <= 800
+    assert result.dropped > 0
+    assert result.history[0]["role"] == "user"
+    assert result.history[-1]["content"] == ANSWER
+
+
+def test_compaction_keeps_whole_leading_sentences():
+    short = compact_message(ANSWER, limit=60)
+    assert short == "Entropy measures disorder. Entropy measures disorder." + TRUNCATION_MARK
+    assert compact_message(short, limit=60) == short
+
+
+def test_truncate_to_tokens():
+    text = "word " * 1000
+    cut = truncate_to_tokens(text, 100)
+    assert estimate_tokens(cut) <= 100 and cut.endswith(TRUNCATION_MARK)
+    assert truncate_to_tokens("short", 100) == "short"
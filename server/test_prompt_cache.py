@@ -0,0 +1,124 @@
+# server/test_prompt_cache.py
+from types import SimpleNamespace
+
+import anthropic
+import openai
+
+import llm_handler
+from llm_handler import ClaudeProvider, GeminiProvider, OpenAIProvider, get_system_instructions
+from metrics import metrics
+
+HISTORY = [{"role": "user", "content": "What is osmosis?"}, {"role": "assistant", "content": "Water moving across a membrane."}]
+
+
+class RecordedOpenAI:
+    """Stands in for the OpenAI client: records each request and replays a recorded stream."""
+    requests = []
+
+    def __init__(self, **kwargs):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **request):
+        RecordedOpenAI.requests.append(request)
+        delta = lambda text: SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+        usage = SimpleNamespace(prompt_tokens=1200, prompt_tokens_details=SimpleNamespace(cached_tokens=1024))
+        return iter([delta("Well... "), delta("it diffuses."), SimpleNamespace(choices=[], usage=usage)])
+
+
+class RecordedAnthropic:
+    requests = []
+
+    def __init__(self, **kwargs):
+        self.messages = SimpleNamespace(stream=self.stream)
+
+    def stream(self, **request):
+        RecordedAnthropic.requests.append(request)
+        usage = SimpleNamespace(input_tokens=50, cache_read_input_tokens=1100, cache_creation_input_tokens=0)
+        message = SimpleNamespace(usage=usage)
+
+        class Stream:
+            text_stream = iter(["It diffuses."])
+            def __enter__(self): return self
+            def __exit__(self, *exc): return False
+            def get_final_message(self): return message
+        return Stream()
+
+
+def _counter(name):
+    return metrics.snapshot()["counters"].get(name, 0)
+
+
+def test_openai_requests_share_a_stable_prefix_and_report_cached_tokens(monkeypatch):
+    monkeypatch.setattr(openai, "OpenAI", RecordedOpenAI)
+    RecordedOpenAI.requests = []
+    cached_before = _counter("prompt.openai.cached_tokens")
+
+    provider = OpenAIProvider()
+    assert "".join(provider.generate_stream("SELECTED TEXT:\nA\n\nUSER QUESTION: why?", [], "key", "helpful", HISTORY)) == "Well... it diffuses."
+    "".join(provider.generate_stream("SELECTED TEXT:\nB\n\nUSER QUESTION: how?", [], "key", "helpful", HISTORY))
+
+    first, second = (request["messages"] for request in RecordedOpenAI.requests)
+    assert first[0] == {"role": "system", "content": get_system_instructions("helpful")}
+    assert first[:3] == second[:3] # System instructions and history, byte for byte
+    assert first[3]["role"] == "user" and first[3] != second[3]
+    assert RecordedOpenAI.requests[0]["stream_options"] == {"include_usage": True}
+    assert _counter("prompt.openai.cached_tokens") - cached_before == 2048
+
+
+def test_claude_system_prompt_and_history_carry_cache_breakpoints(monkeypatch):
+    monkeypatch.setattr(anthropic, "Anthropic", RecordedAnthropic)
+    RecordedAnthropic.requests = []
+    input_before = _counter("prompt.claude.input_tokens")
+
+    assert "".join(ClaudeProvider().generate_stream("USER QUESTION: why?", [], "key", "casual", HISTORY)) == "It diffuses."
+    follow_up = HISTORY + [{"role": "user", "content": "Why?"}, {"role": "assistant", "content": "Concentrations even out."}]
+    "".join(ClaudeProvider().generate_stream("USER QUESTION: how fast?", [], "key", "casual", follow_up))
+
+    first, second = RecordedAnthropic.requests
+    assert first["system"] == [{"type": "text", "text": get_system_instructions("casual"), "cache_control": {"type": "ephemeral"}}]
+    [message] = first["messages"]
+    assert message["role"] == "user"
+    *history_blocks, question = message["content"]
+    assert [block["text"] for block in history_blocks] == [
+        "Conversation History:", "User: What is osmosis?\n", "Lumina: Water moving across a membrane.\n"]
+    # One breakpoint, on the newest history block
+    assert [block.get("cache_control") for block in history_blocks] == [None, None, {"type": "ephemeral"}]
+    assert question["text"].startswith("USER QUESTION: why?") and "cache_control" not in question
+
+    # The next turn starts with exactly the blocks this turn cached, so it reads instead of rewriting them
+    later = second["messages"][0]["content"]
+    assert [block["text"] for block in later[:len(history_blocks)]] == [block["text"] for block in history_blocks]
+    assert "cache_control" in later[len(follow_up)] and "cache_control" not in later[len(history_blocks) - 1]
+    assert _counter("prompt.claude.input_tokens") - input_before == 2 * 1150
+
+
+def test_unreadable_usage_never_turns_a_complete_answer_into_an_error(monkeypatch):
+    class OldUsage(RecordedAnthropic):
+        def stream(self, **request):
+            stream = super().stream(**request)
+            stream.get_final_message = lambda: SimpleNamespace(usage=SimpleNamespace(input_tokens=50))
+            return stream
+
+    monkeypatch.setattr(anthropic, "Anthropic", OldUsage)
+    assert "".join(ClaudeProvider().generate_stream("USER QUESTION: why?", [], "key", "casual")) == "It diffuses."
+
+
+def test_gemini_passes_the_system_instruction_ahead_of_the_contents(monkeypatch):
+    calls = []
+
+    class RecordedModel:
+        def __init__(self, name, system_instruction=None):
+            calls.append({"system_instruction": system_instruction})
+
+        def generate_content(self, contents, stream, generation_config):
+            calls[-1]["contents"] = contents
+            usage = SimpleNamespace(prompt_token_count=1500, cached_content_token_count=1024)
+            return iter([SimpleNamespace(text="It diffuses.", usage_metadata=usage)])
+
+    monkeypatch.setattr(llm_handler, "genai", SimpleNamespace(configure=lambda api_key: None, GenerativeModel=RecordedModel))
+    cached_before = _counter("prompt.gemini.cached_tokens")
+
+    assert "".join(GeminiProvider().generate_stream("USER QUESTION: why?", [], "key", "concise", HISTORY)) == "It diffuses."
+    assert calls[0]["system_instruction"] == get_system_instructions("concise")
+    assert calls[0]["contents"][0].startswith("User: What is osmosis?\nLumina: Water moving")
+    assert _counter("prompt.gemini.cached_tokens") - cached_before == 1024
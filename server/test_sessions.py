@@ -0,0 +1,40 @@
+# server/test_sessions.py
+import time
+
+from sessions import Session, SessionStore, normalize_history
+
+
+def test_append_turn_and_history_cap():
+    store = SessionStore(ttl=60, max_bytes=1 << 20, max_messages=4)
+    store.save(Session("s1", normalize_history([{"role": "user", "content": "hi", "audioUrl": "/x"}])))
+    for turn in range(3):
+        store.append_turn("s1", f"q{turn}", f"a{turn}")
+    history = store.get("s1").history
+    assert [m["content"] for m in history] == ["q1", "a1", "q2", "a2"]
+    store.append_turn("missing", "q", "a") # ignored
+    assert store.get("missing") is None
+
+
+def test_memory_budget_evicts_least_recently_used():
+    store = SessionStore(ttl=60, max_bytes=3000)
+    for name in ("a", "b", "c"):
+        store.save(Session(name, text="x" * 1000))
+    store.get("a")
+    store.save(Session("d", text="x" * 1000))
+    assert store.get("b") is None and store.get("a") is not None
+    assert store.size <= 3000
+
+
+def test_sqlite_persistence_survives_restart(tmp_path):
+    db = tmp_path / "sessions.sqlite3"
+    store = SessionStore(ttl=60, max_bytes=1 << 20, db_path=db)
+    store.save(Session("s1", text="selected", image_hashes=["abc"]))
+    store.append_turn("s1", "why?", "because")
+    store.close()
+
+    reopened = SessionStore(ttl=60, max_bytes=1 << 20, db_path=db)
+    session = reopened.get("s1")
+    assert session.text == "selected" and session.image_hashes == ["abc"]
+    assert session.history[-1] == {"role": "assistant", "content": "because"}
+    assert reopened.expire(time.time() + 120) == 1
+    assert reopened.get("s1") is None
@@ -0,0 +1,79 @@
+# server/test_stream_pump.py
+import queue
+import threading
+
+import stream_pump
+from stream_pump import END, PumpPool, pump
+
+
+def _drain(items: queue.Queue) -> list:
+    drained = []
+    while (item := items.get(timeout=2)) is not END:
+        drained.append(item)
+    return drained
+
+
+def test_pump_delivers_items_then_the_error_then_end():
+    def failing():
+        yield "a"
+        yield "b"
+        raise ValueError("provider went away")
+
+    items: queue.Queue = queue.Queue()
+    pump(failing, items.put, threading.Event())
+    a, b, error = _drain(items)
+    assert (a, b) == ("a", "b") and isinstance(error, ValueError)
+
+
+def test_stopped_streams_are_closed_at_the_next_item():
+    closed = threading.Event()
+    release = threading.Event()
+
+    def endless():
+        try:
+            while True:
+                release.wait()
+                yield "tick"
+        finally:
+            closed.set()
+
+    items: queue.Queue = queue.Queue()
+    stop = threading.Event()
+    pump(endless, items.put, stop)
+    stop.set()
+    release.set()
+    assert _drain(items) == [] and closed.wait(2)
+
+
+def test_nested_pumps_never_wait_behind_their_consumers(monkeypatch):
+    # One worker: the outer pump holds it while reading the inner one
+    monkeypatch.setattr(stream_pump, "pumps", PumpPool(workers=1))
+
+    def outer():
+        inner: queue.Queue = queue.Queue()
+        pump(lambda: iter(["x", "y"]), inner.put, threading.Event())
+        yield from _drain(inner)
+
+    items: queue.Queue = queue.Queue()
+    pump(outer, items.put, threading.Event())
+    assert _drain(items) == ["x", "y"]
+
+
+def test_outer_pumps_queue_for_the_bounded_pool(monkeypatch):
+    monkeypatch.setattr(stream_pump, "pumps", PumpPool(workers=2, nested_limit=2))
+    release = threading.Event()
+    running, most = [], []
+
+    def held():
+        running.append(1)
+        most.append(len(running))
+        release.wait(2)
+        running.pop()
+        yield "done"
+
+    outputs = [queue.Queue() for _ in range(5)]
+    for items in outputs:
+        pump(held, items.put, threading.Event())
+    release.set()
+    assert [_drain(items) for items in outputs] == [["done"]] * 5
+    assert max(most) == 2 # The other three waited rather than getting threads
@@ -0,0 +1,62 @@
+# server/test_text_chunker.py
+from text_chunker import balanced_target, chunk_text, estimate_phonemes, split_sentences, take_sentences
+
+
+def test_split_sentences_ignores_decimals_and_abbreviations():
+    text = "Dr. Smith measured 4.9 percent growth in the U.S. economy. That is huge."
+    assert split_sentences(text) == [
+        "Dr. Smith measured 4.9 percent growth in the U.S. economy.",
+        "That is huge.",
+    ]
+
+
+def test_split_sentences_keeps_lowercase_ellipsis_together():
+    assert split_sentences("Oh... well that is it. Done.") == ["Oh... well that is it.", "Done."]
+
+
+def test_short_sentences_are_merged():
+    chunks = chunk_text("Oh. Entropy measures disorder. It always grows. That's the law.", first_chunk=200)
+    assert len(chunks) == 1
+
+
+def test_long_sentence_is_split_at_clause_boundaries():
+    sentence = (
+        "Inflation happens when too much money chases too few goods and so prices rise... "
+        "and people notice it at the grocery store and at the gas pump and in their rent "
+        "which all adds up over time until wages finally catch up with the new prices."
+    )
+    chunks = chunk_text(sentence, target=100, max_cost=140, first_chunk=100)
+    assert len(chunks) > 1
+    assert all(len(c) <= 140 for c in chunks)
+    assert " ".join(chunks) == sentence
+
+
+def test_first_chunk_is_small():
+    text = "Photosynthesis is how plants make food, and it happens in the leaves. " * 6
+    chunks = chunk_text(text, target=180, first_chunk=60)
+    assert len(chunks[0]) <= 90
+    assert max(len(c) for c in chunks[1:]) > len(chunks[0])
+
+
+def test_chunks_preserve_text_and_respect_budget():
+    text = ("You know... compound interest is like a snowball rolling down a hill and it grows. " * 10).strip()
+    chunks = chunk_text(text, target=150, max_cost=220)
+    assert " ".join(chunks) == text
+    assert all(len(c) <= 220 for c in chunks)
+
+
+def test_phoneme_budget_and_balanced_target():
+    text = "Entropy measures disorder in a system of many particles. " * 8
+    chunks = chunk_text(text, target=120, max_cost=160, cost=estimate_phonemes)
+    assert all(estimate_phonemes(c) <= 160 for c in chunks)
+    assert balanced_target("x" * 400, workers=8) == 80
+    assert balanced_target("x" * 4000, workers=2) == 180
+
+
+def test_take_sentences_waits_for_confirmed_boundaries():
+    assert take_sentences("Entropy measures disorder. It al", min_chars=10) == ("Entropy measures disorder.", "It al")
+    # Too short yet, and a boundary at the end of the buffer may still continue
+    assert take_sentences("Oh. Hi", min_chars=10) == ("", "Oh. Hi")
+    assert take_sentences("Oh... ", min_chars=1) == ("", "Oh... ")
+    assert take_sentences("Oh... well, it grows. Yes", min_chars=1) == ("Oh... well, it grows.", "Yes")
+    assert take_sentences("So you ask why.\n\n", min_chars=60) == ("So you ask why.", "")
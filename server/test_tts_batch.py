@@ -0,0 +1,110 @@
+# server/test_tts_batch.py
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from conftest import StubTTS
+
+TEXTS = [
+    "The mitochondria is the powerhouse of the cell.",
+    "Osmosis moves water across a membrane.",
+    "Compound interest grows on earlier interest.",
+]
+
+
+def _events(response) -> list[dict]:
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_batch_reports_accepted_items_and_complete_and_dedupes(server):
+    client = TestClient(server.app)
+    items = [{"text": TEXTS[0]}, {"text": TEXTS[1]}, {"text": TEXTS[0]}]
+    events = _events(client.post("/api/tts/batch", json={"items": items}))
+
+    assert events[0]["type"] == "accepted"
+    assert events[0]["items"] == 3 and events[0]["unique"] == 2 and events[0]["rendering"] == 2
+    done = [e for e in events if e["type"] == "item"]
+    assert sorted(tuple(e["indexes"]) for e in done) == [(0, 2), (1,)]
+    assert all(e["status"] == "done" and e["audioUrl"].endswith(".wav") for e in done)
+    assert events[-1] == {"type": "complete", "done": 2, "failed": 0}
+    assert sum(call == TEXTS[0] for call in server._handlers["tts"].calls) == 1
+
+    # Everything is in the store now: nothing renders again
+    again = _events(client.post("/api/tts/batch", json={"items": items[:2]}))
+    assert again[0]["cached"] == 2 and again[0]["rendering"] == 0
+    assert {e["status"] for e in again if e["type"] == "item"} == {"cached"}
+
+
+def test_batch_concurrency_comes_from_the_environment_setting(server, monkeypatch):
+    tts = server._handlers["tts"]
+    tts.delay = 0.05
+    monkeypatch.setattr(server, "MAX_TTS_WORKERS", 4)
+    monkeypatch.setattr(server, "TTS_BATCH_CONCURRENCY", 1)
+    client = TestClient(server.app)
+    events = _events(client.post("/api/tts/batch", json={"items": [{"text": t} for t in TEXTS]}))
+    assert events[0]["concurrency"] == 1 and tts.max_running == 1
+
+    tts.max_running = 0
+    monkeypatch.setattr(server, "TTS_BATCH_CONCURRENCY", 3)
+    events = _events(client.post("/api/tts/batch", json={"items": [{"text": t + " Again."} for t in TEXTS]}))
+    assert events[0]["concurrency"] == 3 and tts.max_running > 1
+    # The request's own cap still wins, and the worker count bounds both
+    events = _events(client.post("/api/tts/batch", json={"items": [{"text": "One more."}], "concurrency": 9}))
+    assert events[0]["concurrency"] == 4
+
+
+def test_background_batches_use_their_concurrency(server):
+    tts = server._handlers["tts"]
+    tts.delay = 0.05
+    items = [{"text": t, "tier": "background"} for t in TEXTS]
+    events = _events(TestClient(server.app).post("/api/tts/batch", json={"items": items, "concurrency": 3}))
+    assert events[-1] == {"type": "complete", "done": 3, "failed": 0}
+    assert tts.max_running > 1 # Not serialized behind one background lock
+
+
+def _join_speculative(server, tier: str) -> tuple[dict, bool]:
+    """Starts a speculative render, then batches the same text; returns the batch events and whether it was promoted."""
+    server._handlers["tts"].delay = 0.05
+
+    async def run():
+        text = "Oh... plants turn light into sugar. " * 3
+        server.schedule_speculative_tts(server.GenerateRequest(text="", prompt="", preGeneratedText=text))
+        key = server.tts_cache_key(text, "alba")
+        render = server._speculative_tasks[key]
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/api/tts/batch", json={"items": [{"text": text, "tier": tier}]})
+        return _events(response), render.promoted.is_set()
+
+    return asyncio.run(run())
+
+
+def test_batch_joins_an_in_flight_speculative_render(server):
+    events, promoted = _join_speculative(server, "background")
+    assert events[0]["rendering"] == 1
+    assert [e["status"] for e in events if e["type"] == "item"] == ["done"]
+    assert not promoted # Background items don't jump the queue
+
+
+def test_foreground_batch_item_promotes_the_speculative_render(server):
+    events, promoted = _join_speculative(server, "foreground")
+    assert events[-1] == {"type": "complete", "done": 1, "failed": 0}
+    assert promoted
+
+
+def test_cache_keys_never_load_the_tts_model(server, monkeypatch):
+    import tts_handler
+    monkeypatch.setitem(server._handlers, "tts", None)
+    monkeypatch.setattr(tts_handler, "TTSHandler", lambda: pytest.fail("TTS model loaded on the event loop"))
+    response = TestClient(server.app).post("/api/jobs/status", json={"items": [{"text": "Hi there."}]})
+    [(key, status)] = response.json()["jobs"].items()
+    assert status["state"] == "unknown"
+    # The same key the handler's version makes once it has loaded
+    loaded = StubTTS()
+    loaded.model_version = tts_handler.detect_model_version()
+    monkeypatch.setitem(server._handlers, "tts", loaded)
+    assert server.tts_cache_key("Hi there.", "alba") == key
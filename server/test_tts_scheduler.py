@@ -0,0 +1,136 @@
+# server/test_tts_scheduler.py
+import asyncio
+
+import httpx
+
+from conftest import StubTTS
+from tts_scheduler import TTSPriorityGate
+
+
+def _gate() -> TTSPriorityGate:
+    return TTSPriorityGate(idle_cpu_percent=101, poll_interval=0.01)
+
+
+def test_foreground_runs_ahead_of_queued_background_work():
+    async def run():
+        gate, log = _gate(), []
+
+        async def background(name):
+            async with gate.background():
+                log.append(name)
+                await asyncio.sleep(0.01)
+
+        async def foreground():
+            async with gate.foreground():
+                log.append("fg")
+                await asyncio.sleep(0.05)
+
+        speculative = asyncio.gather(background("bg1"), background("bg2"))
+        await asyncio.sleep(0) # bg1 admitted, bg2 queued behind it
+        await foreground()
+        await speculative
+        return log
+
+    assert asyncio.run(run()) == ["bg1", "fg", "bg2"]
+
+
+def test_foreground_preempts_background_at_the_next_sentence():
+    async def run():
+        gate, log = _gate(), []
+
+        async def speculative_answer():
+            # One gate admission per sentence, the way speculative renders use it
+            for sentence in range(3):
+                async with gate.background():
+                    log.append(f"bg{sentence} start")
+                    await asyncio.sleep(0.03)
+                    log.append(f"bg{sentence} end")
+
+        async def play_request():
+            await asyncio.sleep(0.01) # Arrives mid-sentence
+            async with gate.foreground():
+                assert gate.busy
+                log.append("fg start")
+                await asyncio.sleep(0.05)
+                log.append("fg end")
+
+        await asyncio.gather(speculative_answer(), play_request())
+        assert not gate.busy
+        return log
+
+    assert asyncio.run(run()) == [
+        "bg0 start", "fg start", "bg0 end", # The running sentence finishes, not interrupted
+        "fg end", "bg1 start", "bg1 end", "bg2 start", "bg2 end", # The next one waits
+    ]
+
+
+def test_background_waits_for_an_idle_cpu():
+    async def run():
+        gate = _gate()
+        cpu = iter([False, False, True])
+        gate._cpu_is_idle = lambda: next(cpu)
+        async with gate.background():
+            return next(cpu, "polled until idle")
+
+    assert asyncio.run(run()) == "polled until idle"
+
+
+def test_after_foreground_runs_in_parallel_but_waits_out_foreground_work():
+    async def run():
+        gate, log = _gate(), []
+        running = []
+
+        async def batch_item(name):
+            async with gate.after_foreground():
+                running.append(name)
+                log.append((name, len(running)))
+                await asyncio.sleep(0.02)
+                running.remove(name)
+
+        async with gate.foreground():
+            items = asyncio.gather(*(batch_item(f"bg{n}") for n in range(3)))
+            await asyncio.sleep(0.02)
+            log.append(("fg done", 0))
+        await items
+        return log
+
+    log = asyncio.run(run())
+    assert log[0] == ("fg done", 0)
+    assert max(count for _, count in log) == 3
+
+
+class GateRecordingTTS(StubTTS):
+    """Notes whether foreground work was running when each chunk was synthesized."""
+
+    def __init__(self, gate, delay):
+        super().__init__(delay)
+        self.gate = gate
+        self.foreground: list[bool] = []
+
+    def generate_speech(self, text, voice="alba", use_cuda=False):
+        self.foreground.append(self.gate.busy)
+        return super().generate_speech(text, voice, use_cuda)
+
+
+def test_tts_request_promotes_the_in_flight_speculative_render(server, monkeypatch):
+    tts = GateRecordingTTS(server.tts_gate, delay=0.02)
+    monkeypatch.setitem(server._handlers, "tts", tts)
+    text = " ".join(f"Sentence {n} explains one more step of how osmosis balances water." for n in range(12))
+
+    async def run():
+        server.schedule_speculative_tts(server.GenerateRequest(text="", prompt="", preGeneratedText=text))
+        key = server.tts_cache_key(text, "alba")
+        render = server._speculative_tasks[key]
+        await asyncio.sleep(0.03) # Under way at background priority
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/api/tts", json={"text": text})
+        return key, render, response.json()
+
+    key, render, body = asyncio.run(run())
+    assert render.promoted.is_set() and render.task.done()
+    assert body == {"is_cached": True, "audioUrl": f"/api/audio/{key}.wav"}
+    # Joined, not rendered a second time; the rest ran as foreground work
+    assert len(tts.calls) == len(set(tts.calls)) == len(server.plan_text_audio(text, 1)[1])
+    assert tts.foreground[0] is False and tts.foreground[-1] is True
+    assert key not in server._speculative_audio # Claimed by the play request
@@ -0,0 +1,70 @@
+# server/test_two_stage.py
+import time
+
+from two_stage import BODY_CONTINUATION, clean_opener, splice_opener
+
+
+def _stream(delay: float, chunks):
+    def start():
+        time.sleep(delay)
+        yield from chunks
+    return start
+
+
+def _body(chunks, continued: list):
+    def start(opener_spoken: bool):
+        continued.append(opener_spoken)
+        return _stream(0.01, chunks)()
+    return start
+
+
+def test_opener_is_spoken_first_and_the_body_continues_it():
+    continued = []
+    started = time.perf_counter()
+    answer = splice_opener(_stream(0.01, ["So you want to know ", "why the sky is blue."]),
+                           _body(["Sunlight scatters.", " Blue scatters most."], continued))
+    first = next(answer)
+    assert time.perf_counter() - started < 0.2
+    assert first == "So you want to know why the sky is blue.\n\n"
+    assert "".join(answer) == "Sunlight scatters. Blue scatters most."
+    assert continued == [True]
+
+
+def test_late_or_failed_opener_is_dropped_and_the_body_stands_alone():
+    continued = []
+    late = splice_opener(_stream(0.3, ["So you ask."]), _body(["Body."], continued), wait=0.05)
+    assert "".join(late) == "Body."
+    failed = splice_opener(_stream(0.0, ["Groq Error: 429"]), _body(["Body."], continued))
+    assert "".join(failed) == "Body."
+    assert continued == [False, False] # Never told the answer had already begun
+
+
+def test_body_prompt_continues_only_a_spliced_opener():
+    from llm_handler import LLMHandler
+
+    class Provider:
+        vision = True
+
+        def __init__(self, fast, reply):
+            self.fast, self.reply, self.prompts = fast, reply, []
+
+        def generate_stream(self, prompt, images, api_key, tone, history=None, custom_persona=None, max_tokens=None):
+            self.prompts.append(prompt)
+            yield from self.reply
+
+    for opener_reply, continued in ((["So you ask why."], True), (["Groq Error: 429"], False)):
+        handler = LLMHandler()
+        handler.default_key = None # Only the stub providers
+        strong = Provider(False, ["Because."])
+        handler.providers = {"openai": strong, "groq": Provider(True, opener_reply)}
+        answer = "".join(handler.generate_answer_stream(
+            "", "Why?", provider="openai", api_keys={"openai": "k", "groq": "k"}, two_stage=True
+        ))
+        assert answer.endswith("Because.")
+        assert strong.prompts[0].endswith(BODY_CONTINUATION) is continued
+
+
+def test_clean_opener_keeps_one_sentence():
+    assert clean_opener('"So you ask why. Because reasons."') == "So you ask why."
+    assert clean_opener("So you ask why") == "So you ask why."
+    assert clean_opener("Gemini Error: timeout") == ""
@@ -0,0 +1,88 @@
+# server/test_voice_session.py
+import json
+
+from fastapi.testclient import TestClient
+
+from conftest import StubLLM
+
+QUERY = {"type": "query", "text": "Osmosis is the movement of water.", "prompt": "What is osmosis?"}
+
+
+def _receive_until(ws, kind: str) -> tuple[list[dict], bytes]:
+    """JSON events up to and including the first of the given type, and the audio frames in between."""
+    events, audio = [], bytearray()
+    while True:
+        message = ws.receive()
+        if message.get("bytes"):
+            audio += message["bytes"]
+            continue
+        event = json.loads(message["text"])
+        events.append(event)
+        if event["type"] == kind:
+            return events, bytes(audio)
+
+
+def test_query_streams_text_then_sentence_audio_then_done(server):
+    with TestClient(server.app).websocket_connect("/ws/session") as ws:
+        ws.send_json({**QUERY, "shouldAudio": True, "audioFormat": "wav"})
+        events, audio = _receive_until(ws, "done")
+
+    kinds = [event["type"] for event in events]
+    assert kinds[0] == "turn" and kinds[-1] == "done"
+    assert kinds.index("audio_start") < kinds.index("audio_end") < kinds.index("done")
+    text = "".join(event["delta"] for event in events if event["type"] == "text")
+    assert events[-1]["text"] == text == "Osmosis is water crossing a membrane. It evens out concentrations."
+    assert audio.startswith(b"RIFF") and len(audio) > 44
+    # Each sentence was synthesized as it completed
+    assert server._handlers["tts"].calls == ["Osmosis is water crossing a membrane.", "It evens out concentrations."]
+
+
+def test_follow_up_queries_carry_the_conversation_history(server):
+    llm = server._handlers["llm"]
+    with TestClient(server.app).websocket_connect("/ws/session") as ws:
+        ws.send_json(QUERY)
+        _receive_until(ws, "done")
+        ws.send_json({"type": "query", "prompt": "Why does it happen?"})
+        _receive_until(ws, "done")
+
+    assert llm.calls[1]["text"] == QUERY["text"] # Sticky from the first query
+    assert [m["role"] for m in llm.calls[1]["history"]] == ["user", "assistant"]
+
+
+def test_stop_cancels_the_answer_mid_stream(server, monkeypatch):
+    chunks = ["Water moves. "] + ["More detail. "] * 50
+    monkeypatch.setitem(server._handlers, "llm", StubLLM(chunks, pause=0.02))
+    with TestClient(server.app).websocket_connect("/ws/session") as ws:
+        ws.send_json({**QUERY, "shouldAudio": True})
+        _receive_until(ws, "text")
+        ws.send_json({"type": "stop"})
+        events, _ = _receive_until(ws, "stopped")
+        assert events[-1] == {"type": "stopped", "turn": 1, "cancelled": True}
+        assert "done" not in [event["type"] for event in events]
+
+        # Barging in with a new query starts a fresh turn; nothing of the old one follows
+        monkeypatch.setitem(server._handlers, "llm", StubLLM(("Short answer.",)))
+        ws.send_json({"type": "query", "prompt": "Just the gist?"})
+        events, _ = _receive_until(ws, "done")
+    assert {event["turn"] for event in events if "turn" in event} == {2}
+    assert events[-1]["text"] == "Short answer."
+
+
+def test_errors_are_reported_and_the_session_stays_open(server, monkeypatch):
+    monkeypatch.setitem(server._handlers, "llm", StubLLM(("Half an ans", RuntimeError("provider went away"))))
+    with TestClient(server.app).websocket_connect("/ws/session") as ws:
+        ws.send_json(QUERY)
+        events, _ = _receive_until(ws, "error")
+        assert events[-1] == {"type": "error", "turn": 1, "error": "provider went away"}
+
+        ws.send_text("not json")
+        assert ws.receive_json() == {"type": "error", "error": "Expected a JSON message"}
+        ws.send_json({**QUERY, "audioFormat": "mp3"})
+        assert ws.receive_json()["error"].startswith("Unknown audio format 'mp3'")
+        ws.send_json({**QUERY, "sessionId": "gone"})
+        assert ws.receive_json()["unknownSession"] is True
+
+        monkeypatch.setitem(server._handlers, "llm", StubLLM())
+        ws.send_json(QUERY)
+        events, _ = _receive_until(ws, "done")
+    assert events[0] == {"type": "turn", "turn": 2}
@@ -17,7 +17,7 @@ def test_workflow():
         "prompt": "Who is this?",
         "voice": "alba",
         "shouldAudio": True,
-        "llmProvider": "groq", # Testing Groq path
+        "llmProvider": os.getenv("LUMINA_TEST_PROVIDER", "groq"), # Testing Groq path ("replay" runs offline, see llm_replay.py)
         "responseTone": "concise"
     }
     
@@ -0,0 +1,232 @@
+# server/text_chunker.py
+
+"""
+Length-balanced text chunking for parallel TTS.
+Sentence splitting alone gives badly uneven work items: one long "... and ..."
+sentence becomes the straggler that sets the job's makespan, while fragments
+like "Oh." pay the full per-call overhead. This module merges short sentences,
+splits long ones at clause boundaries, and keeps the first chunk small so the
+first audio arrives quickly.
+"""
+
+import re
+from typing import Callable
+
+# Defaults tuned for Pocket TTS on CPU (roughly 2-4 seconds of speech per chunk)
+DEFAULT_TARGET_CHARS = 180
+DEFAULT_MAX_CHARS = 260
+DEFAULT_MIN_CHARS = 40
+DEFAULT_FIRST_CHUNK_CHARS = 60
+
+# Tokens that end with a period without ending the sentence
+_ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "mt", "vs", "etc",
+    "e.g", "i.e", "cf", "al", "approx", "fig", "no", "vol", "ch", "sec",
+    "inc", "ltd", "co", "corp", "dept", "est", "u.s", "u.k", "a.m", "p.m",
+    "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+}
+
+# Candidate sentence ends: terminal punctuation followed by whitespace
+_SENTENCE_END = re.compile(r"(\.{3}|…|[.!?]+)([\"')\]]*)(\s+)")
+
+# Clause boundaries for splitting long sentences, strongest first.
+# Each pattern matches the separator; the split happens after it.
+_CLAUSE_BOUNDARIES = [
+    re.compile(r"(?:\.{3}|…)\s+"),
+    re.compile(r"[;:]\s+|\s+[—–]\s+"),
+    re.compile(r",\s+(?=(?:and|so|but|or|because|which|while|then|although)\b)", re.IGNORECASE),
+    re.compile(r",\s+"),
+    re.compile(r"\s+(?=(?:and|so|but|because|which|while|then)\b)", re.IGNORECASE),
+]
+
+
+def estimate_phonemes(text: str) -> int:
+    """
+    Rough phoneme count: English runs at about 0.85 phonemes per letter, and
+    digits are read out as words so they cost more.
+    """
+    letters = sum(1 for c in text if c.isalpha())
+    digits = sum(1 for c in text if c.isdigit())
+    return int(letters * 0.85) + digits * 3
+
+
+def _is_abbreviation(text: str, dot_index: int) -> bool:
+    """True if the period at dot_index belongs to an abbreviation or an initial."""
+    start = dot_index
+    while start > 0 and (text[start - 1].isalpha() or text[start - 1] == "."):
+        start -= 1
+    token = text[start:dot_index].lower()
+    if not token:
+        return False
+    # Single-letter initials ("J. R. R. Tolkien")
+    if len(token) == 1 and token.isalpha():
+        return True
+    return token in _ABBREVIATIONS
+
+
+def _sentence_ends(text: str):
+    """
+    Sentence-final punctuation matches that really end a sentence, skipping
+    decimals, abbreviations, initials, and ellipses that continue in lowercase.
+    """
+    for match in _SENTENCE_END.finditer(text):
+        punct = match.group(1)
+        following = text[match.end():match.end() + 1]
+
+        if punct in ("...", "…") or punct == ".":
+            # Continues in lowercase or a digit: a pause, not a sentence end
+            if following and (following.islower() or following.isdigit()):
+                continue
+        if punct == "." and _is_abbreviation(text, match.start(1)):
+            continue
+        yield match
+
+
+def split_sentences(text: str) -> list[str]:
+    """
+    Splits on sentence-final punctuation, ignoring decimals, abbreviations,
+    initials, and ellipses that continue in lowercase ("Oh... well").
+    """
+    sentences = []
+    start = 0
+    for match in _sentence_ends(text):
+        sentence = text[start:match.end(2)].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+
+    tail = text[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+def take_sentences(buffer: str, min_chars: int = DEFAULT_FIRST_CHUNK_CHARS) -> tuple[str, str]:
+    """
+    For text that arrives incrementally (LLM deltas): splits the complete
+    sentences off the front of the buffer once they add up to min_chars.
+    Returns (ready, rest); ready is "" while there isn't enough yet.
+    A boundary at the very end of the buffer doesn't count, since the next
+    delta may continue it in lowercase ("Oh... " + "well"), unless it also
+    ends a paragraph; a paragraph is released even when shorter than min_chars.
+    """
+    cut = 0
+    paragraph = False
+    for match in _sentence_ends(buffer):
+        at_end = match.end() == len(buffer)
+        if not at_end or "\n\n" in match.group(3):
+            cut = match.end()
+            paragraph = at_end
+    ready = buffer[:cut].strip()
+    if not ready or (len(ready) < min_chars and not paragraph):
+        return "", buffer
+    return ready, buffer[cut:]
+
+
+def _split_long(text: str, target: int, max_cost: int, min_cost: int, cost: Callable[[str], int]) -> list[str]:
+    """
+    Splits one over-target piece into balanced parts at the strongest clause
+    boundary available. Words are only cut mid-clause when a piece exceeds max_cost.
+    """
+    total = cost(text)
+    if total <= target:
+        return [text]
+
+    # Aim for equal parts rather than one full part plus a stub
+    parts = -(-total // target)
+    aim = total / parts
+
+    for pattern in _CLAUSE_BOUNDARIES:
+        best = None
+        for match in pattern.finditer(text):
+            head = text[:match.end()].strip()
+            tail = text[match.end():].strip()
+            head_cost = cost(head)
+            if head_cost > max_cost:
+                break
+            if head_cost < min_cost or cost(tail) < min_cost:
+                continue
+            distance = abs(head_cost - aim)
+            if best is None or distance < best[0]:
+                best = (distance, match.end())
+        if best is not None:
+            cut = best[1]
+            return [text[:cut].strip()] + _split_long(text[cut:].strip(), target, max_cost, min_cost, cost)
+
+    if total <= max_cost:
+        return [text]
+
+    # No usable clause boundary: fall back to a word boundary near the aim
+    words = text.split(" ")
+    head = words[0]
+    for i in range(1, len(words)):
+        candidate = f"{head} {words[i]}"
+        if cost(candidate) > aim:
+            rest = " ".join(words[i:])
+            return [head] + _split_long(rest, target, max_cost, min_cost, cost)
+        head = candidate
+    return [text]
+
+
+def balanced_target(text: str, workers: int, target: int = DEFAULT_TARGET_CHARS,
+                    min_cost: int = DEFAULT_MIN_CHARS, cost: Callable[[str], int] = len) -> int:
+    """
+    Shrinks the per-chunk target so a short answer still spreads across all
+    workers (makespan ~ total / workers) instead of leaving most of them idle.
+    """
+    per_worker = cost(text) // max(1, workers)
+    return max(min_cost * 2, min(target, per_worker))
+
+
+def chunk_text(
+    text: str,
+    target: int = DEFAULT_TARGET_CHARS,
+    max_cost: int = DEFAULT_MAX_CHARS,
+    min_cost: int = DEFAULT_MIN_CHARS,
+    first_chunk: int = DEFAULT_FIRST_CHUNK_CHARS,
+    cost: Callable[[str], int] = len,
+) -> list[str]:
+    """
+    Splits text into TTS work items of roughly equal cost.
+
+    - Sentences longer than target are split into balanced parts at
+      clause/ellipsis boundaries (mid-clause only beyond max_cost).
+    - Consecutive short sentences are merged up to the target cost.
+    - The first chunk is capped at first_chunk so the first audio is fast.
+
+    cost defaults to character count; pass estimate_phonemes for a phoneme budget.
+    """
+    text = text.strip()
+    if not text:
+        return []
+
+    pieces = []
+    for sentence in split_sentences(text):
+        pieces.extend(_split_long(sentence, target, max_cost, min_cost, cost))
+
+    # Keep chunk 1 short: split the leading piece at a clause boundary if it has
+    # one, and only cut mid-clause when it is well over the first-chunk budget
+    if pieces and cost(pieces[0]) > first_chunk:
+        first_max = max(first_chunk * 3 // 2, min_cost)
+        pieces = _split_long(pieces[0], first_chunk, first_max, min(min_cost, first_chunk // 2), cost) + pieces[1:]
+
+    chunks: list[str] = []
+    current = ""
+    for piece in pieces:
+        budget = first_chunk if not chunks else target
+        if not current:
+            current = piece
+            continue
+        merged = f"{current} {piece}"
+        if cost(merged) <= budget or (cost(current) < min_cost and cost(merged) <= max_cost and chunks):
+            current = merged
+        else:
+            chunks.append(current)
+            current = piece
+    if current:
+        # A tiny trailing fragment rides along with the previous chunk
+        if chunks and cost(current) < min_cost and cost(f"{chunks[-1]} {current}") <= max_cost and len(chunks) > 1:
+            chunks[-1] = f"{chunks[-1]} {current}"
+        else:
+            chunks.append(current)
+    return chunks
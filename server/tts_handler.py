@@ -7,12 +7,35 @@ Handles text-to-speech generation
 
 import logging
 import os
+from functools import lru_cache
 from typing import Optional
 import numpy as np
 import torch
 
 logger = logging.getLogger(__name__)
 
+# Optimize quality: Using 15 steps for speed (User Request)
+# (Lower steps = faster generation, slightly lower quality)
+LSD_DECODE_STEPS = 15
+
+STANDARD_VOICES = [
+    "alba", "marius", "javert", "jean",
+    "fantine", "cosette", "eponine", "azelma"
+]
+
+@lru_cache(maxsize=1)
+def detect_model_version() -> str:
+    """
+    Identifies the model build so persisted audio can be keyed by it.
+    Reads package metadata only, so it is cheap before the model is loaded.
+    """
+    try:
+        from importlib.metadata import version
+        package_version = version("pocket-tts")
+    except Exception:
+        package_version = "unknown"
+    return f"pocket-tts-{package_version}-lsd{LSD_DECODE_STEPS}"
+
 class TTSHandler:
     """Handler for Kyutai Pocket TTS model"""
     
@@ -21,6 +44,7 @@ class TTSHandler:
         self.model = None
         self.sample_rate = 24000
         self.current_device = 'cpu'
+        self.model_version = "mock"
         self._initialize()
     
     def _initialize(self):
@@ -32,10 +56,9 @@ class TTSHandler:
             try:
                 from pocket_tts import TTSModel
                 # Load model
-                # Optimize quality: Using 15 steps for speed (User Request)
-                # (Lower steps = faster generation, slightly lower quality)
-                self.model = TTSModel.load_model(lsd_decode_steps=15)
+                self.model = TTSModel.load_model(lsd_decode_steps=LSD_DECODE_STEPS)
                 self.sample_rate = getattr(self.model, 'sample_rate', 24000)
+                self.model_version = detect_model_version()
                 
                 # Immediate CUDA Move (Cache Everything)
                 if torch.cuda.is_available():
@@ -49,13 +72,9 @@ class TTSHandler:
                 
                 # Pre-Cache Standard Voices using Safe Loader
                 self.voice_cache = {}
-                standard_voices = [
-                    "alba", "marius", "javert", "jean", 
-                    "fantine", "cosette", "eponine", "azelma"
-                ]
                 logger.info(f"Pre-caching voices (safe mode)...")
                 
-                for v in standard_voices:
+                for v in STANDARD_VOICES:
                     try:
                         self._load_voice_safe(v)
                     except Exception as e:
@@ -71,27 +90,6 @@ class TTSHandler:
             logger.error(f"Failed to initialize Pocket TTS: {e}")
             self.is_available = False
     
-    def generate_speech(
-        self,
-        text: str,
-        voice: str = "alba",
-        use_cuda: bool = False
-    ) -> np.ndarray:
-        """
-        Generate speech from text
-        """
-        if not self.is_available:
-            return self._generate_mock_audio()
-
-        # Handle Device Switching
-        target_device = 'cpu'
-        if use_cuda:
-            if torch.cuda.is_available():
-                target_device = 'cuda'
-                logger.info("Using CUDA acceleration for TTS")
-            else:
-                logger.warning("CUDA requested but not available. Using CPU.")
-
     def _load_voice_safe(self, voice: str) -> dict:
         """
         Safely load voice state, handling CUDA/CPU transitions to avoid
@@ -175,10 +173,6 @@ class TTSHandler:
         text = re.sub(r'\s+', ' ', text)
         text = text.strip()
         
-        if len(text) > 5000:
-            logger.info("Truncating text to 5000 chars")
-            text = text[:5000]
-
         # Generate (Standard No-Clone)
         logger.info(f"Generating speech with voice: {voice}")
         
@@ -235,11 +229,14 @@ class TTSHandler:
                 audio = audio.numpy()
 
              if audio.dtype != np.int16:
-                max_val = np.max(np.abs(audio))
+                # Peak-normalize in place: max/min avoid the full-size np.abs
+                # temporary, and the only copy made is the (half-size) int16 result
+                if not audio.flags.writeable or audio.dtype.kind != 'f':
+                    audio = audio.astype(np.float32)
+                max_val = max(abs(float(audio.max())), abs(float(audio.min()))) if audio.size else 0.0
                 if max_val > 0:
-                    audio = (audio / max_val * 32767).astype(np.int16)
-                else:
-                    audio = audio.astype(np.int16)
+                    audio *= 32767 / max_val
+                audio = audio.astype(np.int16)
 
              return audio
              
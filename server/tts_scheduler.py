@@ -0,0 +1,84 @@
+# server/tts_scheduler.py
+
+"""
+Priority gate for TTS work.
+Real (foreground) synthesis always wins; speculative (background) work only
+runs while nothing else is synthesizing and the CPU is otherwise idle, and
+background batch items (which bound their own concurrency) wait out
+foreground work only.
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+class TTSPriorityGate:
+    """
+    Two-level scheduler for the shared TTS executor.
+
+    Foreground work never waits on the gate. Background work is admitted one
+    sentence at a time, so a real request preempts it at the next sentence
+    boundary instead of queueing behind a whole speculative answer.
+    """
+
+    def __init__(self, idle_cpu_percent: float = 50.0, poll_interval: float = 0.25):
+        self.idle_cpu_percent = idle_cpu_percent
+        self.poll_interval = poll_interval
+        self._active_foreground = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._background_lock = asyncio.Lock()
+
+    @property
+    def busy(self) -> bool:
+        """True while any foreground synthesis is running."""
+        return self._active_foreground > 0
+
+    @asynccontextmanager
+    async def foreground(self):
+        """Marks a real, user-facing TTS call for the duration of the block."""
+        self._active_foreground += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._active_foreground -= 1
+            if self._active_foreground == 0:
+                self._idle.set()
+
+    def _cpu_is_idle(self) -> bool:
+        try:
+            return psutil.cpu_percent(interval=None) < self.idle_cpu_percent
+        except Exception:
+            return True
+
+    @asynccontextmanager
+    async def background(self):
+        """
+        Admits a single low-priority TTS call.
+        Waits until no foreground work is active and the CPU is quiet; only one
+        background call runs at a time.
+        """
+        async with self._background_lock:
+            while True:
+                await self._idle.wait()
+                if self._cpu_is_idle():
+                    break
+                await asyncio.sleep(self.poll_interval)
+            yield
+
+    @asynccontextmanager
+    async def after_foreground(self):
+        """
+        Admits a low-priority TTS call once no foreground work is active.
+        Unlike background() any number run at once (the caller bounds them:
+        a batch's own concurrency) and the CPU isn't polled, since they keep
+        it busy themselves.
+        """
+        await self._idle.wait()
+        yield
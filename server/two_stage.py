@@ -0,0 +1,93 @@
+# server/two_stage.py
+
+"""
+Two-stage answers: a fast model speaks a one-sentence opener (a restatement
+of the question) while the strong model writes the body.
+The opener goes first, with a short wait: if it is ready in time it is
+spliced in and the body is told the answer has already begun, so it goes
+straight to substance; otherwise it is dropped and the body is asked for
+a whole answer. Either way the stream is one answer. Only a consumer that
+speaks sentences as they arrive (the live session) gains anything: the
+body's wait is spent speaking the opener.
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import Callable, Iterator
+
+from llm_router import ERROR_TEXT
+from metrics import metrics
+from stream_pump import END, pump
+
+TWO_STAGE = os.getenv("LUMINA_TWO_STAGE", "0").lower() in ("1", "true", "yes")
+OPENER_MAX_TOKENS = 40
+OPENER_WAIT = 1.0 # Seconds the body waits for the opener before going without it
+
+OPENER_INSTRUCTIONS = (
+    "In ONE short spoken sentence (at most 20 words), restate what the user wants to know, "
+    "as the opening of an answer (for example: 'So you want to know how plants turn sunlight into food.'). "
+    "Do not answer it yet. No markdown, no filler word at the start.\n\n"
+)
+BODY_CONTINUATION = (
+    "\n\n[The spoken answer has already begun with a one-sentence restatement of the question. "
+    "Continue straight into the substance: do not restate the question and do not open with a filler.]"
+)
+
+
+
+def opener_prompt(text: str, prompt: str, context_chars: int = 600) -> str:
+    """What the fast model sees: the question and the start of the selection, nothing else."""
+    context = text.strip()[:context_chars]
+    return OPENER_INSTRUCTIONS + (f"The user selected text starting: {context}\n\n" if context else "") + f"Question: {prompt}"
+
+
+def clean_opener(text: str) -> str:
+    """The first sentence of the fast model's reply, or "" if it failed or rambled."""
+    text = text.strip().strip('"')
+    if not text or ERROR_TEXT.match(text):
+        return ""
+    for end in (". ", "? ", "! "):
+        if end in text:
+            text = text[:text.index(end) + 1]
+    if len(text.split()) > 30:
+        return ""
+    return text if text[-1] in ".?!" else text + "."
+
+
+def splice_opener(opener: Callable[[], Iterator[str]], body: Callable[[bool], Iterator[str]],
+                  wait: float = OPENER_WAIT) -> Iterator[str]:
+    """
+    The opener (if it finishes within wait seconds) followed by the body.
+    body(True) is the continuation of a spoken opener, body(False) a whole
+    answer; the opener is pumped on a pool worker and stopped if it is late.
+    """
+    events: queue.Queue = queue.Queue()
+    stop = threading.Event()
+    started = time.perf_counter()
+    pump(opener, events.put, stop)
+
+    opener_text = ""
+    try:
+        while True:
+            try:
+                item = events.get(timeout=max(0.0, started + wait - time.perf_counter()))
+            except queue.Empty:
+                item = TimeoutError() # Late: the body goes on its own
+            if item is END or isinstance(item, Exception):
+                break
+            opener_text += item or ""
+    finally:
+        stop.set()
+
+    # A failed or late opener is simply left out
+    opener_text = clean_opener(opener_text) if item is END else ""
+    if opener_text:
+        metrics.increment("llm.two_stage.opener_used")
+        metrics.observe("llm.two_stage.opener_seconds", time.perf_counter() - started)
+        # A paragraph break marks the sentence complete, so TTS can start on it
+        yield opener_text + "\n\n"
+    else:
+        metrics.increment("llm.two_stage.opener_dropped")
+    yield from body(bool(opener_text))